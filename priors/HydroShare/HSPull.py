@@ -5,9 +5,12 @@ Created on Mon Feb 27 13:15:05 2023
 @author: coss.31
 """
 #standard imports
+from concurrent.futures import ThreadPoolExecutor
 import requests
+import time
+import warnings
 from zipfile import ZipFile
-from io import BytesIO
+from io import BytesIO, StringIO
 from numpy import genfromtxt
 import numpy as np
 from os import  scandir, remove
@@ -30,10 +33,162 @@ SWORDVERSION='16'#need a solution to this being hard coded
 
 DLpath='./resources'
 DLpathL='./List'      
+MAX_WORKERS=4
+ATTEMPTS=3
+BACKOFF=2.0
+FIELDS=['Rid','Nid','SWORD','x','y','T','Q','Qu','WSE','WSEu','W','Wu','CXA','CXAu','MxV','MxVu','MeanV','MeanVu','MxD','MxDu','MeanD','MeanDu']
+INT_FIELDS=['Rid','Nid']
+FLOAT32_FIELDS=['x','y']
+DATE_FORMAT='%d-%m-%Y'
+
+def retry(func, *args, attempts=ATTEMPTS, backoff=BACKOFF, label=''):
+    """Call func with args and retry with exponential backoff.
+
+    Waits backoff, 2 * backoff, ... seconds between attempts and raises the
+    last exception when all attempts fail.
+    """
+    for attempt in range(attempts):
+        try:
+            return func(*args)
+        except Exception as e:
+            if attempt == attempts - 1:
+                print(label + ' failed after ' + str(attempts) + ' retrieval attempts. Check Repo on Cuhahsi')
+                raise
+            print(label + ' had zip or dl issue, retrying', e)
+            time.sleep(backoff * 2 ** attempt)
+
+def measurement_csvs(zip_file, resource_id):
+    """Return (file name, text) of the measurement CSVs in a resource zip.
+
+    Only CSV files directly in the data/contents directory of the resource
+    that are not templates, notebooks or readme files are read. Nothing is
+    extracted to disk.
+    """
+    contents=resource_id + '/data/contents/'
+    csvs=[]
+    with ZipFile(zip_file) as z:
+        for member in sorted(z.namelist()):
+            name=member[len(contents):]
+            if not member.startswith(contents) or '/' in name: continue
+            if 'template' in name or name[-5:-1] == 'ipynb' or name[0:6] == 'readme' or name[-4:] != '.csv': continue
+            with z.open(member) as f:
+                csvs.append((name, f.read().decode('utf-8')))
+    return csvs
+
+def read_measurements(text, name=''):
+    """Return typed measurement arrays and rejected rows of a resource CSV.
+
+    Every column is read as text in one pass and converted with vectorized
+    parsers; rows with a missing or malformed value in any column (including
+    rows with fewer columns than FIELDS) are rejected so the returned arrays
+    stay aligned. Columns past FIELDS are ignored.
+
+    Parameters
+    ----------
+    text: str
+        CSV text with a header row and the columns in FIELDS
+    name: str
+        file name stored for each measurement
+
+    Returns
+    -------
+    dict of field name to array (None if the file is not for SWORDVERSION)
+    and list of (row, reason) of rejected data rows counted from 1
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', pd.errors.ParserWarning)
+        df=pd.read_csv(StringIO(text), header=None, skiprows=1, names=FIELDS, index_col=False,
+                       dtype=str, keep_default_na=False, comment='#').fillna('')
+    sword=df['SWORD'].str.strip()
+    if not ((sword==SWORDVERSION) | (sword=='')).all():
+        return None, []
+
+    reasons=np.full(len(df), None, dtype=object)
+    values={}
+    for field in FIELDS:
+        column=df[field].str.strip()
+        if field == 'SWORD':
+            valid=(column != '').to_numpy()
+        elif field in INT_FIELDS:
+            valid=column.str.fullmatch(r'[+-]?\d+').to_numpy(dtype=bool)
+            values[field]=np.where(valid, column, '0').astype(np.int64)
+        elif field == 'T':
+            dates=pd.to_datetime(column.str.strip("'"), format=DATE_FORMAT, errors='coerce')
+            valid=dates.notna().to_numpy()
+            days=dates.to_numpy().astype('datetime64[D]')
+            values[field]=np.where(valid, days, np.datetime64('1970-01-01')).astype(np.int64) + dtd(1970, 1, 1).toordinal()
+        else:
+            numbers=pd.to_numeric(column, errors='coerce')
+            valid=(numbers.notna() | column.str.lower().str.lstrip('+-').isin(['nan', 'inf', 'infinity'])).to_numpy()
+            values[field]=numbers.to_numpy(dtype=np.float32 if field in FLOAT32_FIELDS else np.float64)
+        failed=~valid & (reasons == None)
+        reasons[failed]=np.where(column.to_numpy()[failed] == '', 'missing ', 'invalid ') + field
+
+    keep=reasons == None
+    measurements={field: data[keep] for field, data in values.items()}
+    measurements['Sf']=np.full(int(keep.sum()), name)
+    rejected=[(int(row) + 1, reasons[row]) for row in np.where(~keep)[0]]
+    return measurements, rejected
+
+def group_by_reach(Rid, T):
+    """Return order, reach identifiers and offsets of per-reach slices.
+
+    Measurements are sorted once by reach identifier and time. The sort is
+    stable so measurements of a reach on the same day keep their file order.
+    The measurements of the i-th reach are order[offsets[i]:offsets[i+1]].
+    """
+    order=np.lexsort((T, Rid))
+    reaches, starts=np.unique(Rid[order], return_index=True)
+    return order, reaches, np.append(starts, order.size)
+
 class HSp:
     
-    def __init__(self):
+    def __init__(self, cache=None, max_workers=MAX_WORKERS, session=None):
         self.HydroShare_dict={}
+        self.cache=cache
+        self.max_workers=max_workers
+        self.session=session
+
+    def get_collection(self, URLst):
+        """Download collection zip, using the response cache when available.
+
+        Entries are keyed by the URL alone and revalidated with a conditional
+        request on every call so that new resources are never missed.
+        """
+        if self.cache is None:
+            return (self.session or requests).get(URLst).content
+        return self.cache.fetch(URLst, 'HydroShare', URLst, '', '', session=self.session, revalidate=True)
+
+    def fetch_resource(self, hs, resource_id, download_dir):
+        """Download a resource zip and return its measurement CSVs.
+
+        The zip is removed once the CSVs are read.
+        """
+        def download():
+            zip_file=hs.resource(resource_id).download(download_dir)
+            try:
+                return measurement_csvs(zip_file, resource_id)
+            finally:
+                remove(zip_file)
+        return retry(download, label=resource_id)
+
+    def fetch_resources(self, hs, resource_ids, download_dir):
+        """Download resources concurrently and return their measurement CSVs.
+
+        At most max_workers resources are downloaded at a time. Returns a list
+        of (resource id, CSVs) in the order of resource_ids; resources that
+        fail after all retries are reported and skipped.
+        """
+        fetched=[]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures=[(resource_id, executor.submit(self.fetch_resource, hs, resource_id, download_dir))
+                     for resource_id in resource_ids]
+            for resource_id, future in futures:
+                try:
+                    fetched.append((resource_id, future.result()))
+                except Exception as e:
+                    print(resource_id+' falied after collection list was retreived', e)
+        return fetched
         
     def pull(self):
             UN="SteveCossSWOT"
@@ -59,247 +214,51 @@ class HSp:
             remove_files(DLpath)
 
             try:
-                try:
-                    r=requests.get(URLst)
-                    print('here are urls', URLst)           
-                    r.headers.get('Content-Type')
-                    z = ZipFile(BytesIO(r.content))
-                except:
-                    print('First file had zip issue retrying 1st attempt')
-                    try:
-                        r=requests.get(URLst)
-                        print('here are urls', URLst)           
-                        r.headers.get('Content-Type')
-                        z = ZipFile(BytesIO(r.content))
-                    except:
-                        print('First file had zip issue retrying 2nd attempt')
-                        try:
-                            r=requests.get(URLst)
-                            print('here are urls', URLst)           
-                            r.headers.get('Content-Type')
-                            z = ZipFile(BytesIO(r.content))
-                        except:
-                            print('Three retrieval attempts made and failed. Check Repo on Cuhahsi')
-
-                file = z.extractall( DLpathL)
-                csvpath=DLpathL+"/"+RI+"/data/contents/collection_list_"+RI+".csv"
-                Collection= genfromtxt(csvpath, delimiter=',', dtype='unicode',skip_header=1, usecols=np.arange(0,5))
+                def collection():
+                    content=self.get_collection(URLst)
+                    print('here are urls', URLst)
+                    with ZipFile(BytesIO(content)) as z:
+                        return z.read(RI+"/data/contents/collection_list_"+RI+".csv").decode('utf-8')
+                Collection= genfromtxt(StringIO(retry(collection, label='Collection list')), delimiter=',', dtype='unicode',skip_header=1, usecols=np.arange(0,5))
                 # df = pd.read_csv(csvpath)
                 # Collection = df.values.astype('U')
                 #log in
                 hs = HydroShare(UN,PW)
                 #dl all resources
-                Sf=[]
-                Rid=[]
-                Nid=[]
-                x=[]
-                y=[]
-                T=[]
-                Q=[]
-                Qu=[]
-                WSE=[]
-                WSEu=[]
-                W=[]
-                Wu=[]
-                CXA=[]
-                CXAu=[]
-                MxV=[]
-                MxVu=[]
-                MeanV=[]
-                MeanVu=[]
-                MxD=[]
-                MxDu=[]
-                MeanD=[]
-                MeanDu=[]
-                
-                for resource in Collection: #this will bug id there is fewer than 2 resources 
-                    print('resource')
-                    print(resource)
-                    if '_TEST' not in  resource[0][0:4]:#this is modified so the data will get pulled "TEST" is prepended to all the dummy data, this will skip it when fixed 
-                        Tstr=resource[2]
-                        res = hs.resource(Tstr)                        
+                #this is modified so the data will get pulled "TEST" is prepended to all the dummy data, this will skip it when fixed 
+                resource_ids=[resource[2] for resource in Collection if '_TEST' not in resource[0][0:4]]
+                parsed=[]
+                for Tstr, RES_files in self.fetch_resources(hs, resource_ids, DLpath):
+                    for RES_name, RES_text in RES_files:
                         try:
-                            try:
-                                NOWres=res.download(DLpath)
-                                print('resource url', DLpath)           
-                                NOWres.headers.get('Content-Type')
-                                z = ZipFile(DLpath+'/'+Tstr+'.zip')
-                            except:
-                                print('Resource file had zip or dl issue retrying 1st attempt')
-                                try:
-                                    NOWres=res.download(DLpath)
-                                    print('here are urls',DLpath)           
-                                    NOWres.headers.get('Content-Type')
-                                    z = ZipFile(DLpath+'/'+Tstr+'.zip')
-                                except:
-                                    print('Resource file had zip or dl issue retrying 1st attempt')
-                                    try:
-                                        NOWres=res.download(DLpath)
-                                        print('here are urls', DLpath)           
-                                        NOWres.headers.get('Content-Type')
-                                        z = ZipFile(DLpath+'/'+Tstr+'.zip')
-                                    except:
-                                        print('Three resource retrieval attempts made and failed. Check Repo on Cuhahsi')
-                        except:
-                            print(Tstr+' falied after collection list was retreived')
-                        
-                                               
-                           
-                        
-                        file =z.extractall(DLpath)
-                        z.close()
-                        remove(DLpath+'/'+Tstr+'.zip')
-                        csvpath= DLpath+'/'+ Tstr + '/data/contents/'
-                        
-                        with scandir(csvpath) as entries:
-                            RES_files = [ entry for entry in entries if entry.name ]
-                        
-                        for RES_file in RES_files: 
-                            if  'template'not in RES_file.name: 
-                                if RES_file.name[-5:-1] != 'ipynb':
-                                    if RES_file.name[0:6] != 'readme':
-                                        if RES_file.name[-4:]=='.csv':                                
-                            
-                                            RESlist= genfromtxt(csvpath+"/" +RES_file.name, delimiter=',',dtype ='unicode',skip_header=1)
-                                            if np.all(RESlist[:,2]==SWORDVERSION):
-                                                c=1
-                                                for measurement in RESlist:
-                                                    HadException=False               
-                                                    if len(measurement[0])>0:
-                                                        try:                                                        
-                                                            test=RES_file.name
-                                                            test=measurement[0].astype(np.int64)
-                                                            test=measurement[1].astype(np.int64)
-                                                            test=measurement[3].astype(np.float32)
-                                                            test=measurement[4].astype(np.float32)
-                                                            date=measurement[5].strip()
-                                                            date=date.strip("'")
-                                                            d=dt.strptime( date, '%d-%m-%Y')
-                                                            test=d.toordinal()
-                                                            test=measurement[6].astype(float)
-                                                            test=measurement[7].astype(float)
-                                                            test=measurement[8].astype(float)
-                                                            test=measurement[9].astype(float)
-                                                            test=measurement[10].astype(float)
-                                                            test=measurement[11].astype(float)
-                                                            test=measurement[12].astype(float)
-                                                            test=measurement[13].astype(float)
-                                                            test=measurement[14].astype(float)
-                                                            test=measurement[15].astype(float)
-                                                            test=measurement[16].astype(float)
-                                                            test=measurement[17].astype(float)
-                                                            test=measurement[18].astype(float)
-                                                            test=measurement[19].astype(float)
-                                                            test=measurement[20].astype(float)
-                                                            test=measurement[21].astype(float)
+                            measurements, rejected=read_measurements(RES_text, RES_name)
+                        except (pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+                            print('could not read ' + RES_name + ': ' + str(e))
+                            continue
+                        if measurements is None:
+                            print('wrong SWORD in ' +RES_name)
+                            continue
+                        for row, reason in rejected:
+                            #prevents partial saving of a measurement that causes array size misalignment
+                            print('missing fill or incorect data fromat in ' + RES_name + ' row ' + str(row) + ': ' + reason)
+                        parsed.append(measurements)
 
-                                                        except Exception as e:
-                                                            HadException=True
-                                                            print(e)
-                                                            print('missing fill or incorect data fromat in' + RES_file.name )
-
-                                                        if HadException:
-                                                            #prevents partial saving of a measurement that causes array size misalignment
-                                                            print('index skipped')
-                                                        else:                                                    
-                                                                                                        #print(c)
-                                                            c=c+1
-                                                            Sf.append(RES_file.name)
-                                                            Rid.append(measurement[0].astype(np.int64))
-                                                            Nid.append(measurement[1].astype(np.int64))
-                                                            x.append(measurement[3].astype(np.float32))
-                                                            y.append(measurement[4].astype(np.float32))
-                                                            date=measurement[5].strip()
-                                                            date=date.strip("'")
-                                                            d=dt.strptime( date, '%d-%m-%Y')
-                                                            T.append(d.toordinal())
-                                                            Q.append(measurement[6].astype(float))
-                                                            Qu.append(measurement[7].astype(float))
-                                                            WSE.append(measurement[8].astype(float))
-                                                            WSEu.append(measurement[9].astype(float))
-                                                            W.append(measurement[10].astype(float))
-                                                            Wu.append(measurement[11].astype(float))
-                                                            CXA.append(measurement[12].astype(float))
-                                                            CXAu.append(measurement[13].astype(float))
-                                                            MxV.append(measurement[14].astype(float))
-                                                            MxVu.append(measurement[15].astype(float))
-                                                            MeanV.append(measurement[16].astype(float))
-                                                            MeanVu.append(measurement[17].astype(float))
-                                                            MxD.append(measurement[18].astype(float))
-                                                            MxDu.append(measurement[19].astype(float))
-                                                            MeanD.append(measurement[20].astype(float))
-                                                            MeanDu.append(measurement[21].astype(float))
-                                                        
-
-                                                            
-                                            else:
-                                                print('wrong SWORD in ' +RES_file.name)
+                Sf=np.concatenate([measurements['Sf'] for measurements in parsed])
+                Rid, Nid, x, y, T, Q, Qu, WSE, WSEu, W, Wu, CXA, CXAu, MxV, MxVu, MeanV, MeanVu, MxD, MxDu, MeanD, MeanDu=(
+                    np.concatenate([measurements[field] for measurements in parsed]) for field in FIELDS if field != 'SWORD')
                                                 
                 
                 
-                data_id=[]
-                data_rid=[]
-                data_Nid=[]
-                data_x=[]
-                data_y=[]
-                data_t=[]
-                data_q=[]
-                data_qu=[]
-                data_WSE=[]
-                data_WSEu=[]
-                data_W=[]
-                data_Wu=[]
-                data_CXA=[]
-                data_CXAu=[]
-                data_MxV=[]
-                data_MxVu=[]
-                data_MeanV=[]
-                data_MeanVu=[]
-                data_MxD=[]
-                data_MxDu=[]
-                data_MeanD=[]
-                data_MeanDu=[]
-                
-                print('Concatinate')            
-                Ureach=np.unique(Rid)
-                for reach in Ureach:
-                    TR=np.where(Rid==reach)
-                    #sort all reach data by time
-                    Tnp=np.array(T)
-                    Rtid=np.argsort(Tnp[TR],axis=None)
-                    
-                    idx=list(TR[0])
-                    data_id.append(np.array(Sf)[TR][0])
-                    data_rid.append(reach)
-                    data_Nid.append(np.array(Nid)[idx])
-                    data_x.append(np.array(x)[idx][0])
-                    data_y.append(np.array(y)[idx][0])
-                    data_t.append(np.array(T)[idx])
-                    data_q.append(np.array(Q)[idx])
-                    data_qu.append(np.array(Qu)[idx])
-                    data_WSE.append(np.array(WSE)[idx])
-                    data_WSEu.append(np.array(WSEu)[idx])
-                    data_W.append(np.array(W)[idx])
-                    data_Wu.append(np.array(Wu)[idx])
-                    data_CXA.append(np.array(CXA)[idx])
-                    data_CXAu.append(np.array(CXAu)[idx])
-                    data_MxV.append(np.array(MxV)[idx])
-                    data_MxVu.append(np.array(MxVu)[idx])
-                    data_MeanV.append(np.array(MeanV)[idx])
-                    data_MeanVu.append(np.array(MeanVu)[idx])
-                    data_MxD.append(np.array(MxD)[idx])
-                    data_MxDu.append(np.array(MxDu)[idx])
-                    data_MeanD.append(np.array(MeanD)[idx])
-                    data_MeanDu.append(np.array(MeanDu)[idx])
-                
-                    
-                    
-                    
-                    
-                    
+                print('Concatinate')
+                # sort once by reach and time; reach i is order[offsets[i]:offsets[i+1]]
+                order, data_rid, offsets=group_by_reach(Rid, T)
+                data_id=Sf[np.minimum.reduceat(order, offsets[:-1])].tolist()
+                Ts=T[order]
+                Qs=Q[order]
+
                 # generate empty arrays for nc output
-                st=dtd.fromordinal(min(T))
-                et=dtd.fromordinal(max(T))
+                st=dtd.fromordinal(int(T.min()))
+                et=dtd.fromordinal(int(T.max()))
                 ALLt=pd.date_range(start=st,end=et)
                 EMPTY=np.nan
                 MONQ=np.full((len(data_rid),12),EMPTY)
@@ -316,67 +275,39 @@ class HSp:
                 
                 # process recrds for dictionary
                 for i in range(len(data_rid)):
-                            
-                    # pull in Q
-                    Q=data_q[i]
-                
-                    if Q.size >0:
-                        print(i)       
-                        t=data_t[i]
-                        T=[]
-                        for time in t:
-                            
-                            T.append(pd.Timestamp.fromordinal(time))             
-                    
-                        T=pd.DatetimeIndex(T)        
-                        moy=T.month
-                        yyyy=T.year
-                        moy=moy.to_numpy()       
-                        thisT=np.zeros(len(T))
-                        for j in range((len(T))):
-                            thisT=np.where(ALLt==np.datetime64(T[j]))
-                            Qwrite[i,thisT]=Q[j]
-                            Twrite[i,thisT]=dtd.toordinal(T[j])
-                            # with df pulled in run some stats
-                            #basic stats
-                            Qmean[i]=np.nanmean(Q)
-                            Qmax[i]=np.nanmax(Q)
-                            Qmin[i]=np.nanmin(Q)
-                            #monthly means
-                            Tmonn={}    
-                        for j in range(12):
-                            Tmonn=np.where(moy==j+1)
-                            if not np.isnan(Tmonn).all() and Tmonn: 
-                                MONQ[i,j]=np.nanmean(Q[Tmonn])
-                                    
-                                #flow duration curves (n=20)
-                                
-                                p=np.empty(len(Q))
-                                
-                        if len(Q)>21:    #do not FDQ on fewer than 21 datum
-                            for j in range(len(Q)):
-                                p[j]=100* ((j+1)/(len(Q)+1))         
-                                thisQ=np.flip(np.sort(Q))
-                                FDq=thisQ
-                                FDp=p
-                                FDQS[i]=np.interp(list(range(1,99,5)),FDp,FDq)
-                                        #FDPS=list(range(0,99,5))
-                                        # Two year recurrence flow
-                                    
-                        
-                        Yy=np.unique(yyyy) 
-                        Ymax=np.empty(len(Yy))  
-                        for j in range(len(Yy)):
-                            Ymax[j]=np.nanmax(Q[np.where(yyyy==Yy[j])]);
-                            
-                            MAQ=np.flip(np.sort(Ymax))
-                            m = (len(Yy)+1)/2
-                                    
-                            TwoYr[i]=MAQ[int(np.ceil(m))-1]
-                
-                        
-                        Mt=list(range(1,13))
-                        P=list(range(1,99,5))
+                    Q=Qs[offsets[i]:offsets[i+1]]
+                    t=Ts[offsets[i]:offsets[i+1]]
+
+                    # measurements on the same day keep file order so the last one is written
+                    columns=t-ALLt[0].toordinal()
+                    Qwrite[i,columns]=Q
+                    Twrite[i,columns]=t
+
+                    #basic stats
+                    Qmean[i]=np.nanmean(Q)
+                    Qmax[i]=np.nanmax(Q)
+                    Qmin[i]=np.nanmin(Q)
+
+                    #monthly means
+                    days=(t-dtd(1970, 1, 1).toordinal()).astype('datetime64[D]')
+                    moy=days.astype('datetime64[M]').astype(np.int64) % 12 + 1
+                    yyyy=days.astype('datetime64[Y]').astype(np.int64) + 1970
+                    for j in range(12):
+                        Tmonn=np.where(moy==j+1)[0]
+                        if Tmonn.size:
+                            MONQ[i,j]=np.nanmean(Q[Tmonn])
+
+                    #flow duration curves (n=20)
+                    if len(Q)>21:    #do not FDQ on fewer than 21 datum
+                        p=100* (np.arange(1,len(Q)+1)/(len(Q)+1))
+                        FDQS[i]=np.interp(P,p,np.flip(np.sort(Q)))
+
+                    # Two year recurrence flow
+                    Yy=np.unique(yyyy)
+                    Ymax=np.array([np.nanmax(Q[yyyy==year]) for year in Yy])
+                    MAQ=np.flip(np.sort(Ymax))
+                    m = (len(Yy)+1)/2
+                    TwoYr[i]=MAQ[int(np.ceil(m))-1]
                 
                 self.HydroShare_dict = {
                         "data": data_id,
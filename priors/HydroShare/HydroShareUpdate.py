@@ -3,11 +3,15 @@ from datetime import datetime
 from pathlib import Path
 
 # Third-party imports
-from netCDF4 import Dataset, stringtochar
+from netCDF4 import Dataset, chartostring, stringtochar
 import numpy as np
 import collections
 import json
 
+# Local imports
+from priors.sos.AttributePlan import apply_atts
+from priors.sos.WritePlan import WritePlan
+
 class HydroShareUpdate:
     """Class that updates HydroShare gage data in the SoS.
     
@@ -15,6 +19,8 @@ class HydroShareUpdate:
     ----------
     FLOAT_FILL: float
         Fill value for any missing float values in mapped GRDC data
+    ID_FILL: str
+        Fill value for gauge identifiers of reaches without measurements
     INT_FILL: int
         Fill value for any missing integer values in mapped GRDC data
     map_dict: dict
@@ -27,9 +33,13 @@ class HydroShareUpdate:
         Temporary directory that holds old SoS version
     HydroShare_dict: dict
         Dictionary of USGS data
+    sparse: bool
+        indicate if only reaches with measurements are mapped and written
 
     Methods
     -------
+    clear_rows(group, agency, rows)
+        Fills rows of reaches that are no longer measured
     map_data()
         Maps USGS data to SoS data organized by continent
     read_sos()
@@ -39,9 +49,10 @@ class HydroShareUpdate:
     """
 
     FLOAT_FILL = -999999999999
+    ID_FILL = "-99999999999999999999999999999999999999999999999999999999"
     INT_FILL = -999
 
-    def __init__(self, sos_file, HydroShare_dict, metadata_json):
+    def __init__(self, sos_file, HydroShare_dict, metadata_json, sparse=False):
         """
         Parameters
         ----------
@@ -51,6 +62,8 @@ class HydroShareUpdate:
             Temporary directory that holds old SoS version
         HydroShare_dict: dict
             Dictionary of riggs gauge data
+        sparse: bool
+            indicate if only reaches with measurements are mapped and written
         """
 
         self.sos_file = sos_file
@@ -59,6 +72,7 @@ class HydroShareUpdate:
         self.map_dict = {}
         self.sos_reaches = None
         self.variable_atts = metadata_json  
+        self.sparse = sparse
 
     def nested_dict(self):
         return collections.defaultdict(self.nested_dict)
@@ -72,7 +86,13 @@ class HydroShareUpdate:
 
 
     def map_data(self):
-        """Maps USGS data to SoS, and stores data in map_dict attribute."""
+        """Maps USGS data to SoS, and stores data in map_dict attribute.
+
+        By default every variable is mapped to the full reach dimension with
+        fill values for reaches without measurements. In sparse mode only the
+        measured reaches are mapped along with their rows in the reach
+        dimension.
+        """
 
         self.map_dict = self.nested_dict()
 
@@ -118,9 +138,33 @@ class HydroShareUpdate:
             
             if indexes.size == 0:
                 self.map_dict[agency] = None
+                continue
+
+            # rows of the measured reaches in the SoS reach dimension
+            measured_ids = np.array(self.HydroShare_dict["reachId"]).astype(np.int64)[indexes]
+            sos_order = np.argsort(sos_ids, kind="stable")
+            rows = sos_order[np.searchsorted(sos_ids, measured_ids, sorter=sos_order)]
+
+            if self.sparse:
+                row_order = np.argsort(rows)
+                indexes = indexes[row_order]
+                self.map_dict[agency]["rows"] = rows[row_order]
+                self.map_dict[agency]["days"] = np.array(range(1, len(self.HydroShare_dict["Qwrite"][0]) + 1))
+                self.map_dict[agency]["HydroShare_reach_id"] = np.array(sos_ids)
+                self.map_dict[agency]["fdq"] = np.array(self.HydroShare_dict["FDQS"])[indexes,:]
+                self.map_dict[agency]["max_q"] = np.array(self.HydroShare_dict["Qmax"])[indexes]
+                self.map_dict[agency]["monthly_q"] = np.array(self.HydroShare_dict["MONQ"])[indexes,:]
+                self.map_dict[agency]["mean_q"] = np.array(self.HydroShare_dict["Qmean"])[indexes]
+                self.map_dict[agency]["min_q"] = np.array(self.HydroShare_dict["Qmin"])[indexes]
+                self.map_dict[agency]["tyr"] = np.array(self.HydroShare_dict["TwoYr"])[indexes]
+                self.map_dict[agency]["HydroShare_id"] = np.array(self.HydroShare_dict["data"])[indexes]
+                self.map_dict[agency]["HydroShare_q"] = self.HydroShare_dict["Qwrite"][indexes,:]
+                self.map_dict[agency]["HydroShare_qt"] = self.HydroShare_dict["Twrite"][indexes,:]
+                self.map_dict[agency]["CAL"] = np.array(self.HydroShare_dict["CAL"])[indexes]
             else:
-                SHAQfill= -999999999999
-                SHAQfillstr= "-99999999999999999999999999999999999999999999999999999999"
+                # float fill so discharge is not truncated to integers
+                SHAQfill= float(self.FLOAT_FILL)
+                SHAQfillstr= self.ID_FILL
 
                 #make fill
                 self.map_dict[agency]["days"] = np.array(range(1, len(self.HydroShare_dict["Qwrite"][0]) + 1))
@@ -136,7 +180,7 @@ class HydroShareUpdate:
                 self.map_dict[agency]["HydroShare_qt"] = np.full((len(sos_ids),len(np.array(self.HydroShare_dict["Twrite"])[indexes[0],:])),SHAQfill)
                 self.map_dict[agency]["CAL"] = np.full((len(sos_ids),),SHAQfill)
                 #put data into full sos index locations
-                FULLsosindex=np.where(np.isin(sos_ids, same_ids.astype(np.int64)))[0]
+                FULLsosindex=rows
 
                 self.map_dict[agency]["HydroShare_reach_id"][FULLsosindex] = np.array(self.HydroShare_dict["reachId"]).astype(np.int64)[indexes]
                 self.map_dict[agency]["fdq"][FULLsosindex] = np.array(self.HydroShare_dict["FDQS"])[indexes,:]
@@ -191,52 +235,60 @@ class HydroShareUpdate:
                 variable_atts = self.variable_atts[agency]
                 
                 HydroShare = sos[agency]
-                
-                HydroShare["num_days"][:] = self.map_dict[agency]["days"]
-                print('how many days',len(HydroShare["num_days"][:]))
                 print('how many gauges found', len(self.map_dict[agency]["HydroShare_reach_id"]))
-                print('how many are there', len(HydroShare[f"{agency}_reach_id"][:]))
-                self.set_variable_atts(HydroShare["num_days"], variable_atts["num_days"])
-                
+
+                # sparse maps only hold measured reaches that are written to their rows
+                rows = self.map_dict[agency].get("rows")
+                if rows is not None:
+                    self.clear_rows(HydroShare, agency, rows)
+
                 # used f string for agency so it generalizes the sos creation for different agencies
-                
-                self.set_variable_atts(HydroShare[f"{agency}_reaches"], variable_atts[f"{agency}_reaches"])
-                self.set_variable_atts(HydroShare["CAL"], variable_atts["CAL"])
-                
-                HydroShare[f"{agency}_reach_id"][:] = self.map_dict[agency]["HydroShare_reach_id"]
-                self.set_variable_atts(HydroShare[f"{agency}_reach_id"], variable_atts[f"{agency}_reach_id"])
-                
-                HydroShare[f"{agency}_flow_duration_q"][:] = np.nan_to_num(self.map_dict[agency]["fdq"], copy=True, nan=self.FLOAT_FILL)
-                self.set_variable_atts(HydroShare[f"{agency}_flow_duration_q"], variable_atts[f"{agency}_flow_duration_q"])
-                
-                HydroShare[f"{agency}_max_q"][:] = np.nan_to_num(self.map_dict[agency]["max_q"], copy=True, nan=self.FLOAT_FILL)
-                self.set_variable_atts(HydroShare[f"{agency}_max_q"], variable_atts[f"{agency}_max_q"])
-                
-                HydroShare[f"{agency}_monthly_q"][:] = np.nan_to_num(self.map_dict[agency]["monthly_q"], copy=True, nan=self.FLOAT_FILL)
-                self.set_variable_atts(HydroShare[f"{agency}_monthly_q"], variable_atts[f"{agency}_monthly_q"])
-                
-                HydroShare[f"{agency}_mean_q"][:] = np.nan_to_num(self.map_dict[agency]["mean_q"], copy=True, nan=self.FLOAT_FILL)
-                self.set_variable_atts(HydroShare[f"{agency}_mean_q"], variable_atts[f"{agency}_mean_q"])
-                
-                HydroShare[f"{agency}_min_q"][:] = np.nan_to_num(self.map_dict[agency]["min_q"], copy=True, nan=self.FLOAT_FILL)
-                self.set_variable_atts(HydroShare[f"{agency}_min_q"], variable_atts[f"{agency}_min_q"])
-                
-                HydroShare[f"{agency}_two_year_return_q"][:] = np.nan_to_num(self.map_dict[agency]["tyr"], copy=True, nan=self.FLOAT_FILL)
-                self.set_variable_atts(HydroShare[f"{agency}_two_year_return_q"], variable_atts[f"{agency}_two_year_return_q"])
-                
-                HydroShare[f"{agency}_id"][:] = stringtochar(self.map_dict[agency]["HydroShare_id"].astype("S100"))
-                self.set_variable_atts(HydroShare[f"{agency}_id"], variable_atts[f"{agency}_id"])
-                
-                HydroShare[f"{agency}_q"][:] = np.nan_to_num(self.map_dict[agency]["HydroShare_q"], copy=True, nan=self.FLOAT_FILL)
-                self.set_variable_atts(HydroShare[f"{agency}_q"], variable_atts[f"{agency}_q"])
-                
-                HydroShare[f"{agency}_qt"][:] = np.nan_to_num(self.map_dict[agency]["HydroShare_qt"], copy=True, nan=self.FLOAT_FILL)
-                self.set_variable_atts(HydroShare[f"{agency}_qt"], variable_atts[f"{agency}_qt"])
+                plan = WritePlan(HydroShare)
+                plan.add("num_days", self.map_dict[agency]["days"], variable_atts["num_days"])
+                plan.add(f"{agency}_reaches", atts=variable_atts[f"{agency}_reaches"])
+                plan.add("CAL", atts=variable_atts["CAL"])
+                plan.add(f"{agency}_reach_id", self.map_dict[agency]["HydroShare_reach_id"], variable_atts[f"{agency}_reach_id"])
+                plan.add(f"{agency}_flow_duration_q", self.map_dict[agency]["fdq"], variable_atts[f"{agency}_flow_duration_q"], self.FLOAT_FILL, rows)
+                plan.add(f"{agency}_max_q", self.map_dict[agency]["max_q"], variable_atts[f"{agency}_max_q"], self.FLOAT_FILL, rows)
+                plan.add(f"{agency}_monthly_q", self.map_dict[agency]["monthly_q"], variable_atts[f"{agency}_monthly_q"], self.FLOAT_FILL, rows)
+                plan.add(f"{agency}_mean_q", self.map_dict[agency]["mean_q"], variable_atts[f"{agency}_mean_q"], self.FLOAT_FILL, rows)
+                plan.add(f"{agency}_min_q", self.map_dict[agency]["min_q"], variable_atts[f"{agency}_min_q"], self.FLOAT_FILL, rows)
+                plan.add(f"{agency}_two_year_return_q", self.map_dict[agency]["tyr"], variable_atts[f"{agency}_two_year_return_q"], self.FLOAT_FILL, rows)
+                plan.add(f"{agency}_id", stringtochar(self.map_dict[agency]["HydroShare_id"].astype("S100")), variable_atts[f"{agency}_id"], rows=rows)
+                plan.add(f"{agency}_q", self.map_dict[agency]["HydroShare_q"], variable_atts[f"{agency}_q"], self.FLOAT_FILL, rows)
+                plan.add(f"{agency}_qt", self.map_dict[agency]["HydroShare_qt"], variable_atts[f"{agency}_qt"], self.FLOAT_FILL, rows)
+                plan.write()
                 
             sos.close()
             
+    def clear_rows(self, group, agency, rows):
+        """Fills rows of reaches that are no longer measured.
+
+        Sparse writes only touch measured rows, so reaches that held
+        measurements in the previous version but not in this one are found
+        from their gauge identifiers and set to fill values.
+
+        Parameters
+        ----------
+        group: netCDF4.Group
+            agency group of the SoS
+        agency: str
+            name of agency group
+        rows: numpy.ndarray
+            rows of the reaches with measurements
+        """
+
+        ids = chartostring(np.ma.filled(group[f"{agency}_id"][:], b""))
+        stale = np.setdiff1d(np.where((ids != "") & (ids != self.ID_FILL))[0], rows)
+        if stale.size == 0: return
+
+        print('clearing', stale.size, 'reaches without measurements')
+        for name in ("flow_duration_q", "max_q", "monthly_q", "mean_q", "min_q", "two_year_return_q", "q", "qt"):
+            variable = group[f"{agency}_{name}"]
+            variable[stale] = np.full((stale.size,) + variable.shape[1:], self.FLOAT_FILL, dtype=np.float64)
+        group[f"{agency}_id"][stale] = stringtochar(np.full(stale.size, self.ID_FILL).astype("S100"))
+
     def set_variable_atts(self, variable, variable_dict):
-        """Set the variable attribute metdata."""
+        """Set the variable attribute metdata that differs from the current values."""
         
-        for name, value in variable_dict.items():
-            setattr(variable, name, value)
\ No newline at end of file
+        apply_atts(variable, variable_dict)
\ No newline at end of file
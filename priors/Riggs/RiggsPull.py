@@ -46,6 +46,7 @@ downloadQ_saf=robjects.globalenv['qdownload_Saf']
 
 # Local imports
 from .RiggsRead import RiggsRead
+from priors.targets.TargetIndex import TargetIndex
 
 
 
@@ -79,19 +80,25 @@ class RiggsPull:
         Dictionary of riggs data  
     riggs_targets: Path
         Path to USGS targets file
+    cache: ResponseCache
+        On-disk cache of agency responses (optional)
+    session: requests.Session
+        HTTP session shared by agency downloads (optional)
 
     Methods
     -------
     gather_records(sites)
         Creates and returns a list of dataframes for each riggs record
+    download_record(site, agencyR)
+        Download riggs record from agency
     get_record(site)
-        Get riggs record
+        Get riggs record, using the response cache when available
     pull() 
         Pulls riggs data and flags(?) and stores in riggs_dict
     """
 
 
-    def __init__(self, riggs_targets, start_date, end_date, cont, sos_file):
+    def __init__(self, riggs_targets, start_date, end_date, cont, sos_file, cache=None, session=None):
         """
         Parameters
         ----------
@@ -103,6 +110,10 @@ class RiggsPull:
             Date to end search for
         cont: str
             String identifier for what continent the module is running on
+        cache: ResponseCache
+            On-disk cache of agency responses (optional)
+        session: requests.Session
+            HTTP session shared by agency downloads (optional)
         """
         
         self.riggs_targets = riggs_targets
@@ -111,6 +122,23 @@ class RiggsPull:
         self.riggs_dict = {}
         self.cont = cont
         self.sos_file = sos_file
+        self.cache = cache
+        self.session = session
+
+    def url_retrieve(self, url, site, start_date, end_date, filename):
+        """Download url to filename, using the response cache when available."""
+
+        if self.cache is not None:
+            content = self.cache.fetch(url, 'WSC_realtime', site, start_date, end_date, session=self.session)
+        elif self.session is not None:
+            response = self.session.get(url, timeout=300)
+            response.raise_for_status()
+            content = response.content
+        else:
+            UL.request.urlretrieve(url, filename)
+            return
+        with open(filename, 'wb') as csv_file:
+            csv_file.write(content)
         
     def canURLpull(self,site,FMr):
         ID=FMr
@@ -134,7 +162,7 @@ class RiggsPull:
                 now=dt.now()
                 ed=now.strftime("%Y-%m-%d")
                 URLst=S1+STid+S2+sd+S3+ed+S4
-                UL.request.urlretrieve(URLst,STid+".csv")
+                self.url_retrieve(URLst,STid,sd,ed,STid+".csv")
                 CSVd= genfromtxt(STid+".csv", delimiter=',', dtype='unicode',skip_header=1)
                 dates=[]
                 q=[]
@@ -193,7 +221,7 @@ class RiggsPull:
                 now=dt.now()
                 ed=now.strftime("%Y-%m-%d")
                 URLst=S1+STid+S2+sd+S3+ed+S4
-                UL.request.urlretrieve(URLst,STid+".csv")
+                self.url_retrieve(URLst,STid,sd,ed,STid+".csv")
                 CSVd= genfromtxt(STid+".csv", delimiter=',', dtype='unicode',skip_header=1)
                 dates=[]
                 q=[]
@@ -235,12 +263,30 @@ class RiggsPull:
     
 
     async def get_record(self,site,agencyR):
-        """Get rigs record.
+        """Get riggs record, using the response cache when available.
         
         Parameter
         ---------
         site: str
             Site identifier
+        agencyR: str
+            Agency of site
+        """
+
+        if self.cache is None:
+            return self.download_record(site, agencyR)
+        return self.cache.call(agencyR, site, self.start_date, self.end_date,
+                               self.download_record, site, agencyR)
+
+    def download_record(self,site,agencyR):
+        """Download riggs record from agency.
+        
+        Parameter
+        ---------
+        site: str
+            Site identifier
+        agencyR: str
+            Agency of site
         """
         #Rcode pull entire record, will need to filter after DL within this function
 
@@ -435,51 +481,12 @@ class RiggsPull:
         #define date range block here
         ALLt=pd.date_range(start='1980-1-1',end=self.end_date)
 
-        # get all reachIDR's we want to pull from non historic list
-        sos = Dataset(self.sos_file, 'a')
-
-        # this method of pulling in the gauge targets where we read the targets twice
-        # lets us pull gauges that are not in the historic_q group
+        # only pull the gauges that are not in the historic_q group
         gage_read = RiggsRead(Riggs_targets = self.riggs_targets, cont = self.cont)
-        # read in all gauges to create agencyR list
-        datariggs, reachIDR, agencyR, RIGGScal = gage_read.read()
-        # current_group_agency_reach_ids = []
-        print('going through these agencies')
-        print(list(set(list(agencyR))))
-        current_parsed_agency_ids = []
-        for agency in list(set(list(agencyR))):
-
-            agency_ids_from_sos =  list(sos[agency][f'{agency}_id'][:])
-            # print(agency_ids_from_sos)
-
-            for x in agency_ids_from_sos:
-                single_id = []
-                for i in x:
-                    if agency in ['DEFRA','EAU'] :
-                        try:
-                            single_id.append(i.decode('UTF-8'))
-                        except:
-                            single_id.append('-')
-                    else:
-                        single_id.append(i)
-                # print(single_id)
-                try:
-                    single_id = ''.join(single_id)
-                except TypeError:
-                    single_id = [i.decode('utf-8') for i in single_id]
-                    single_id = ''.join(single_id)
-                # print(single_id)
-                current_parsed_agency_ids.append(single_id)
-
-            # current_group_agency_reach_ids = current_group_agency_reach_ids + current_parsed_agency_ids
-
-        # convert the above to match the riggs
-        # print(current_group_agency_reach_ids)
-        current = []
-
-        datariggs, reachIDR, agencyR, RIGGScal = gage_read.read(current_group_agency_reach_ids = current_parsed_agency_ids)
-        # print(' reaches here should be good, this is after second pull, first was good')
-        # print(len(reachIDR), reachIDR)
+        agencies = gage_read.agencies()
+        sos_ids = TargetIndex(self.sos_file, agencies)
+        datariggs, reachIDR, agencyR, RIGGScal = gage_read.read(current_group_agency_reach_ids = sos_ids)
+        sos = Dataset(self.sos_file, 'a')
         print('here is agencyR', agencyR)
         df_list = asyncio.run(self.gather_records(datariggs, agencyR))
 
@@ -8,6 +8,10 @@ import numpy as np
 import collections
 import json
 
+# Local imports
+from priors.sos.AttributePlan import apply_atts
+from priors.sos.WritePlan import RowView, WritePlan
+
 class RiggsUpdate:
     """Class that updates Riggs gage data in the SoS.
     
@@ -138,8 +142,8 @@ class RiggsUpdate:
                 self.map_dict[agency]["min_q"] = self.Riggs_dict["Qmin"][agency_indexes]
                 self.map_dict[agency]["tyr"] = self.Riggs_dict["TwoYr"][agency_indexes]
                 self.map_dict[agency]["Riggs_id"] = np.array(self.Riggs_dict["data"])[agency_indexes]
-                self.map_dict[agency]["Riggs_q"] = self.Riggs_dict["Qwrite"][agency_indexes]
-                self.map_dict[agency]["Riggs_qt"] = self.Riggs_dict["Twrite"][agency_indexes]
+                self.map_dict[agency]["Riggs_q"] = RowView(self.Riggs_dict["Qwrite"], agency_indexes[0])
+                self.map_dict[agency]["Riggs_qt"] = RowView(self.Riggs_dict["Twrite"], agency_indexes[0])
 
         # Serializing json
         # for i in self.map_dict[agency]["Riggs_q"][:10]:
@@ -165,140 +169,35 @@ class RiggsUpdate:
             for agency in agencies:
                 
                 print("AGENCY: ", agency)
+                if agency in self.variable_atts.keys():
+                    variable_atts = self.variable_atts[agency]
+                else:
+                    print('metadata not found for this agency:', agency)
+                    variable_atts = collections.defaultdict(lambda: None)
 
-                
                 Riggs = sos[agency]
-                
-                print('no metadata for ',agency)
-                Riggs["num_days"][:] = self.map_dict[agency]["days"]
-                print('how many days',len(Riggs["num_days"][:]))
                 print('how many gauges found', len(self.map_dict[agency]["Riggs_reach_id"]))
-                print('how many are there', len(Riggs[f"{agency}_reach_id"][:]))
 
-                
                 # used f string for agency so it generalizes the sos creation for different agencies
-                
-
-                
-                Riggs[f"{agency}_reach_id"][:] = self.map_dict[agency]["Riggs_reach_id"]
-
-                
-                Riggs[f"{agency}_flow_duration_q"][:] = np.nan_to_num(self.map_dict[agency]["fdq"], copy=True, nan=self.FLOAT_FILL)
-
-                
-                Riggs[f"{agency}_max_q"][:] = np.nan_to_num(self.map_dict[agency]["max_q"], copy=True, nan=self.FLOAT_FILL)
-
-                
-                Riggs[f"{agency}_monthly_q"][:] = np.nan_to_num(self.map_dict[agency]["monthly_q"], copy=True, nan=self.FLOAT_FILL)
-
-                
-                Riggs[f"{agency}_mean_q"][:] = np.nan_to_num(self.map_dict[agency]["mean_q"], copy=True, nan=self.FLOAT_FILL)
-
-                
-                Riggs[f"{agency}_min_q"][:] = np.nan_to_num(self.map_dict[agency]["min_q"], copy=True, nan=self.FLOAT_FILL)
-
-                
-                Riggs[f"{agency}_two_year_return_q"][:] = np.nan_to_num(self.map_dict[agency]["tyr"], copy=True, nan=self.FLOAT_FILL)
-
-                
-                Riggs[f"{agency}_id"][:] = stringtochar(self.map_dict[agency]["Riggs_id"].astype("S100"))
-
-                
-
-                Riggs[f"{agency}_q"][:] = np.nan_to_num(self.map_dict[agency]["Riggs_q"], copy=True, nan=self.FLOAT_FILL)
+                plan = WritePlan(Riggs)
+                plan.add(f"{agency}_reaches", atts=variable_atts[f"{agency}_reaches"])
+                plan.add("CAL", atts=variable_atts["CAL"])
+                plan.add("num_days", self.map_dict[agency]["days"], variable_atts["num_days"])
+                plan.add(f"{agency}_reach_id", self.map_dict[agency]["Riggs_reach_id"], variable_atts[f"{agency}_reach_id"])
+                plan.add(f"{agency}_flow_duration_q", self.map_dict[agency]["fdq"], variable_atts[f"{agency}_flow_duration_q"], self.FLOAT_FILL)
+                plan.add(f"{agency}_max_q", self.map_dict[agency]["max_q"], variable_atts[f"{agency}_max_q"], self.FLOAT_FILL)
+                plan.add(f"{agency}_monthly_q", self.map_dict[agency]["monthly_q"], variable_atts[f"{agency}_monthly_q"], self.FLOAT_FILL)
+                plan.add(f"{agency}_mean_q", self.map_dict[agency]["mean_q"], variable_atts[f"{agency}_mean_q"], self.FLOAT_FILL)
+                plan.add(f"{agency}_min_q", self.map_dict[agency]["min_q"], variable_atts[f"{agency}_min_q"], self.FLOAT_FILL)
+                plan.add(f"{agency}_two_year_return_q", self.map_dict[agency]["tyr"], variable_atts[f"{agency}_two_year_return_q"], self.FLOAT_FILL)
+                plan.add(f"{agency}_id", stringtochar(self.map_dict[agency]["Riggs_id"].astype("S100")), variable_atts[f"{agency}_id"])
+                plan.add(f"{agency}_q", self.map_dict[agency]["Riggs_q"], variable_atts[f"{agency}_q"], self.FLOAT_FILL)
+                plan.add(f"{agency}_qt", self.map_dict[agency]["Riggs_qt"], variable_atts[f"{agency}_qt"], self.FLOAT_FILL)
+                plan.write()
 
-                
-                Riggs[f"{agency}_qt"][:] = np.nan_to_num(self.map_dict[agency]["Riggs_qt"], copy=True, nan=self.FLOAT_FILL)
-
-                print('how many days',len(Riggs["num_days"][:]))
-                print('how many gauges found', len(self.map_dict[agency]["Riggs_reach_id"]))
-                print('how many are there', len(Riggs[f"{agency}_reach_id"][:]))
-                
-                # used f string for agency so it generalizes the sos creation for different agencies
-                
-
-                
-                Riggs[f"{agency}_reach_id"][:] = self.map_dict[agency]["Riggs_reach_id"]
-                
-                Riggs[f"{agency}_flow_duration_q"][:] = np.nan_to_num(self.map_dict[agency]["fdq"], copy=True, nan=self.FLOAT_FILL)
-
-                
-                Riggs[f"{agency}_max_q"][:] = np.nan_to_num(self.map_dict[agency]["max_q"], copy=True, nan=self.FLOAT_FILL)
-
-                
-                Riggs[f"{agency}_monthly_q"][:] = np.nan_to_num(self.map_dict[agency]["monthly_q"], copy=True, nan=self.FLOAT_FILL)
-
-                
-                Riggs[f"{agency}_mean_q"][:] = np.nan_to_num(self.map_dict[agency]["mean_q"], copy=True, nan=self.FLOAT_FILL)
-
-                
-                Riggs[f"{agency}_min_q"][:] = np.nan_to_num(self.map_dict[agency]["min_q"], copy=True, nan=self.FLOAT_FILL)
-
-                
-                Riggs[f"{agency}_two_year_return_q"][:] = np.nan_to_num(self.map_dict[agency]["tyr"], copy=True, nan=self.FLOAT_FILL)
-
-                
-                Riggs[f"{agency}_id"][:] = stringtochar(self.map_dict[agency]["Riggs_id"].astype("S100"))
-                
-                Riggs[f"{agency}_q"][:] = np.nan_to_num(self.map_dict[agency]["Riggs_q"], copy=True, nan=self.FLOAT_FILL)
-                
-                Riggs[f"{agency}_qt"][:] = np.nan_to_num(self.map_dict[agency]["Riggs_qt"], copy=True, nan=self.FLOAT_FILL)
-                try:
-                    variable_atts = self.variable_atts[agency]
-                    self.set_variable_atts(Riggs[f"{agency}_qt"], variable_atts[f"{agency}_qt"])
-                    self.set_variable_atts(Riggs[f"{agency}_q"], variable_atts[f"{agency}_q"])
-                    self.set_variable_atts(Riggs[f"{agency}_id"], variable_atts[f"{agency}_id"])
-                    self.set_variable_atts(Riggs["num_days"], variable_atts["num_days"])
-                    self.set_variable_atts(Riggs[f"{agency}_reaches"], variable_atts[f"{agency}_reaches"])
-                    self.set_variable_atts(Riggs["CAL"], variable_atts["CAL"])
-                    self.set_variable_atts(Riggs[f"{agency}_flow_duration_q"], variable_atts[f"{agency}_flow_duration_q"])
-                    self.set_variable_atts(Riggs[f"{agency}_max_q"], variable_atts[f"{agency}_max_q"])
-                    self.set_variable_atts(Riggs[f"{agency}_monthly_q"], variable_atts[f"{agency}_monthly_q"])
-                    self.set_variable_atts(Riggs[f"{agency}_mean_q"], variable_atts[f"{agency}_mean_q"])
-                    self.set_variable_atts(Riggs[f"{agency}_min_q"], variable_atts[f"{agency}_min_q"])
-                    self.set_variable_atts(Riggs[f"{agency}_two_year_return_q"], variable_atts[f"{agency}_two_year_return_q"])
-                    self.set_variable_atts(Riggs[f"{agency}_id"], variable_atts[f"{agency}_id"])
-                    self.set_variable_atts(Riggs[f"{agency}_q"], variable_atts[f"{agency}_q"])
-                    self.set_variable_atts(Riggs[f"{agency}_qt"], variable_atts[f"{agency}_qt"])
-
-                    self.set_variable_atts(Riggs[f"{agency}_reaches"], variable_atts[f"{agency}_reaches"])
-                    self.set_variable_atts(Riggs["CAL"], variable_atts["CAL"])
-                    self.set_variable_atts(Riggs[f"{agency}_flow_duration_q"], variable_atts[f"{agency}_flow_duration_q"])
-                    self.set_variable_atts(Riggs[f"{agency}_max_q"], variable_atts[f"{agency}_max_q"])
-                    self.set_variable_atts(Riggs[f"{agency}_monthly_q"], variable_atts[f"{agency}_monthly_q"])
-                    self.set_variable_atts(Riggs[f"{agency}_mean_q"], variable_atts[f"{agency}_mean_q"])
-                    self.set_variable_atts(Riggs[f"{agency}_min_q"], variable_atts[f"{agency}_min_q"])
-                    self.set_variable_atts(Riggs[f"{agency}_two_year_return_q"], variable_atts[f"{agency}_two_year_return_q"])
-                    self.set_variable_atts(Riggs["num_days"], variable_atts["num_days"])
-
-                except:
-                    print('no metadata for ',agency)
-
-                
-                if agency in self.variable_atts.keys():
-                    variable_atts = self.variable_atts[agency]
-                    self.set_variable_atts(Riggs["num_days"], variable_atts["num_days"])
-                
-                # used f string for agency so it generalizes the sos creation for different agencies
-                
-                    self.set_variable_atts(Riggs[f"{agency}_reaches"], variable_atts[f"{agency}_reaches"])
-                    self.set_variable_atts(Riggs[f"{agency}_max_q"], variable_atts[f"{agency}_max_q"])
-                    self.set_variable_atts(Riggs["CAL"], variable_atts["CAL"])
-                    self.set_variable_atts(Riggs[f"{agency}_reach_id"], variable_atts[f"{agency}_reach_id"])
-                    self.set_variable_atts(Riggs[f"{agency}_flow_duration_q"], variable_atts[f"{agency}_flow_duration_q"])
-                    self.set_variable_atts(Riggs[f"{agency}_monthly_q"], variable_atts[f"{agency}_monthly_q"])
-                    self.set_variable_atts(Riggs[f"{agency}_mean_q"], variable_atts[f"{agency}_mean_q"])
-                    self.set_variable_atts(Riggs[f"{agency}_min_q"], variable_atts[f"{agency}_min_q"])
-                    self.set_variable_atts(Riggs[f"{agency}_two_year_return_q"], variable_atts[f"{agency}_two_year_return_q"])
-                    self.set_variable_atts(Riggs[f"{agency}_id"], variable_atts[f"{agency}_id"])
-                    self.set_variable_atts(Riggs[f"{agency}_q"], variable_atts[f"{agency}_q"])
-                    self.set_variable_atts(Riggs[f"{agency}_qt"], variable_atts[f"{agency}_qt"])
-                else:
-                    print('metadata not found for this agency:', agency)
             sos.close()
             
     def set_variable_atts(self, variable, variable_dict):
-        """Set the variable attribute metdata."""
+        """Set the variable attribute metdata that differs from the current values."""
         
-        for name, value in variable_dict.items():
-            setattr(variable, name, value)
\ No newline at end of file
+        apply_atts(variable, variable_dict)
\ No newline at end of file
@@ -0,0 +1,315 @@
+"""Module that caches gauge agency responses on local or mounted storage.
+
+Responses are stored under a content address derived from the agency, site
+and date range of the request so that re-runs of a continent and paired
+constrained/unconstrained jobs that mount the same cache directory can reuse
+each other's downloads.
+
+Classes
+-------
+ResponseCache: On-disk cache with TTL, size-bounded LRU eviction and
+    conditional revalidation
+"""
+
+# Standard imports
+import hashlib
+import json
+import os
+from pathlib import Path
+import pickle
+import tempfile
+import time
+
+# Third-party imports
+import requests
+
+class ResponseCache:
+    """Class that stores and retrieves gauge agency responses on disk.
+
+    Each entry is a pickled payload and a JSON metadata sidecar. The sidecar
+    records when the entry was stored and any HTTP validators (ETag and
+    Last-Modified) so that stale entries can be revalidated with a
+    conditional request instead of a full download.
+
+    Attributes
+    ----------
+    cache_dir: Path
+        path to cache directory (may be a mounted volume shared by jobs)
+    max_bytes: int
+        maximum size of all cached payloads before LRU eviction
+    ttl: int
+        number of seconds an entry is considered fresh
+
+    Methods
+    -------
+    call(agency, site, start_date, end_date, function, *args, **kwargs)
+        Return cached result of function or call it and store the result
+    evict()
+        Remove least recently used entries until cache is within max_bytes
+    fetch(url, agency, site, start_date, end_date, session)
+        Return body of url, revalidating stale entries where possible
+    get(key, allow_stale)
+        Return payload and metadata stored under key
+    key(agency, site, start_date, end_date)
+        Return content address for a request
+    put(key, payload, etag, last_modified, **identity)
+        Store payload under key
+    touch(key)
+        Mark entry under key as freshly validated
+    """
+
+    TTL = 604800    # seconds
+    MAX_BYTES = 5 * 1024 ** 3
+    EVICT_INTERVAL = 100    # number of stores between eviction scans
+
+    def __init__(self, cache_dir, ttl=TTL, max_bytes=MAX_BYTES):
+        """
+        Parameters
+        ----------
+        cache_dir: Path
+            path to cache directory
+        ttl: int
+            number of seconds an entry is considered fresh
+        max_bytes: int
+            maximum size of all cached payloads before LRU eviction
+        """
+
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._puts = 0
+
+    def key(self, agency, site, start_date, end_date):
+        """Return content address for a request.
+
+        Parameters
+        ----------
+        agency: str
+            gauge agency or service name
+        site: str
+            site identifier
+        start_date: str
+            date to start search for
+        end_date: str
+            date to end search for
+        """
+
+        identity = json.dumps([str(agency), str(site), str(start_date), str(end_date)])
+        return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+    def get(self, key, allow_stale=False):
+        """Return payload and metadata stored under key.
+
+        Returns (None, None) when there is no entry or when the entry is
+        stale and allow_stale is False.
+
+        Parameters
+        ----------
+        key: str
+            content address of entry
+        allow_stale: bool
+            indicate if entries older than ttl may be returned
+        """
+
+        payload_file, meta_file = self.__entry_paths(key)
+        try:
+            with open(meta_file) as jf:
+                meta = json.load(jf)
+            if not allow_stale and self.__is_stale(meta):
+                return None, None
+            with open(payload_file, "rb") as pf:
+                payload = pickle.load(pf)
+        except (FileNotFoundError, json.JSONDecodeError, pickle.UnpicklingError, EOFError):
+            return None, None
+
+        # Record access for LRU eviction
+        try:
+            os.utime(meta_file)
+        except FileNotFoundError:
+            pass
+        return payload, meta
+
+    def put(self, key, payload, etag=None, last_modified=None, **identity):
+        """Store payload under key.
+
+        Parameters
+        ----------
+        key: str
+            content address of entry
+        payload: object
+            picklable response data
+        etag: str
+            ETag header of HTTP response
+        last_modified: str
+            Last-Modified header of HTTP response
+        identity: dict
+            request identity (agency, site, dates) recorded for debugging
+        """
+
+        payload_file, meta_file = self.__entry_paths(key)
+        payload_file.parent.mkdir(parents=True, exist_ok=True)
+        data = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+        meta = {
+            "created": time.time(),
+            "etag": etag,
+            "last_modified": last_modified,
+            "size": len(data),
+            **{name: str(value) for name, value in identity.items()}
+        }
+        self.__atomic_write(payload_file, data)
+        self.__atomic_write(meta_file, json.dumps(meta).encode("utf-8"))
+        self._puts += 1
+        if self._puts % self.EVICT_INTERVAL == 0: self.evict()
+
+    def touch(self, key):
+        """Mark entry under key as freshly validated."""
+
+        _, meta_file = self.__entry_paths(key)
+        try:
+            with open(meta_file) as jf:
+                meta = json.load(jf)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        meta["created"] = time.time()
+        self.__atomic_write(meta_file, json.dumps(meta).encode("utf-8"))
+
+    def call(self, agency, site, start_date, end_date, function, *args, **kwargs):
+        """Return cached result of function or call it and store the result.
+
+        Used for agency clients that do not expose HTTP validators (NWIS via
+        dataretrieval and the R agency download functions). Empty results
+        are not stored so that failed downloads are retried on the next run.
+
+        Parameters
+        ----------
+        agency: str
+            gauge agency or service name
+        site: str
+            site identifier
+        start_date: str
+            date to start search for
+        end_date: str
+            date to end search for
+        function: callable
+            function that downloads the record
+        """
+
+        key = self.key(agency, site, start_date, end_date)
+        payload, _ = self.get(key)
+        if payload is not None:
+            return payload
+
+        payload = function(*args, **kwargs)
+        if payload is not None and len(payload) > 0:
+            self.put(key, payload, agency=agency, site=site,
+                     start_date=start_date, end_date=end_date)
+        return payload
+
+    def fetch(self, url, agency, site, start_date, end_date, session=None, timeout=300, revalidate=False):
+        """Return body of url, revalidating stale entries where possible.
+
+        Parameters
+        ----------
+        url: str
+            URL to download
+        agency: str
+            gauge agency or service name
+        site: str
+            site identifier
+        start_date: str
+            date to start search for
+        end_date: str
+            date to end search for
+        session: requests.Session
+            session used to issue requests
+        timeout: int
+            number of seconds to wait for a response
+        revalidate: bool
+            indicate if fresh entries are also revalidated with a conditional
+            request before they are returned
+
+        Returns
+        -------
+        bytes of response body
+        """
+
+        session = session if session is not None else requests
+        key = self.key(agency, site, start_date, end_date)
+        payload, meta = self.get(key, allow_stale=True)
+        if payload is not None and not revalidate and not self.__is_stale(meta):
+            return payload
+
+        # Conditional revalidation of stale entry
+        headers = {}
+        if payload is not None:
+            if meta.get("etag"): headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"): headers["If-Modified-Since"] = meta["last_modified"]
+
+        response = session.get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304 and payload is not None:
+            self.touch(key)
+            return payload
+        response.raise_for_status()
+
+        self.put(key, response.content,
+                 etag=response.headers.get("ETag"),
+                 last_modified=response.headers.get("Last-Modified"),
+                 agency=agency, site=site, start_date=start_date, end_date=end_date,
+                 url=url)
+        return response.content
+
+    def evict(self):
+        """Remove least recently used entries until cache is within max_bytes.
+
+        Entries older than twice the ttl are removed regardless of size as
+        they are unlikely to be revalidated by another job.
+        """
+
+        entries = []
+        for meta_file in self.cache_dir.glob("*/*.json"):
+            try:
+                with open(meta_file) as jf:
+                    meta = json.load(jf)
+                entries.append((meta_file.stat().st_mtime, meta_file, meta))
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue
+
+        total = sum(meta.get("size", 0) for _, _, meta in entries)
+        entries.sort(key=lambda entry: entry[0])
+        for _, meta_file, meta in entries:
+            expired = time.time() - meta.get("created", 0) > 2 * self.ttl
+            if total <= self.max_bytes and not expired:
+                continue
+            for path in (meta_file, meta_file.with_suffix(".pkl")):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+            total -= meta.get("size", 0)
+
+    def __entry_paths(self, key):
+        """Return payload and metadata paths for key."""
+
+        entry_dir = self.cache_dir / key[:2]
+        return entry_dir / f"{key}.pkl", entry_dir / f"{key}.json"
+
+    def __is_stale(self, meta):
+        """Determine if entry metadata is older than ttl."""
+
+        return time.time() - meta.get("created", 0) > self.ttl
+
+    def __atomic_write(self, path, data):
+        """Write data to path so that concurrent readers never see partial files."""
+
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tf:
+                tf.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+            raise
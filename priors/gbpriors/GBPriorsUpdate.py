@@ -5,6 +5,12 @@ from datetime import datetime
 from netCDF4 import Dataset
 import numpy as np
 
+# Local imports
+from priors.sos.AttributePlan import apply_atts
+from priors.sos.SosIndex import SosIndex
+from priors.sos.StorageProfile import StorageProfile
+from priors.sos.WritePlan import WritePlan
+
 class GBPriorsUpdate:
     """Class that updates geoBAM priors to the SoS.
     
@@ -12,12 +18,16 @@ class GBPriorsUpdate:
     ----------
     FLOAT_FILL: float
         Fill value for any missing float values in mapped WBM data
+    FLOAT_VARIABLES: list
+        Names of float geoBAM prior variables written at each level
     gb_dict: dict
         dictionary of GeoBAM priors organized by continent
     INT_FILL: int
         Fill value for any missing integer values in mapped WBM data
     sos_file: Path
         path to SoS NetCDF file
+    storage_profile: StorageProfile
+        chunking and compression applied to created variables
 
     Methods
     -------
@@ -29,8 +39,17 @@ class GBPriorsUpdate:
 
     FLOAT_FILL = -999999999999
     INT_FILL = -999
-
-    def __init__(self, gb_dict, sos_file, metadata_json):
+    FLOAT_VARIABLES = ["lowerbound_A0", "upperbound_A0", "lowerbound_logn",
+        "upperbound_logn", "lowerbound_b", "upperbound_b", "lowerbound_logWb",
+        "upperbound_logWb", "lowerbound_logDb", "upperbound_logDb",
+        "lowerbound_logr", "upperbound_logr", "logA0_hat", "logn_hat", "b_hat",
+        "logWb_hat", "logDb_hat", "logr_hat", "logA0_sd", "logn_sd", "b_sd",
+        "logWb_sd", "logDb_sd", "logr_sd", "lowerbound_logWc",
+        "upperbound_logWc", "lowerbound_logQc", "upperbound_logQc", "logWc_hat",
+        "logQc_hat", "logQ_sd", "logWc_sd", "logQc_sd", "Werr_sd", "Serr_sd",
+        "dAerr_sd", "sigma_man", "sigma_amhg"]
+
+    def __init__(self, gb_dict, sos_file, metadata_json, storage_profile=None):
         """
         Parameters
         ----------
@@ -38,10 +57,13 @@ class GBPriorsUpdate:
             dictionary of geoBAM priors organized by continent
         sos_file: Path
             path to SoS NetCDF file
+        storage_profile: StorageProfile
+            chunking and compression applied to created variables (default profile if None)
         """
 
         self.gb_dict = gb_dict
         self.sos_file = sos_file
+        self.storage_profile = storage_profile if storage_profile else StorageProfile()
         self.variable_atts = metadata_json["gbpriors"]
 
     def update_data(self):
@@ -62,6 +84,8 @@ class GBPriorsUpdate:
 
         rch_grp = sos["gbpriors"]["reach"]
         nod_grp = sos["gbpriors"]["node"]
+        index = SosIndex(sos)
+        reach_ids = sos['reaches']['reach_id'][:]
 
         for cnt, variable in enumerate(nod_grp.variables):
             print('update empty nodes - processing', variable, 'variable.', cnt+1, 'of', len(nod_grp.variables))
@@ -74,7 +98,7 @@ class GBPriorsUpdate:
                 reaches_indices_with_gbpriors = np.where(rch_grp[variable][:].mask == False)[0]   # Non-missing reach-level data
 
                 for reach_index in reaches_indices_with_gbpriors:
-                    nodes_index = np.where(sos['nodes']['reach_id'][:] == sos['reaches']['reach_id'][reach_index])[0]
+                    nodes_index = index.node_rows(reach_ids[reach_index])
                     all_empty_node_data_index = np.where(nod_grp[variable][:].mask[nodes_index] == True)
 
                     if (all_empty_node_data_index[0].shape[0]) > 0:
@@ -97,7 +121,7 @@ class GBPriorsUpdate:
             oi[:] = [self.gb_dict["reach"]["overwritten_indexes"]]
             self.set_variable_atts(oi, self.variable_atts["reach"]["overwritten_indexes"])
         else:
-            oi = sos["gbpriors"]["reach"].createVariable("overwritten_indexes", "i4", ("num_reaches",), compression="zlib")
+            oi = self.storage_profile.create_variable(sos["gbpriors"]["reach"], "overwritten_indexes", "i4", ("num_reaches",))
             oi.long_name = "GeoBAM overwritten_prior_indexes"
             oi.comment = "Indexes of geoBAM priors that were overwritten."
             oi.coverage_content_type = "qualityInformation"
@@ -109,7 +133,7 @@ class GBPriorsUpdate:
             self.set_variable_atts(oi, self.variable_atts["node"]["overwritten_indexes"])
 
         else:
-            oi = sos["gbpriors"]["node"].createVariable("overwritten_indexes", "i4", ("num_nodes",), compression="zlib")
+            oi = self.storage_profile.create_variable(sos["gbpriors"]["node"], "overwritten_indexes", "i4", ("num_nodes",))
             oi.long_name = "GeoBAM overwritten_prior_indexes"
             oi.comment = "Indexes of geoBAM priors that were overwritten."
             oi.coverage_content_type = "qualityInformation"
@@ -127,125 +151,13 @@ class GBPriorsUpdate:
         """
         grp = sos['gbpriors'][level]
 
-        grp["river_type"][:] = np.nan_to_num(self.gb_dict[level]["river_type"], copy=True, nan=self.INT_FILL)
-        self.set_variable_atts(grp["river_type"], self.variable_atts[level]["river_type"])
-
-        grp["lowerbound_A0"][:] = np.nan_to_num(self.gb_dict[level]["lowerbound_A0"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["lowerbound_A0"], self.variable_atts[level]["lowerbound_A0"])
-
-        grp["upperbound_A0"][:] = np.nan_to_num(self.gb_dict[level]["upperbound_A0"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["upperbound_A0"], self.variable_atts[level]["upperbound_A0"])
-
-        grp["lowerbound_logn"][:] = np.nan_to_num(self.gb_dict[level]["lowerbound_logn"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["lowerbound_logn"], self.variable_atts[level]["lowerbound_logn"])
-
-        grp["upperbound_logn"][:] = np.nan_to_num(self.gb_dict[level]["upperbound_logn"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["upperbound_logn"], self.variable_atts[level]["upperbound_logn"])
-
-        grp["lowerbound_b"][:] = np.nan_to_num(self.gb_dict[level]["lowerbound_b"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["lowerbound_b"], self.variable_atts[level]["lowerbound_b"])
-
-        grp["upperbound_b"][:] = np.nan_to_num(self.gb_dict[level]["upperbound_b"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["upperbound_b"], self.variable_atts[level]["upperbound_b"])
-
-        grp["lowerbound_logWb"][:] = np.nan_to_num(self.gb_dict[level]["lowerbound_logWb"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["lowerbound_logWb"], self.variable_atts[level]["lowerbound_logWb"])
-
-        grp["upperbound_logWb"][:] = np.nan_to_num(self.gb_dict[level]["upperbound_logWb"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["upperbound_logWb"], self.variable_atts[level]["upperbound_logWb"])
-
-        grp["lowerbound_logDb"][:] = np.nan_to_num(self.gb_dict[level]["lowerbound_logDb"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["lowerbound_logDb"], self.variable_atts[level]["lowerbound_logDb"])
-
-        grp["upperbound_logDb"][:] = np.nan_to_num(self.gb_dict[level]["upperbound_logDb"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["upperbound_logDb"], self.variable_atts[level]["upperbound_logDb"])
-
-        grp["lowerbound_logr"][:] = np.nan_to_num(self.gb_dict[level]["lowerbound_logr"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["lowerbound_logr"], self.variable_atts[level]["lowerbound_logr"])
-
-        grp["upperbound_logr"][:] = np.nan_to_num(self.gb_dict[level]["upperbound_logr"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["upperbound_logr"], self.variable_atts[level]["upperbound_logr"])
-
-        grp["logA0_hat"][:] = np.nan_to_num(self.gb_dict[level]["logA0_hat"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["logA0_hat"], self.variable_atts[level]["logA0_hat"])
-
-        grp["logn_hat"][:] = np.nan_to_num(self.gb_dict[level]["logn_hat"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["logn_hat"], self.variable_atts[level]["logn_hat"])
-
-        grp["b_hat"][:] = np.nan_to_num(self.gb_dict[level]["b_hat"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["b_hat"], self.variable_atts[level]["b_hat"])
-
-        grp["logWb_hat"][:] = np.nan_to_num(self.gb_dict[level]["logWb_hat"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["logWb_hat"], self.variable_atts[level]["logWb_hat"])
-
-        grp["logDb_hat"][:] = np.nan_to_num(self.gb_dict[level]["logDb_hat"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["logDb_hat"], self.variable_atts[level]["logDb_hat"])
-
-        grp["logr_hat"][:] = np.nan_to_num(self.gb_dict[level]["logr_hat"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["logr_hat"], self.variable_atts[level]["logr_hat"])
-
-        grp["logA0_sd"][:] = np.nan_to_num(self.gb_dict[level]["logA0_sd"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["logA0_sd"], self.variable_atts[level]["logA0_sd"])
-
-        grp["logn_sd"][:] = np.nan_to_num(self.gb_dict[level]["logn_sd"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["logn_sd"], self.variable_atts[level]["logn_sd"])
-
-        grp["b_sd"][:] = np.nan_to_num(self.gb_dict[level]["b_sd"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["b_sd"], self.variable_atts[level]["b_sd"])
-
-        grp["logWb_sd"][:] = np.nan_to_num(self.gb_dict[level]["logWb_sd"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["logWb_sd"], self.variable_atts[level]["logWb_sd"])
-
-        grp["logDb_sd"][:] = np.nan_to_num(self.gb_dict[level]["logDb_sd"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["logDb_sd"], self.variable_atts[level]["logDb_sd"])
-
-        grp["logr_sd"][:] = np.nan_to_num(self.gb_dict[level]["logr_sd"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["logr_sd"], self.variable_atts[level]["logr_sd"])
-
-        grp["lowerbound_logWc"][:] = np.nan_to_num(self.gb_dict[level]["lowerbound_logWc"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["lowerbound_logWc"], self.variable_atts[level]["lowerbound_logWc"])
-
-        grp["upperbound_logWc"][:] = np.nan_to_num(self.gb_dict[level]["upperbound_logWc"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["upperbound_logWc"], self.variable_atts[level]["upperbound_logWc"])
-
-        grp["lowerbound_logQc"][:] = np.nan_to_num(self.gb_dict[level]["lowerbound_logQc"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["lowerbound_logQc"], self.variable_atts[level]["lowerbound_logQc"])
-
-        grp["upperbound_logQc"][:] = np.nan_to_num(self.gb_dict[level]["upperbound_logQc"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["upperbound_logQc"], self.variable_atts[level]["upperbound_logQc"])
-
-        grp["logWc_hat"][:] = np.nan_to_num(self.gb_dict[level]["logWc_hat"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["logWc_hat"], self.variable_atts[level]["logWc_hat"])
-
-        grp["logQc_hat"][:] = np.nan_to_num(self.gb_dict[level]["logQc_hat"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["logQc_hat"], self.variable_atts[level]["logQc_hat"])
-
-        grp["logQ_sd"][:] = np.nan_to_num(self.gb_dict[level]["logQ_sd"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["logQ_sd"], self.variable_atts[level]["logQ_sd"])
-
-        grp["logWc_sd"][:] = np.nan_to_num(self.gb_dict[level]["logWc_sd"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["logWc_sd"], self.variable_atts[level]["logWc_sd"])
-
-        grp["logQc_sd"][:] = np.nan_to_num(self.gb_dict[level]["logQc_sd"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["logQc_sd"], self.variable_atts[level]["logQc_sd"])
-
-        grp["Werr_sd"][:] = np.nan_to_num(self.gb_dict[level]["Werr_sd"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["Werr_sd"], self.variable_atts[level]["Werr_sd"])
-
-        grp["Serr_sd"][:] = np.nan_to_num(self.gb_dict[level]["Serr_sd"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["Serr_sd"], self.variable_atts[level]["Serr_sd"])
-
-        grp["dAerr_sd"][:] = np.nan_to_num(self.gb_dict[level]["dAerr_sd"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["dAerr_sd"], self.variable_atts[level]["dAerr_sd"])
-
-        grp["sigma_man"][:] = np.nan_to_num(self.gb_dict[level]["sigma_man"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["sigma_man"], self.variable_atts[level]["sigma_man"])
-
-        grp["sigma_amhg"][:] = np.nan_to_num(self.gb_dict[level]["sigma_amhg"], copy=True, nan=self.FLOAT_FILL)
-        self.set_variable_atts(grp["sigma_amhg"], self.variable_atts[level]["sigma_amhg"])
+        plan = WritePlan(grp)
+        plan.add("river_type", self.gb_dict[level]["river_type"], self.variable_atts[level]["river_type"], self.INT_FILL)
+        for name in self.FLOAT_VARIABLES:
+            plan.add(name, self.gb_dict[level][name], self.variable_atts[level][name], self.FLOAT_FILL)
+        plan.write()
 
     def set_variable_atts(self, variable, variable_dict):
-        """Set the variable attribute metdata."""
+        """Set the variable attribute metdata that differs from the current values."""
         
-        for name, value in variable_dict.items():
-            setattr(variable, name, value)
\ No newline at end of file
+        apply_atts(variable, variable_dict)
\ No newline at end of file
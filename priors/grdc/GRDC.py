@@ -6,6 +6,58 @@ from pathlib import Path
 from netCDF4 import Dataset
 import numpy as np
 
+# Local imports
+from priors.sos.WritePlan import WritePlan
+
+def read_columns(variable, columns, max_gap=16):
+    """Read selected gauge columns of a GRDC variable in contiguous hyperslabs.
+
+    Columns are grouped into runs where consecutive selected columns are at
+    most max_gap apart; each run is read as one hyperslab over the last
+    (gauge) dimension and the unselected columns in it are dropped.
+
+    The returned array keeps the file's (..., gauge) indexing but is stored
+    gauge-major so that its transpose is already in the SoS (gauge, day)
+    order and can be written without a copy.
+
+    Parameters
+    ----------
+    variable: netCDF4.Variable
+        variable with gauges along its last dimension
+    columns: numpy.ndarray
+        sorted indexes of gauge columns to read
+    max_gap: int
+        largest gap between selected columns that is read through
+
+    Returns
+    -------
+    numpy.ndarray of float64 with missing values set to NaN
+    """
+
+    columns = np.asarray(columns, dtype=np.int64)
+    data = np.moveaxis(np.full((columns.size,) + variable.shape[:-1], np.nan), 0, -1)
+    breaks = np.where(np.diff(columns) > max_gap)[0] + 1
+    start = 0
+    for run in np.split(columns, breaks) if columns.size else []:
+        slab = variable[..., run[0]:run[-1] + 1]
+        data[..., start:start + run.size] = np.ma.filled(np.ma.asarray(slab, dtype=np.float64), np.nan)[..., run - run[0]]
+        start += run.size
+    return data
+
+def select_columns(data, indexes):
+    """Return gauge columns of data keeping its gauge-major storage.
+
+    Parameters
+    ----------
+    data: numpy.ndarray
+        array with gauges along its last dimension
+    indexes: numpy.ndarray
+        sorted indexes of gauge columns to select
+    """
+
+    if np.array_equal(indexes, np.arange(data.shape[-1])): return data
+    return np.moveaxis(np.moveaxis(data, -1, 0)[indexes], 0, -1)
+
 class GRDC:
     """ Stores GRDC data in the SoS.
 
@@ -35,7 +87,8 @@ class GRDC:
     read_sos()
         Reads in the SoS data and stores it in a dict organized by continent.
     read_grdc()
-        Reads in the GRDC data and stores it in a dict organized by data name.
+        Reads in the GRDC data of gauges on SoS reaches and stores it in a
+        dict organized by data name.
     update_data()
         Updates GRDC data in the SoS.
     """
@@ -70,30 +123,41 @@ class GRDC:
         # Map GRDC data that matches SoS reach identifiers
         self.map_dict["days"] = np.array(range(1, self.grdc_dict["dt"] + 1))
         self.map_dict["grdc_reach_id"] = self.grdc_dict["reach_id"][indexes]
-        self.map_dict["fdq"] = self.grdc_dict["fdq"][:,indexes]
+        self.map_dict["fdq"] = select_columns(self.grdc_dict["fdq"], indexes)
         self.map_dict["max_q"] = self.grdc_dict["max_q"][indexes]
-        self.map_dict["monthly_q"] = self.grdc_dict["monthly_q"][:,indexes]
+        self.map_dict["monthly_q"] = select_columns(self.grdc_dict["monthly_q"], indexes)
         self.map_dict["mean_q"] = self.grdc_dict["mean_q"][indexes]
         self.map_dict["min_q"] = self.grdc_dict["min_q"][indexes]
         self.map_dict["tyr"] = self.grdc_dict["tyr"][indexes]
         self.map_dict["grdc_id"] = self.grdc_dict["grdc_id"][indexes]
-        self.map_dict["grdc_q"] = self.grdc_dict["grdc_q"][:,indexes]
-        self.map_dict["grdc_qt"] = self.grdc_dict["grdc_qt"][:,indexes]
+        self.map_dict["grdc_q"] = select_columns(self.grdc_dict["grdc_q"], indexes)
+        self.map_dict["grdc_qt"] = select_columns(self.grdc_dict["grdc_qt"], indexes)
 
     def read_grdc(self):
-        """Reads in data from GRDC and stores in grdc_dict attribute."""
+        """Reads in data from GRDC and stores in grdc_dict attribute.
+
+        Reach identifiers are read first. If the SoS reaches have been read,
+        only the gauge columns on SoS reaches are read from the other
+        variables; otherwise all gauges are read.
+        """
 
         grdc = Dataset(self.grdc_file)
-        self.grdc_dict["reach_id"] = grdc["Reach_ID"][:].filled(np.nan).astype(int)
-        self.grdc_dict["fdq"] = grdc["Flow_DurationQ"][:].filled(np.nan)
-        self.grdc_dict["max_q"] = grdc["MaxQ"][:].filled(np.nan)
-        self.grdc_dict["monthly_q"] = grdc["MonthlyQ"][:].filled(np.nan)
-        self.grdc_dict["mean_q"] = grdc["MeanQ"][:].filled(np.nan)
-        self.grdc_dict["min_q"] = grdc["MinQ"][:].filled(np.nan)
-        self.grdc_dict["tyr"] = grdc["Two_Year_Return"][:].filled(np.nan)
-        self.grdc_dict["grdc_id"] = grdc["GRDC_id"][:].filled(np.nan).astype(int)
-        self.grdc_dict["grdc_q"] = grdc["GRDC_Q"][:].filled(np.nan)
-        self.grdc_dict["grdc_qt"] = grdc["GRDC_Qt"][:].filled(np.nan)
+        reach_id = grdc["Reach_ID"][:].filled(np.nan).astype(int)
+        if self.sos_reaches is None:
+            columns = np.arange(reach_id.size)
+        else:
+            columns = np.where(np.isin(reach_id, self.sos_reaches))[0]
+
+        self.grdc_dict["reach_id"] = reach_id[columns]
+        self.grdc_dict["fdq"] = read_columns(grdc["Flow_DurationQ"], columns)
+        self.grdc_dict["max_q"] = read_columns(grdc["MaxQ"], columns)
+        self.grdc_dict["monthly_q"] = read_columns(grdc["MonthlyQ"], columns)
+        self.grdc_dict["mean_q"] = read_columns(grdc["MeanQ"], columns)
+        self.grdc_dict["min_q"] = read_columns(grdc["MinQ"], columns)
+        self.grdc_dict["tyr"] = read_columns(grdc["Two_Year_Return"], columns)
+        self.grdc_dict["grdc_id"] = read_columns(grdc["GRDC_id"], columns).astype(int)
+        self.grdc_dict["grdc_q"] = read_columns(grdc["GRDC_Q"], columns)
+        self.grdc_dict["grdc_qt"] = read_columns(grdc["GRDC_Qt"], columns)
         self.grdc_dict["dt"] = grdc.dimensions["Time(days)"].size
         grdc.close()
 
@@ -108,7 +172,8 @@ class GRDC:
         """Updates GRDC data in the SoS.
         
         Data is stored in a group labelled model as it will accommodate GRDC for 
-        constrained runs.
+        constrained runs. Matrices are stored gauge-major so their transposes
+        are written in (gauge, day) order with in place fill conversion.
 
         Requires: SoS created with GRDC group present.
         """
@@ -117,18 +182,20 @@ class GRDC:
         sos.production_date = datetime.now().strftime('%d-%b-%Y %H:%M:%S')
         grdc = sos["historicQ"]["grdc"]
 
-        grdc["num_days"][:] = self.map_dict["days"]
-        grdc["num_grdc_reaches"][:] = range(1, self.map_dict["grdc_reach_id"].shape[0] + 1)
-        grdc["grdc_reach_id"][:] = self.map_dict["grdc_reach_id"]
-        grdc["grdc_flow_duration_q"][:] = np.transpose(np.nan_to_num(self.map_dict["fdq"], copy=True, nan=self.FLOAT_FILL))
-        grdc["grdc_max_q"][:] = np.nan_to_num(self.map_dict["max_q"], copy=True, nan=self.FLOAT_FILL)
-        grdc["grdc_monthly_q"][:] = np.transpose(np.nan_to_num(self.map_dict["monthly_q"], copy=True, nan=self.FLOAT_FILL))
-        grdc["grdc_mean_q"][:] = np.nan_to_num(self.map_dict["mean_q"], copy=True, nan=self.FLOAT_FILL)
-        grdc["grdc_min_q"][:] = np.nan_to_num(self.map_dict["min_q"], copy=True, nan=self.FLOAT_FILL)
-        grdc["grdc_two_year_return_q"][:] = np.nan_to_num(self.map_dict["tyr"], copy=True, nan=self.FLOAT_FILL)
-        grdc["grdc_id"][:] = np.nan_to_num(self.map_dict["grdc_id"], copy=True, nan=self.INT_FILL)
-        grdc["grdc_q"][:] = np.transpose(np.nan_to_num(self.map_dict["grdc_q"], copy=True, nan=self.FLOAT_FILL))
-        grdc["grdc_qt"][:] = np.transpose(np.nan_to_num(self.map_dict["grdc_qt"], copy=True, nan=self.FLOAT_FILL))
+        plan = WritePlan(grdc)
+        plan.add("num_days", self.map_dict["days"])
+        plan.add("num_grdc_reaches", np.arange(1, self.map_dict["grdc_reach_id"].shape[0] + 1))
+        plan.add("grdc_reach_id", self.map_dict["grdc_reach_id"])
+        plan.add("grdc_flow_duration_q", self.map_dict["fdq"].T, fill=self.FLOAT_FILL)
+        plan.add("grdc_max_q", self.map_dict["max_q"], fill=self.FLOAT_FILL)
+        plan.add("grdc_monthly_q", self.map_dict["monthly_q"].T, fill=self.FLOAT_FILL)
+        plan.add("grdc_mean_q", self.map_dict["mean_q"], fill=self.FLOAT_FILL)
+        plan.add("grdc_min_q", self.map_dict["min_q"], fill=self.FLOAT_FILL)
+        plan.add("grdc_two_year_return_q", self.map_dict["tyr"], fill=self.FLOAT_FILL)
+        plan.add("grdc_id", self.map_dict["grdc_id"], fill=self.INT_FILL)
+        plan.add("grdc_q", self.map_dict["grdc_q"].T, fill=self.FLOAT_FILL)
+        plan.add("grdc_qt", self.map_dict["grdc_qt"].T, fill=self.FLOAT_FILL)
+        plan.write()
 
         sos.close()
 
@@ -0,0 +1,206 @@
+"""Module that splits the global GRDC file into per-continent shards.
+
+A shard is a compact copy of GRDC2SWORDout.nc that holds only the gauges
+whose reach identifiers are in one continent's reaches. Shards are keyed by
+continent and SWORD version and listed in a manifest with the SHA-256 digest
+of each shard and the size and modification time of the global file so that a
+continent job can verify and read its shard instead of the global file.
+
+Functions
+---------
+create_args()
+    Create and return argparser with arguments for creating shards
+create_shards(grdc_file, reach_files, shard_dir, sword_version)
+    Write a shard per continent and the manifest listing them
+file_digest(path)
+    Return SHA-256 hex digest of a file's contents
+find_shard(shard_dir, continent, sword_version, grdc_file)
+    Return path to a verified shard (None if missing, invalid or stale)
+manifest_file(shard_dir, sword_version)
+    Return path to the shard manifest of a SWORD version
+shard_file(shard_dir, continent, sword_version)
+    Return path to the shard of a continent and SWORD version
+write_shard(grdc_file, reach_ids, shard)
+    Write gauges of GRDC file on reach identifiers to a shard
+"""
+
+# Standard imports
+import argparse
+import hashlib
+import json
+from pathlib import Path
+
+# Third-party imports
+from netCDF4 import Dataset
+import numpy as np
+
+# Local imports
+from priors.grdc.GRDC import read_columns
+
+DIGEST_BYTES = 1 << 20
+
+def shard_file(shard_dir, continent, sword_version):
+    """Return path to the shard of a continent and SWORD version."""
+
+    return Path(shard_dir) / f"{continent}_sword_v{sword_version}_GRDC.nc"
+
+def manifest_file(shard_dir, sword_version):
+    """Return path to the shard manifest of a SWORD version."""
+
+    return Path(shard_dir) / f"GRDC_sword_v{sword_version}_shards.json"
+
+def file_digest(path):
+    """Return SHA-256 hex digest of a file's contents."""
+
+    sha = hashlib.sha256()
+    with open(path, "rb") as infile:
+        for block in iter(lambda: infile.read(DIGEST_BYTES), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+def write_shard(grdc_file, reach_ids, shard):
+    """Write gauges of GRDC file on reach identifiers to a shard.
+
+    Variables along the gauge dimension (the dimension of Reach_ID) are
+    copied for the selected gauges only; all other variables are copied whole.
+
+    Parameters
+    ----------
+    grdc_file: Path
+        path to global GRDC file
+    reach_ids: numpy.ndarray
+        reach identifiers of the continent
+    shard: Path
+        path to write shard to
+
+    Returns
+    -------
+    number of gauges in the shard
+    """
+
+    with Dataset(grdc_file) as grdc, Dataset(shard, 'w') as out:
+        gauge_dim = grdc["Reach_ID"].dimensions[-1]
+        gauge_ids = grdc["Reach_ID"][:].filled(np.nan).astype(int)
+        columns = np.where(np.isin(gauge_ids, reach_ids))[0]
+
+        out.setncatts(grdc.__dict__)
+        for name, dimension in grdc.dimensions.items():
+            size = columns.size if name == gauge_dim else dimension.size
+            out.createDimension(name, None if dimension.isunlimited() else size)
+        for name, variable in grdc.variables.items():
+            atts = variable.__dict__.copy()
+            fill = atts.pop("_FillValue", None)
+            copy = out.createVariable(name, variable.datatype, variable.dimensions,
+                                      zlib=True, fill_value=fill)
+            copy.setncatts(atts)
+            if variable.dimensions[-1:] == (gauge_dim,):
+                copy[:] = np.ma.masked_invalid(read_columns(variable, columns))
+            else:
+                copy[:] = variable[:]
+    return columns.size
+
+def create_shards(grdc_file, reach_files, shard_dir, sword_version):
+    """Write a shard per continent and the manifest listing them.
+
+    Parameters
+    ----------
+    grdc_file: Path
+        path to global GRDC file
+    reach_files: dict
+        dictionary of continent to path of a file with a reaches/reach_id
+        variable (SWORD or SoS)
+    shard_dir: Path
+        path to directory to write shards and manifest to
+    sword_version: str
+        SWORD version of the reach files
+
+    Returns
+    -------
+    manifest dictionary
+    """
+
+    shard_dir = Path(shard_dir)
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    source = Path(grdc_file).stat()
+    manifest = {
+        "sword_version": str(sword_version),
+        "source": Path(grdc_file).name,
+        "source_sha256": file_digest(grdc_file),
+        "source_size": source.st_size,
+        "source_mtime_ns": source.st_mtime_ns,
+        "shards": {}
+    }
+    for continent, reach_file in reach_files.items():
+        with Dataset(reach_file) as reaches:
+            reach_ids = reaches["reaches"]["reach_id"][:].filled(-1).astype(int)
+        shard = shard_file(shard_dir, continent, sword_version)
+        gauges = write_shard(grdc_file, reach_ids, shard)
+        manifest["shards"][continent] = {
+            "file": shard.name,
+            "sha256": file_digest(shard),
+            "gauges": gauges
+        }
+
+    tmp = shard_dir / f".{manifest_file(shard_dir, sword_version).name}"
+    with open(tmp, 'w') as jf:
+        json.dump(manifest, jf, indent=2)
+    tmp.replace(manifest_file(shard_dir, sword_version))
+    return manifest
+
+def find_shard(shard_dir, continent, sword_version, grdc_file=None):
+    """Return path to a verified shard (None if missing, invalid or stale).
+
+    A shard is stale when the global GRDC file it was split from has changed
+    size or modification time since the manifest was written; the global file
+    is not checked if it is not given or does not exist.
+
+    Parameters
+    ----------
+    shard_dir: Path
+        path to directory with shards and manifest
+    continent: str
+        continent abbreviation
+    sword_version: str
+        SWORD version of the SoS being updated
+    grdc_file: Path
+        path to global GRDC file the shards were split from
+    """
+
+    manifest = manifest_file(shard_dir, sword_version)
+    if not manifest.exists(): return None
+    with open(manifest) as jf:
+        manifest = json.load(jf)
+    entry = manifest["shards"].get(continent)
+    if entry is None: return None
+    if grdc_file is not None and Path(grdc_file).exists():
+        source = Path(grdc_file).stat()
+        if (source.st_size, source.st_mtime_ns) != (manifest.get("source_size"), manifest.get("source_mtime_ns")):
+            print(f"GRDC shards are older than the GRDC file: {grdc_file}")
+            return None
+    shard = Path(shard_dir) / entry["file"]
+    if not shard.exists() or file_digest(shard) != entry["sha256"]:
+        print(f"GRDC shard failed verification: {shard}")
+        return None
+    return shard
+
+def create_args():
+    """Create and return argparser with arguments."""
+
+    arg_parser = argparse.ArgumentParser(description="Split the global GRDC file into per-continent shards")
+    arg_parser.add_argument("grdc", type=Path, help="Path to global GRDC file")
+    arg_parser.add_argument("reachdir", type=Path, help="Path to directory of continent reach files")
+    arg_parser.add_argument("-v", "--swordversion", type=str, required=True, help="SWORD version of reach files")
+    arg_parser.add_argument("-c", "--continents", type=str, nargs="+", required=True,
+                            help="Continents to create shards for (e.g. af eu na)")
+    arg_parser.add_argument("-p", "--pattern", type=str, default="{continent}_sword_v{version}.nc",
+                            help="Reach file name pattern; use {continent}_sword_v{version}_SOS_priors.nc for SoS files")
+    arg_parser.add_argument("-o", "--output", type=Path, help="Shard directory (default: directory of GRDC file)")
+    return arg_parser
+
+if __name__ == "__main__":
+    args = create_args().parse_args()
+    reach_files = {continent: args.reachdir / args.pattern.format(continent=continent, version=args.swordversion)
+                   for continent in args.continents}
+    manifest = create_shards(args.grdc, reach_files, args.output or args.grdc.parent, args.swordversion)
+    for continent, entry in manifest["shards"].items():
+        print(f"{continent}: {entry['gauges']} gauges in {entry['file']}")
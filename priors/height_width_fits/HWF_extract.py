@@ -1,34 +1,204 @@
-import numpy as np
+"""Module that extracts SWOT reach observations and fits height-width
+relationships.
+
+Class
+-----
+HWF_extract: Class that fits and stores height-width relationships
+
+Functions
+---------
+fit_batch(width, wse, min_obs)
+    Fit WSE = intercept + slope * width for each row of a batch
+pad_rows(rows)
+    Return rows stacked into a NaN padded matrix
+read_swot(swot_file)
+    Return reach width and WSE observations of a SWOT file
+"""
+
+# Standard imports
 import glob
+from pathlib import Path
+
+# Third-party imports
+from netCDF4 import Dataset
+import numpy as np
 
 class HWF_extract:
+    """Class that fits and stores height-width relationships.
+
+    Reach water surface elevation (WSE) is fit against reach width by least
+    squares for every reach with a SWOT file. SWOT files are read in batches
+    and each batch is fit at once from the sums of its observations.
+
+    Attributes
+    ----------
+    batch_size: int
+        number of reaches fit at once
+    BATCH_SIZE: int
+        default number of reaches fit at once
+    CONT_DICT: dict
+        dictionary of continental abbreviations and associated numbers
+    hwf_dict: dict
+        dictionary of reach-length arrays of fit results
+    MIN_OBS: int
+        minimum number of valid observations to fit a reach
+    sos_file: Path
+        path to SoS file
+    sos_reaches: numpy.ndarray
+        SoS reach identifiers
+    swot_dir: Path
+        path to directory that contains SWOT NetCDF files
+    swot_time: list
+        SWOT observation times of the fit reaches
+
+    Methods
+    -------
+    run_hwf()
+        Fit height-width relationships for all reaches with SWOT files
+    """
 
-    # FlOAT_FILL = -999999999999
-    # INT_FILL = -999
     CONT_DICT = { "af" : [1], "as" : [4, 3], "eu" : [2], "na" : [7, 8, 9],
         "oc" : [5], "sa" : [6] }
-    
+    BATCH_SIZE = 4096
+    MIN_OBS = 5
 
-    def __init__(self, swot_dir):
+    def __init__(self, sos_file, swot_dir, batch_size=BATCH_SIZE):
         """
         Parameters
         ----------
+        sos_file: Path
+            path to SoS file
         swot_dir: Path
             path to directory that contains SWOT NetCDF files
+        batch_size: int
+            number of reaches fit at once
         """
-        
-        # self.gb_dict = {}
-        # self.sos_file = sos_file
-        # self.sos_dict = extract_sos(sos_file)
-        # self.swot_dir = swot_dir
-        # self.swot_time = []
-        swot_files = [ Path(swot_file) for swot_file in glob.glob(f"{self.swot_dir}/{self.CONT_DICT[cont]}*_SWOT.nc") ]
-        
-        swot = Dataset(swot_file)
-        # node_width = swot["node/width"][:].filled(np.nan)
-        # node_d_x_area = swot["node/d_x_area"][:].filled(np.nan)
-        # node_slope = swot["node/slope2"][:].filled(np.nan)
-        # reach_width = swot["reach/width"][:].filled(np.nan)
-        reach_d_x_area = swot["reach/d_x_area"][:].filled(np.nan)
-        
-        self.data = reach_d_x_area
+
+        self.sos_file = Path(sos_file)
+        self.swot_dir = swot_dir
+        self.batch_size = batch_size
+        sos = Dataset(self.sos_file)
+        self.sos_reaches = sos["reaches"]["reach_id"][:].filled(-1).astype(np.int64)
+        sos.close()
+        self.hwf_dict = {}
+        self.swot_time = []
+
+    def run_hwf(self):
+        """Fit height-width relationships for all reaches with SWOT files."""
+
+        num_reaches = self.sos_reaches.size
+        self.hwf_dict = {
+            "slope": np.full(num_reaches, np.nan),
+            "intercept": np.full(num_reaches, np.nan),
+            "r_squared": np.full(num_reaches, np.nan),
+            "rmse": np.full(num_reaches, np.nan),
+            "n_obs": np.zeros(num_reaches, dtype=np.int32),
+            "min_width": np.full(num_reaches, np.nan),
+            "max_width": np.full(num_reaches, np.nan)
+        }
+
+        cont = self.sos_file.name.split('_')[0]
+        swot_files = sorted(Path(swot_file) for swot_file in glob.glob(f"{self.swot_dir}/{self.CONT_DICT[cont]}*_SWOT.nc"))
+        order = np.argsort(self.sos_reaches)
+        sorted_reaches = self.sos_reaches[order]
+
+        for start in range(0, len(swot_files), self.batch_size):
+            rows, widths, wses = [], [], []
+            for swot_file in swot_files[start:start + self.batch_size]:
+                reach_id = int(swot_file.name.split('_')[0])
+                position = np.searchsorted(sorted_reaches, reach_id)
+                if position == sorted_reaches.size or sorted_reaches[position] != reach_id: continue
+                try:
+                    width, wse, time = read_swot(swot_file)
+                except Exception as e:
+                    print(swot_file.name, 'failed')
+                    print(e)
+                    continue
+                rows.append(order[position])
+                widths.append(width)
+                wses.append(wse)
+                self.swot_time.extend(time[np.isfinite(time)])
+            if not rows: continue
+
+            fit = fit_batch(pad_rows(widths), pad_rows(wses), self.MIN_OBS)
+            for name, values in fit.items():
+                self.hwf_dict[name][rows] = values
+
+def read_swot(swot_file):
+    """Return reach width and WSE observations of a SWOT file.
+
+    Negative widths are treated as missing.
+
+    Returns
+    -------
+    tuple of width, WSE and time numpy.ndarray
+    """
+
+    swot = Dataset(swot_file)
+    width = swot["reach/width"][:].filled(np.nan).astype(np.float64).ravel()
+    wse = swot["reach/wse"][:].filled(np.nan).astype(np.float64).ravel()
+    time = swot["reach/time"][:].filled(np.nan).astype(np.float64).ravel()
+    swot.close()
+    width[width < 0] = np.nan
+    return width, wse, time
+
+def pad_rows(rows):
+    """Return rows stacked into a NaN padded matrix."""
+
+    padded = np.full((len(rows), max(row.size for row in rows)), np.nan)
+    for i, row in enumerate(rows):
+        padded[i, :row.size] = row
+    return padded
+
+def fit_batch(width, wse, min_obs):
+    """Fit WSE = intercept + slope * width for each row of a batch.
+
+    Observations where width or WSE is missing are ignored. Rows with fewer
+    than min_obs observations or without width variation are left as NaN.
+
+    Parameters
+    ----------
+    width: numpy.ndarray
+        (reaches x observations) reach widths
+    wse: numpy.ndarray
+        (reaches x observations) reach water surface elevations
+    min_obs: int
+        minimum number of valid observations to fit a reach
+
+    Returns
+    -------
+    dictionary of slope, intercept, r_squared, rmse, n_obs, min_width and
+    max_width arrays with one value per row
+    """
+
+    valid = np.isfinite(width) & np.isfinite(wse)
+    n = valid.sum(axis=1)
+    w = np.where(valid, width, 0.)
+    h = np.where(valid, wse, 0.)
+    count = np.maximum(n, 1)
+
+    # Center on row means so the normal equations stay well conditioned
+    w_mean = w.sum(axis=1) / count
+    h_mean = h.sum(axis=1) / count
+    dw = np.where(valid, width - w_mean[:, None], 0.)
+    dh = np.where(valid, wse - h_mean[:, None], 0.)
+    sww = (dw * dw).sum(axis=1)
+    swh = (dw * dh).sum(axis=1)
+    shh = (dh * dh).sum(axis=1)
+
+    fit = (n >= min_obs) & (sww > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(fit, swh / sww, np.nan)
+        intercept = np.where(fit, h_mean - slope * w_mean, np.nan)
+        sse = np.maximum(shh - slope * swh, 0.)
+        r_squared = np.where(fit, np.where(shh > 0, 1. - sse / shh, 1.), np.nan)
+        rmse = np.where(fit, np.sqrt(sse / count), np.nan)
+    return {
+        "slope": slope,
+        "intercept": intercept,
+        "r_squared": r_squared,
+        "rmse": rmse,
+        "n_obs": n.astype(np.int32),
+        "min_width": np.where(n > 0, np.min(np.where(valid, width, np.inf), axis=1, initial=np.inf), np.nan),
+        "max_width": np.where(n > 0, np.max(np.where(valid, width, -np.inf), axis=1, initial=-np.inf), np.nan)
+    }
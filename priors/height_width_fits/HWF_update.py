@@ -1,41 +1,82 @@
-    
-import np
-import glob
+# Standard imports
+from datetime import datetime
+
+# Third-party imports
+from netCDF4 import Dataset
+import numpy as np
+
+# Local imports
+from priors.sos.StorageProfile import StorageProfile
+from priors.sos.WritePlan import WritePlan
 
 class HWF_update:
+    """Class that updates height-width fits to the SoS.
+
+    Fits are stored in an hwf group with one value per SoS reach; the group
+    and its variables are created the first time they are written.
+
+    Attributes
+    ----------
+    FLOAT_FILL: float
+        Fill value for any missing float values in height-width fits
+    hwf_dict: dict
+        dictionary of reach-length arrays of fit results
+    INT_FILL: int
+        Fill value for any missing integer values in height-width fits
+    INT_VARIABLES: list
+        Names of integer height-width fit variables
+    sos_file: Path
+        path to SoS NetCDF file
+    storage_profile: StorageProfile
+        chunking and compression applied to created variables
+    variable_atts: dict
+        dictionary of height-width fit variable attributes
+
+    Methods
+    -------
+    update_data()
+        Updates height-width fits in the SoS
+    """
 
-    # FlOAT_FILL = -999999999999
-    # INT_FILL = -999
-    CONT_DICT = { "af" : [1], "as" : [4, 3], "eu" : [2], "na" : [7, 8, 9],
-        "oc" : [5], "sa" : [6] }
-    
+    FLOAT_FILL = -999999999999
+    INT_FILL = -999
+    INT_VARIABLES = ["n_obs"]
 
-    def __init__(self, ):
+    def __init__(self, hwf_dict, sos_file, metadata_json, storage_profile=None):
         """
         Parameters
         ----------
-        hwf_data: List
-            List of HWF data for all of the reaches processed
+        hwf_dict: dict
+            dictionary of reach-length arrays of fit results
         sos_file: Path
-            path to SoS file
+            path to SoS NetCDF file
+        metadata_json: dict
+            dictionary of SoS variable attributes
+        storage_profile: StorageProfile
+            chunking and compression applied to created variables (default profile if None)
         """
-        
-        sos = Dataset(Path(self.sos_file))
-        self.sos_reaches = sos["reaches"]["reach_id"][:].filled(np.nan).astype(int)
+
+        self.hwf_dict = hwf_dict
+        self.sos_file = sos_file
+        self.storage_profile = storage_profile if storage_profile else StorageProfile()
+        self.variable_atts = metadata_json["hwf"]
+
+    def update_data(self):
+        """Updates height-width fits in the SoS."""
+
+        sos = Dataset(self.sos_file, 'a')
+        sos.production_date = datetime.now().strftime('%d-%b-%Y %H:%M:%S')
+        hwf = sos["hwf"] if "hwf" in sos.groups else sos.createGroup("hwf")
+
+        plan = WritePlan(hwf)
+        for name, data in self.hwf_dict.items():
+            if name in self.INT_VARIABLES:
+                datatype, fill = "i4", self.INT_FILL
+            else:
+                datatype, fill = "f8", self.FLOAT_FILL
+            if name not in hwf.variables:
+                self.storage_profile.create_variable(hwf, name, datatype, ("num_reaches",), fill_value=fill)
+            plan.add(name, np.asarray(data), self.variable_atts.get(name), fill=fill)
+        plan.write()
+
         sos.close()
-    
-    
-        # if "overwritten_indexes" in sos["gbpriors"]["reach"].variables:
-        #     oi = sos["gbpriors"]["reach"]["overwritten_indexes"]
-        #     oi[:] = [self.gb_dict["reach"]["overwritten_indexes"]]
-        #     self.set_variable_atts(oi, self.variable_atts["reach"]["overwritten_indexes"])
-        # else:
-        #     oi = sos["gbpriors"]["reach"].createVariable("overwritten_indexes", "i4", ("num_reaches",), compression="zlib")
-        #     oi.long_name = "GeoBAM overwritten_prior_indexes"
-        #     oi.comment = "Indexes of geoBAM priors that were overwritten."
-        #     oi.coverage_content_type = "qualityInformation"
-        #     oi[:] = self.gb_dict["reach"]["overwritten_indexes"]
-    
-    
-    
-    
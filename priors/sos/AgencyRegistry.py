@@ -0,0 +1,112 @@
+"""Module that describes the gauge agencies whose priors overwrite GRADES.
+
+Classes
+-------
+AgencyRegistry: Overwrite passes of the gauge agencies of a continent
+
+Functions
+---------
+select_gauges(gauge_reach, reaches, gauge, model_mean_q)
+    Return the gauge that overwrites each reach and whether its priors are valid
+"""
+
+# Third-party imports
+import numpy as np
+
+class AgencyRegistry:
+    """Overwrite passes of the gauge agencies of a continent.
+
+    The registry is read from the agency_overwrite global attributes of the
+    metadata JSON, which list the historic and NRT group of each agency in
+    overwrite order (later groups overwrite earlier ones on the same reach)
+    and the CAL values of calibration and validation gauges. Agencies of the
+    continent (continent_agency) without groups, e.g. SWOT_SHAQ, do not
+    overwrite GRADES.
+
+    Attributes
+    ----------
+    agencies: list
+        gauge agencies of the continent
+    calibration_cal: int
+        CAL value of NRT gauges that select reaches to overwrite
+    passes: list
+        (group path, source, nrt) tuple for each group in overwrite order;
+        source is the variable prefix and overwritten source of the group and
+        nrt indicates if gauges are selected by CAL
+    validation_cal: int
+        CAL value of NRT gauges whose reaches are not overwritten
+
+    Methods
+    -------
+    groups()
+        Return group paths of the overwrite passes
+    """
+
+    def __init__(self, metadata_json, continent):
+        """
+        Parameters
+        ----------
+        metadata_json: dict
+            dictionary of SoS metadata loaded from the metadata JSON file
+        continent: str
+            continent abbreviation
+        """
+
+        extra = metadata_json["global_attributes_extra"]
+        registry = extra["agency_overwrite"]
+        self.agencies = extra["continent_agency"][continent]
+        self.calibration_cal = registry["calibration_cal"]
+        self.validation_cal = registry["validation_cal"]
+        self.passes = []
+        for agency, groups in registry["groups"].items():
+            if agency not in self.agencies: continue
+            for path, is_nrt in ((groups.get("historic"), False), (groups.get("nrt"), True)):
+                if path: self.passes.append((path, path.rsplit('/', 1)[-1], is_nrt))
+
+    def groups(self):
+        """Return group paths of the overwrite passes."""
+
+        return [path for path, _, _ in self.passes]
+
+def select_gauges(gauge_reach, reaches, gauge, model_mean_q):
+    """Return the gauge that overwrites each reach and whether its priors are valid.
+
+    Every gauge of the group on a reach is considered. When a reach has more
+    than one gauge, the gauge whose mean_q is closest to the reach's current
+    model mean_q is selected (the first gauge row on ties). A reach is invalid
+    if any q prior of any of its gauges is less than or equal to 0.
+
+    Parameters
+    ----------
+    gauge_reach: numpy.ndarray
+        reach row of every gauge row of the group (-1 if not in the SoS)
+    reaches: numpy.ndarray
+        sorted unique reach rows to overwrite
+    gauge: dict
+        dictionary of prior name to gauge group data (gauge rows first)
+    model_mean_q: numpy.ndarray
+        current model mean_q of every reach row
+
+    Returns
+    -------
+    tuple of reach rows, selected gauge rows and valid indicators
+    """
+
+    rows = np.where(np.isin(gauge_reach, reaches))[0]
+    reach_of_row = gauge_reach[rows]
+
+    bad = np.zeros(rows.size, dtype=bool)
+    for data in gauge.values():
+        low = np.ma.filled(np.ma.asarray(data[rows]) <= 0, False)
+        bad |= low.reshape(rows.size, -1).any(axis=1)
+
+    mean_q = np.ma.filled(np.ma.asarray(gauge["mean_q"][rows], dtype=np.float64), np.nan)
+    target = np.ma.filled(np.ma.asarray(model_mean_q[reach_of_row], dtype=np.float64), np.nan)
+    distance = np.abs(mean_q - target)
+    distance[np.isnan(distance)] = np.inf
+
+    order = np.lexsort((rows, distance, reach_of_row))
+    first = np.ones(order.size, dtype=bool)
+    first[1:] = reach_of_row[order][1:] != reach_of_row[order][:-1]
+    selected_reaches = reach_of_row[order][first]
+    return selected_reaches, rows[order][first], ~np.isin(selected_reaches, reach_of_row[bad])
@@ -0,0 +1,130 @@
+"""Module that compiles SoS variable metadata into attribute plans.
+
+Classes
+-------
+AttributePlan: Per-group, per-variable attribute dictionaries compiled once
+    from the metadata JSON
+
+Functions
+---------
+apply_atts(variable, atts)
+    Set attributes that differ from a variable's current values in one call
+same_value(current, value)
+    Return True if an attribute value is identical to the current value
+"""
+
+# Third-party imports
+import numpy as np
+
+class AttributePlan:
+    """Per-group, per-variable attribute dictionaries compiled once from the
+    metadata JSON.
+
+    Every section of the metadata JSON that maps variable names to attribute
+    dictionaries is compiled to a section of the plan; nested sections are
+    keyed by their path (e.g. 'gbpriors/reach'). Sections without variable
+    attributes (e.g. global_attributes) are not compiled.
+
+    Attributes
+    ----------
+    sections: dict
+        dictionary of section path to dictionary of variable name to
+        attribute dictionary
+
+    Methods
+    -------
+    apply_group(group, section)
+        Apply attributes of a section to every variable of a group
+    atts(section, name)
+        Return attribute dictionary of a variable (empty if not in the plan)
+    """
+
+    def __init__(self, metadata_json):
+        """
+        Parameters
+        ----------
+        metadata_json: dict
+            dictionary of SoS metadata loaded from the metadata JSON file
+        """
+
+        self.sections = {}
+        self.__compile(metadata_json, "")
+
+    def __getitem__(self, section):
+        """Return dictionary of variable name to attribute dictionary of a section."""
+
+        return self.sections[section]
+
+    def __contains__(self, section):
+        return section in self.sections
+
+    def atts(self, section, name):
+        """Return attribute dictionary of a variable (empty if not in the plan)."""
+
+        return self.sections.get(section, {}).get(name, {})
+
+    def apply_group(self, group, section):
+        """Apply attributes of a section to every variable of a group.
+
+        Parameters
+        ----------
+        group: netCDF4.Group
+            group whose variables are updated
+        section: str
+            path of plan section with the group's variable attributes
+
+        Raises
+        ------
+        KeyError
+            if a variable of the group has no attributes in the section
+
+        Returns
+        -------
+        number of variables with attributes written
+        """
+
+        atts = self.sections[section]
+        return sum(apply_atts(variable, atts[name]) for name, variable in group.variables.items())
+
+    def __compile(self, metadata, path):
+        """Compile sections of variable attribute dictionaries under path."""
+
+        for key, value in metadata.items():
+            if not isinstance(value, dict) or not value: continue
+            if not all(isinstance(child, dict) for child in value.values()): continue
+            section = f"{path}{key}"
+            if all(not isinstance(att, dict) for child in value.values() for att in child.values()):
+                self.sections[section] = {name: dict(atts) for name, atts in value.items()}
+            else:
+                self.__compile(value, f"{section}/")
+
+def same_value(current, value):
+    """Return True if an attribute value is identical to the current value."""
+
+    if isinstance(current, str) or isinstance(value, str):
+        return isinstance(current, str) and isinstance(value, str) and current == value
+    current, value = np.asarray(current), np.asarray(value)
+    return current.dtype.kind == value.dtype.kind and np.array_equal(current, value)
+
+def apply_atts(variable, atts):
+    """Set attributes that differ from a variable's current values in one call.
+
+    Parameters
+    ----------
+    variable: netCDF4.Variable
+        variable to set attributes of
+    atts: dict
+        dictionary of attribute name to value
+
+    Returns
+    -------
+    1 if any attribute was written, otherwise 0
+    """
+
+    if not atts: return 0
+    current = variable.__dict__
+    changed = {name: value for name, value in atts.items()
+               if name not in current or not same_value(current[name], value)}
+    if not changed: return 0
+    variable.setncatts(changed)
+    return 1
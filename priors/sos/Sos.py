@@ -11,35 +11,54 @@ import uuid
 import boto3
 boto3.set_stream_logger("boto3.resources")
 import botocore
-from netCDF4 import Dataset, stringtochar
+from netCDF4 import Dataset
 import numpy as np
 
-def closest(lst, K):
-    # https://www.geeksforgeeks.org/python-find-closest-number-to-k-in-given-list/
-
-    return min(range(len(lst)), key = lambda i: abs(lst[i]-K))
+# Local imports
+from priors.sos.AgencyRegistry import AgencyRegistry, select_gauges
+from priors.sos.AttributePlan import AttributePlan, apply_atts
+from priors.sos.SosCache import SosCache, reflink_copy
+from priors.sos.SosDelta import create_delta
+from priors.sos.SosIndex import SosIndex, index_file
+from priors.sos.SosTransfer import SosTransfer
+from priors.sos.StorageProfile import StorageProfile
+from priors.sos.WritePlan import char_array, write_rows
 
 class Sos:
     """Class that represents the SoS and required ops to create a new version.
     
     Attributes
     ----------
+    attribute_plan: AttributePlan
+        variable attributes compiled from the metadata JSON
     bad_priors: np.array
         list of either USGS or GRDC q priors that are less than 0.
     bad_priors_source: np.array
         list that indicates source of bad prior
+    base_file: Path
+        path to unmodified copy of the previous SoS version (delta uploads only)
     continent: str
         continent abbreviation to id SoS file
+    delta: bool
+        indicate if a delta of changed variables is uploaded with the SoS
+    index: SosIndex
+        reach identifier index of the SoS rows (built when overwriting priors)
     overwritten_indexes: np.array
         list of integer index values where grades data was overwritten
     overwritten_source: np.array
         list of either 'usgs' or 'grdc' to indicate source of overwritten data
+    PRIOR_VARIABLES: list
+        names of model priors overwritten with gaged priors
     run_type: str
         'constrained' or 'unconstrained' data product type
+    sos_cache: SosCache
+        local cache of previous SoS versions (None to always download)
     sos_dir: Path
         path to SoS directory on local storage
     sos_file: Path
         path to SoS file
+    storage_profile: StorageProfile
+        chunking and compression applied to created variables
     confluence_creds: dict
             Dictionary of s3 credentials 
     suffix: str
@@ -57,6 +76,8 @@ class Sos:
         Copy the latest version of the SoS to local storage
     create_new_version(priors_list)
         Creates a new version of the SoS with updated priors
+    export_zarr()
+        Exports the SoS to a Zarr store and uploads it next to the SoS
     upload_new_version()
         Uploads new version to Confluence S3 bucket
     """
@@ -65,9 +86,11 @@ class Sos:
 
     VERS_LENGTH = 4
     MOD_TIME = 0    # seconds
+    PRIOR_VARIABLES = ["flow_duration_q", "max_q", "monthly_q", "mean_q", "min_q", "two_year_return_q"]
 
     def __init__(self, continent, run_type, sos_dir, metadata_json, priors_list,
-                 podaac_update, podaac_bucket, sos_bucket, swordversion):
+                 podaac_update, podaac_bucket, sos_bucket, swordversion, cache_dir=None, delta=False,
+                 storage_profile=None):
 
 
 
@@ -80,17 +103,29 @@ class Sos:
             'constrained' or 'unconstrained' data product type
         sos_dir: Path
             path to SoS directory on local storage
+        cache_dir: Path
+            path to cache directory for previous SoS versions (None to disable)
+        delta: bool
+            indicate if a delta of changed variables is uploaded with the SoS
+        storage_profile: StorageProfile
+            chunking and compression applied to created variables (default profile if None)
         """
+        self.attribute_plan = AttributePlan(metadata_json)
         self.bad_prior = np.array([])
         self.bad_prior_source = np.array([])
+        self.base_file = None
         self.continent = continent
+        self.delta = delta
+        self.index = None
         self.last_run_time = ""
         self.metadata_json = metadata_json
         self.overwritten_indexes = np.array([])
         self.overwritten_source = np.array([])
         self.run_type = run_type
+        self.sos_cache = SosCache(Path(cache_dir) / "sos") if cache_dir else None
         self.sos_dir = sos_dir
         self.sos_file = None
+        self.storage_profile = storage_profile if storage_profile else StorageProfile()
         self.version = ""
         self.priors_list = priors_list
         self.run_date = datetime.now()
@@ -110,14 +145,33 @@ class Sos:
         padding = ['0'] * (self.VERS_LENGTH - len(previous_version))
         previous_version = f"{''.join(padding)}{previous_version}"
         print(f"Locating: {self.run_type}/{previous_version}/{self.continent}{self.suffix}")
+        key = f"{self.run_type}/{previous_version}/{self.continent}{self.suffix}"
+        sos_file = f"{self.sos_dir}/{self.continent}{self.suffix}"
         try:
-            s3 = boto3.client("s3")
-            response = s3.download_file(Bucket=self.sos_bucket, Key=f"{self.run_type}/{previous_version}/{self.continent}{self.suffix}", Filename=f"{self.sos_dir}/{self.continent}{self.suffix}")
-        except botocore.exceptions.ClientError as error:
+            if self.sos_cache:
+                cached = self.sos_cache.fetch(self.sos_bucket, self.run_type, previous_version, self.continent, key, sos_file)
+            else:
+                cached = False
+                transfer = SosTransfer(boto3.client("s3"))
+                transfer.download(self.sos_bucket, key, sos_file)
+        except (botocore.exceptions.ClientError, ValueError) as error:
             print(f"ERROR: Could not download current version of the SoS.")
             print(error)
             raise error
-        print(f"Downloaded: {self.run_type}/{previous_version}/{self.continent}{self.suffix}")
+        print(f"{'Copied from cache' if cached else 'Downloaded'}: {key}")
+
+        # Previous reach index lets the index be updated only where identifiers changed
+        sidecar = index_file(sos_file)
+        try:
+            SosTransfer(boto3.client("s3")).download(self.sos_bucket, f"{self.run_type}/{previous_version}/{sidecar.name}", sidecar)
+        except (botocore.exceptions.ClientError, ValueError):
+            if sidecar.exists(): sidecar.unlink()
+            print(f"No reach index found for: {key}")
+
+        # Keep an unmodified copy of the previous version to create the delta from
+        if self.delta:
+            self.base_file = Path(f"{self.sos_dir}/{previous_version}_{self.continent}{self.suffix}")
+            reflink_copy(sos_file, self.base_file)
 
     def create_new_version(self):
         """Create new version of the SoS file from the previous version.
@@ -186,15 +240,15 @@ class Sos:
         sos.references = reference
         
         # Update reach and node variables
-        set_variable_atts(sos["reaches"]["reach_id"], self.metadata_json["reaches"]["reach_id"])
-        set_variable_atts(sos["nodes"]["node_id"], self.metadata_json["nodes"]["node_id"])
-        set_variable_atts(sos["nodes"]["reach_id"], self.metadata_json["nodes"]["reach_id"])
+        set_variable_atts(sos["reaches"]["reach_id"], self.attribute_plan["reaches"]["reach_id"])
+        set_variable_atts(sos["nodes"]["node_id"], self.attribute_plan["nodes"]["node_id"])
+        set_variable_atts(sos["nodes"]["reach_id"], self.attribute_plan["nodes"]["reach_id"])
         
         # Update model variables
-        update_model(sos["model"], self.metadata_json[f"model_{self.run_type}"])
+        update_model(sos["model"], self.attribute_plan[f"model_{self.run_type}"])
         
         # Update historicQ
-        if "historicQ" in sos.groups.keys(): update_historic_gauges(sos["historicQ"], self.metadata_json, self.continent)
+        if "historicQ" in sos.groups.keys(): update_historic_gauges(sos["historicQ"], self.metadata_json, self.continent, self.attribute_plan)
         
         sos.close()
         print(f"Created version {''.join(padding)}{self.version} of: {self.sos_file.name}")
@@ -215,337 +269,151 @@ class Sos:
         reaches = sos["reaches"]
         # # Latitude
         if "x" not in reaches.variables:
-            x = reaches.createVariable("x", "f8", ("num_reaches"), compression="zlib")
+            x = self.storage_profile.create_variable(reaches, "x", "f8", ("num_reaches"))
             x[:] = sword["reaches"]["x"][:]
         else:
             x = reaches["x"]
-        set_variable_atts(x, self.metadata_json["reaches"]["x"])
+        set_variable_atts(x, self.attribute_plan["reaches"]["x"])
         # # Longitude
         if "y" not in reaches.variables:
-            y = reaches.createVariable("y", "f8", ("num_reaches"), compression="zlib")
+            y = self.storage_profile.create_variable(reaches, "y", "f8", ("num_reaches"))
             y[:] = sword["reaches"]["y"][:]
         else:
             y = reaches["y"]
-        set_variable_atts(y, self.metadata_json["reaches"]["y"])
+        set_variable_atts(y, self.attribute_plan["reaches"]["y"])
         ## River names
         if "river_name" not in reaches.variables:
-            river_name = reaches.createVariable("river_name", str, ("num_reaches"))
+            river_name = self.storage_profile.create_variable(reaches, "river_name", str, ("num_reaches"))
             river_name._Encoding = "ascii"
             river_name[:] = sword["reaches"]["river_name"][:]
         else:
             river_name = reaches["river_name"]
-        set_variable_atts(river_name, self.metadata_json["reaches"]["river_name"])
+        set_variable_atts(river_name, self.attribute_plan["reaches"]["river_name"])
         
         # Node-level data
         nodes = sos["nodes"]
         # # Latitude
         if "x" not in nodes.variables:
-            x = nodes.createVariable("x", "f8", ("num_nodes"), compression="zlib")
+            x = self.storage_profile.create_variable(nodes, "x", "f8", ("num_nodes"))
             x[:] = sword["nodes"]["x"][:]
         else:
             x = nodes["x"]
-        set_variable_atts(x, self.metadata_json["nodes"]["x"])
+        set_variable_atts(x, self.attribute_plan["nodes"]["x"])
         # # Longitude
         if "y" not in nodes.variables:
-            y = nodes.createVariable("y", "f8", ("num_nodes"), compression="zlib")
+            y = self.storage_profile.create_variable(nodes, "y", "f8", ("num_nodes"))
             y[:] = sword["nodes"]["y"][:]
         else:
             y = nodes["y"]
-        set_variable_atts(y, self.metadata_json["nodes"]["y"])
+        set_variable_atts(y, self.attribute_plan["nodes"]["y"])
         ## River names
         if "river_name" not in nodes.variables:
-            river_name = nodes.createVariable("river_name", str, ("num_nodes"))
+            river_name = self.storage_profile.create_variable(nodes, "river_name", str, ("num_nodes"))
             river_name._Encoding = "ascii"
             river_name[:] = sword["nodes"]["river_name"][:]
         else:
             river_name = nodes["river_name"]
-        set_variable_atts(river_name, self.metadata_json["nodes"]["river_name"])
+        set_variable_atts(river_name, self.attribute_plan["nodes"]["river_name"])
                 
         sword.close()
         sos.close()
 
     def overwrite_grades(self):
-        """Overwrite GRADES data with gaged (USGS or GRDC) data in the SoS."""
-
-        sos = Dataset(self.sos_file, 'a')
-        
-        self.bad_prior = np.zeros(sos.dimensions["num_reaches"].size, dtype=np.int32)
-        self.bad_prior_source = np.full(sos.dimensions["num_reaches"].size, "xxxx", dtype="S4")
-        self.overwritten_indexes = np.zeros(sos.dimensions["num_reaches"].size, dtype=np.int32)
-        self.overwritten_source = np.full(sos.dimensions["num_reaches"].size, "xxxx", dtype="S4")
-
-        grdc_reach_ids = sos["historicQ"]["grdc"]["grdc_reach_id"][:]
-        for rid in grdc_reach_ids:
-            self._overwrite_prior(rid, sos, sos["historicQ"]["grdc"], "grdc")
-    
-
-        # could make this iterative based on global agency variable, also check cal/val split
-        if self.continent == "na":
-
-             # historic USGS
-            historic_usgs_reach_ids = sos["historicQ"]["USGS"]["USGS_reach_id"][:]
-            for index, rid in enumerate(historic_usgs_reach_ids):
-                self._overwrite_prior(rid, sos, sos["historicQ"]["USGS"], "USGS")   
-
-            # USGS
-            usgs_reach_ids = sos["USGS"]["USGS_reach_id"][:]
-            usgs_cal = sos["USGS"]["CAL"][:]
-            for index, rid in enumerate(usgs_reach_ids) :
-                # check for cal/val
-                if usgs_cal[index] == 1:
-                    self._overwrite_prior(rid, sos, sos["USGS"], "USGS")
-
-            # Historic WSC
-            historic_wsc_reach_ids = sos["historicQ"]["WSC"]["WSC_reach_id"][:]
-            for index, rid in enumerate(historic_wsc_reach_ids):
-                self._overwrite_prior(rid, sos, sos["historicQ"]["WSC"], "WSC")  
-
-            # WSC
-            wsc_reach_ids = sos["WSC"]["WSC_reach_id"][:]
-            wsc_cal = sos["WSC"]["CAL"][:]
-            for index, rid in enumerate(wsc_reach_ids):
-                # check for cal/val
-                if wsc_cal[index] == 1:
-                    self._overwrite_prior(rid, sos, sos["WSC"], "WSC")
-
-        if self.continent == 'eu':
-            # defra
-            defra_reach_ids = sos["DEFRA"]["DEFRA_reach_id"][:]
-            defra_cal = sos["DEFRA"]["CAL"][:]
-            for index, rid in enumerate(defra_reach_ids) :
-                # check for cal/val
-                if defra_cal[index] == 1: 
-                    self._overwrite_prior(rid, sos, sos["DEFRA"], "DEFRA")
-
-
-            # Historic EAU
-            historic_wsc_reach_ids = sos["historicQ"]["EAU"]["EAU_reach_id"][:]
-            for index, rid in enumerate(historic_wsc_reach_ids):
-                self._overwrite_prior(rid, sos, sos["historicQ"]["EAU"], "EAU")  
-
-            # EAU
-            wsc_reach_ids = sos["EAU"]["EAU_reach_id"][:]
-            wsc_cal = sos["EAU"]["CAL"][:]
-            for index, rid in enumerate(wsc_reach_ids):
-                # check for cal/val
-                if wsc_cal[index] == 1:
-                    self._overwrite_prior(rid, sos, sos["EAU"], "EAU")
-
-        if self.continent == 'oc':
-            #ABOM
-            defra_reach_ids = sos["ABOM"]["ABOM_reach_id"][:]
-            defra_cal = sos["ABOM"]["CAL"][:]
-            for index, rid in enumerate(defra_reach_ids) :
-                # check for cal/val
-                if defra_cal[index] == 1: 
-                    self._overwrite_prior(rid, sos, sos["ABOM"], "ABOM") 
-        
-        if self.continent == 'as':
-
-            # Historic MLIT
-            historic_wsc_reach_ids = sos["historicQ"]["MLIT"]["MLIT_reach_id"][:]
-            for index, rid in enumerate(historic_wsc_reach_ids):
-                self._overwrite_prior(rid, sos, sos["historicQ"]["MLIT"], "MLIT")  
-
-
-            # defra_reach_ids = sos["MLIT"]["MLIT_reach_id"][:]
-            # defra_cal = sos["MLIT"]["CAL"][:]
-            # for index, rid in enumerate(defra_reach_ids) :
-            #     # check for cal/val
-            #     if defra_cal[index] == 1: 
-            #         self._overwrite_prior(rid, sos, sos["MLIT"], "MLIT")
-        
-        if self.continent == 'sa':
-
-            # Historic Hidroweb
-            historic_wsc_reach_ids = sos["historicQ"]["Hidroweb"]["Hidroweb_reach_id"][:]
-            for index, rid in enumerate(historic_wsc_reach_ids):
-                self._overwrite_prior(rid, sos, sos["historicQ"]["Hidroweb"], "Hidroweb")  
+        """Overwrite GRADES data with gaged data in the SoS.
 
+        The groups of the continent's agencies are applied in AgencyRegistry
+        order to model priors held in memory; later groups overwrite earlier
+        ones on the same reach. Reaches with an NRT validation gauge (CAL equal
+        to the registry's validation_cal) in any of the SoS gauge agencies are
+        not overwritten.
+        """
 
-            defra_reach_ids = sos["Hidroweb"]["Hidroweb_reach_id"][:]
-            defra_cal = sos["Hidroweb"]["CAL"][:]
-            for index, rid in enumerate(defra_reach_ids) :
-                # check for cal/val
-                if defra_cal[index] == 1: 
-                    self._overwrite_prior(rid, sos, sos["Hidroweb"], "Hidroweb")
+        sos = Dataset(self.sos_file, 'a')
+        self.index = SosIndex(sos)
+        num_reaches = sos.dimensions["num_reaches"].size
 
+        self.bad_prior = np.zeros(num_reaches, dtype=np.int32)
+        self.bad_prior_source = np.full(num_reaches, "xxxx", dtype="S4")
+        self.overwritten_indexes = np.zeros(num_reaches, dtype=np.int32)
+        self.overwritten_source = np.full(num_reaches, "xxxx", dtype="S4")
 
-            # DGA, only historic
-            defra_reach_ids = sos["historicQ"]["DGA"]["DGA_reach_id"][:]
-            for index, rid in enumerate(defra_reach_ids) :
-                self._overwrite_prior(rid, sos, sos["historicQ"]["DGA"], "DGA")
+        grades = sos["model"]
+        priors = {name: grades[name][:] for name in self.PRIOR_VARIABLES}
+        registry = AgencyRegistry(self.metadata_json, self.continent)
+        validation = self._validation_reaches(sos, num_reaches, registry.validation_cal)
+        for path, source, nrt in registry.passes:
+            self._overwrite_group(sos[path], source, registry.calibration_cal if nrt else None, priors, validation)
 
+        rows = np.where(self.overwritten_indexes == 1)[0]
+        for name, data in priors.items():
+            write_rows(grades[name], rows, data[rows], None)
 
         self._create_dims_vars(sos)
 
         sos["model"]["overwritten_indexes"][:] = self.overwritten_indexes
-        set_variable_atts(sos["model"]["overwritten_indexes"], self.metadata_json["model_constrained"]["overwritten_indexes"])
+        set_variable_atts(sos["model"]["overwritten_indexes"], self.attribute_plan["model_constrained"]["overwritten_indexes"])
         
-        sos["model"]["overwritten_source"][:] = stringtochar(np.array(self.overwritten_source, dtype="S4"))
-        set_variable_atts(sos["model"]["overwritten_source"], self.metadata_json["model_constrained"]["overwritten_source"])
+        sos["model"]["overwritten_source"][:] = char_array(self.overwritten_source, 4)
+        set_variable_atts(sos["model"]["overwritten_source"], self.attribute_plan["model_constrained"]["overwritten_source"])
         
         sos["model"]["bad_priors"][:] = self.bad_prior
-        set_variable_atts(sos["model"]["bad_priors"], self.metadata_json["model_constrained"]["bad_priors"])
+        set_variable_atts(sos["model"]["bad_priors"], self.attribute_plan["model_constrained"]["bad_priors"])
         
-        sos["model"]["bad_prior_source"][:] = stringtochar(np.array(self.bad_prior_source, dtype="S4"))
-        set_variable_atts(sos["model"]["bad_prior_source"], self.metadata_json["model_constrained"]["bad_prior_source"])
+        sos["model"]["bad_prior_source"][:] = char_array(self.bad_prior_source, 4)
+        set_variable_atts(sos["model"]["bad_prior_source"], self.attribute_plan["model_constrained"]["bad_prior_source"])
 
         sos.close()
 
-    def _overwrite_prior(self, reach_id, sos, gage, source):
-        """Overwrite prior in grades with prior found in gage.
+    def _overwrite_group(self, gage, source, cal, priors, validation):
+        """Overwrite priors of the reaches of a gage group in memory.
 
         Parameters
         ----------
-        reach_id: int
-            unique reach identifier
-        sos: netCDF4._netCDF4.Dataset
-            sos NetCDF Dataset
         gage: netCDF4._netCDF4.Group
             gage NetCDF group
         source: str
             name of gage data product source
+        cal: int
+            CAL value of the gauges that select reaches (None to select all gauges)
+        priors: dict
+            dictionary of model prior name to reach data to overwrite
+        validation: numpy.ndarray
+            reaches with an NRT validation gauge
         """
 
-        sos_index = np.where(reach_id == sos["reaches"]["reach_id"][:])
-        gage_index = np.where(reach_id == gage[f"{source}_reach_id"][:])
-        try:
-            all_agencies = sos.gauge_agency.split(';')
-
-            no_nrt_validation_gauges_in_reach = True
+        gauge_reach = self.index.gauge_reach_rows(gage.path)
+        candidates = gauge_reach[np.ma.filled(gage["CAL"][:] == cal, False)] if cal is not None else gauge_reach
+        reaches = np.unique(candidates[candidates >= 0])
+        reaches = reaches[~validation[reaches]]
+        if reaches.size == 0: return
+
+        gauge = {name: gage[f"{source}_{name}"][:] for name in self.PRIOR_VARIABLES}
+        reaches, winners, valid = select_gauges(gauge_reach, reaches, gauge, priors["mean_q"])
+        for name in self.PRIOR_VARIABLES:
+            priors[name][reaches[valid]] = gauge[name][winners[valid]]
+        self.overwritten_indexes[reaches[valid]] = 1
+        self.overwritten_source[reaches[valid]] = source
+        self.bad_prior[reaches[~valid]] = 1
+        self.bad_prior_source[reaches[~valid]] = source
+
+    def _validation_reaches(self, sos, num_reaches, validation_cal):
+        """Return indicator of reaches with an NRT validation gauge.
+
+        Agencies are read from the SoS gauge_agency attribute; if they cannot
+        be read no reach is excluded from overwriting.
+        """
 
-            for current_agency_name in all_agencies:
-                is_there_a_nrt_val_gauge_in_the_reach = bool(len(np.where(sos[current_agency_name]['CAL'][np.where(sos[current_agency_name][f'{current_agency_name}_reach_id'][:] == reach_id)] == 0)[0]))
-                if is_there_a_nrt_val_gauge_in_the_reach == True:
-                    no_nrt_validation_gauges_in_reach = False
+        validation = np.zeros(num_reaches, dtype=bool)
+        try:
+            for agency in sos.gauge_agency.split(';'):
+                gauge_reach = self.index.gauge_reach_rows(agency)
+                rows = np.ma.filled(sos[agency]["CAL"][:] == validation_cal, False) & (gauge_reach >= 0)
+                validation[gauge_reach[rows]] = True
         except Exception as e:
             print(e)
             traceback.print_exception(*sys.exc_info())
-            no_nrt_validation_gauges_in_reach = True
-
-        if no_nrt_validation_gauges_in_reach:
-            # check to see if more than one gauge was found
-            if len(gage_index[0]) > 1:
-                double_gauge = True 
-
-                # find the mean q for each gauge
-                gage_mean_q_list = [gage[f"{source}_mean_q"][i] for i in gage_index[0]]
-
-                # in order to decide what one will replace the grades data, we find what guage had the closest to the prediction
-                # this method of sorting could change
-                winner_index = closest( gage_mean_q_list, sos["model"]["mean_q"][sos_index][0])
-
-            else:
-                double_gauge = False
-
-            grades = sos["model"]
-            if self._isvalid_q(gage, gage_index, source):
-                if not double_gauge:
-                    grades["flow_duration_q"][sos_index] = gage[f"{source}_flow_duration_q"][gage_index]
-                    grades["max_q"][sos_index] = gage[f"{source}_max_q"][gage_index]
-                    grades["monthly_q"][sos_index] = gage[f"{source}_monthly_q"][gage_index]
-                    grades["mean_q"][sos_index] = gage[f"{source}_mean_q"][gage_index]
-                    grades["min_q"][sos_index] = gage[f"{source}_min_q"][gage_index]
-                    grades["two_year_return_q"][sos_index] = gage[f"{source}_two_year_return_q"][gage_index]
-                    self.overwritten_indexes[sos_index] = 1
-                    self.overwritten_source[sos_index] = source
-                else:
-                    grades["flow_duration_q"][sos_index] = gage[f"{source}_flow_duration_q"][gage_index][winner_index]
-                    grades["max_q"][sos_index] = gage[f"{source}_max_q"][gage_index][winner_index]
-                    grades["monthly_q"][sos_index] = gage[f"{source}_monthly_q"][gage_index][winner_index]
-                    grades["mean_q"][sos_index] = gage[f"{source}_mean_q"][gage_index][winner_index]
-                    grades["min_q"][sos_index] = gage[f"{source}_min_q"][gage_index][winner_index]
-                    grades["two_year_return_q"][sos_index] = gage[f"{source}_two_year_return_q"][gage_index][winner_index]
-                    self.overwritten_indexes[sos_index] = 1
-                    self.overwritten_source[sos_index] = source
-
-            else:
-                self.bad_prior[sos_index] = 1
-                self.bad_prior_source[sos_index] = source
-        
-    def _historic_overwrite_prior(self, reach_id, sos, gage, source):
-        """Overwrite prior in grades with historic prior found in gage.
-
-        Parameters
-        ----------
-        reach_id: int
-            unique reach identifier
-        sos: netCDF4._netCDF4.Dataset
-            sos NetCDF Dataset
-        gage: netCDF4._netCDF4.Group
-            gage NetCDF group
-        source: str
-            name of gage data product source
-        """
-
-        sos_index = np.where(reach_id == sos["reaches"]["reach_id"][:])
-        gage_index = np.where(reach_id == gage[f"{source}_reach_id"][:])
-        
-        # check to see if more than one gauge was found
-        if len(gage_index[0]) > 1:
-            double_gauge = True 
-
-            # find the mean q for each gauge
-            gage_mean_q_list = [gage[f"{source}_mean_q"][i] for i in gage_index[0]]
-
-            # in order to decide what one will replace the grades data, we find what guage had the closest to the prediction
-            # this method of sorting could change
-            winner_index = closest( gage_mean_q_list, sos["model"]["mean_q"][sos_index][0])
-
-        else:
-            double_gauge = False
-
-        grades = sos["model"]
-        if self._isvalid_q(gage, gage_index, source):
-            if not double_gauge:
-                grades["flow_duration_q"][sos_index] = gage[f"{source}_flow_duration_q"][gage_index]
-                grades["max_q"][sos_index] = gage[f"{source}_max_q"][gage_index]
-                grades["monthly_q"][sos_index] = gage[f"{source}_monthly_q"][gage_index]
-                grades["mean_q"][sos_index] = gage[f"{source}_mean_q"][gage_index]
-                grades["min_q"][sos_index] = gage[f"{source}_min_q"][gage_index]
-                grades["two_year_return_q"][sos_index] = gage[f"{source}_two_year_return_q"][gage_index]
-                self.overwritten_indexes[sos_index] = 1
-                self.overwritten_source[sos_index] = source
-            else:
-                grades["flow_duration_q"][sos_index] = gage[f"{source}_flow_duration_q"][gage_index][winner_index]
-                grades["max_q"][sos_index] = gage[f"{source}_max_q"][gage_index][winner_index]
-                grades["monthly_q"][sos_index] = gage[f"{source}_monthly_q"][gage_index][winner_index]
-                grades["mean_q"][sos_index] = gage[f"{source}_mean_q"][gage_index][winner_index]
-                grades["min_q"][sos_index] = gage[f"{source}_min_q"][gage_index][winner_index]
-                grades["two_year_return_q"][sos_index] = gage[f"{source}_two_year_return_q"][gage_index][winner_index]
-                self.overwritten_indexes[sos_index] = 1
-                self.overwritten_source[sos_index] = source
-
-        else:
-            self.bad_prior[sos_index] = 1
-            self.bad_prior_source[sos_index] = source
-
-
-    def _isvalid_q(self, gage, gage_index, source):
-        """Test if any q priors in gage data are less than or equal to 0.
-        
-        Parameters
-        ----------
-        gage: netCDF4.Group
-            Gage group that  contains q priors
-        gage_index: int
-            integer index of gage data (corresponds to reach id)
-            
-        Returns
-        -------
-        Boolean indicator of valid (True) or invalid data (False)
-        
-        """
-        
-        keys = [f"{source}_flow_duration_q", f"{source}_max_q", f"{source}_monthly_q", f"{source}_mean_q", f"{source}_min_q", f"{source}_two_year_return_q"]
-        valid = True
-        for key in keys:
-            var = gage[key][gage_index]
-            if np.any(var <= 0) == True:
-                valid = False
-                break
-        return valid
+            validation[:] = False
+        return validation
 
     def _create_dims_vars(self, sos):
         """Create dimensions and variables to track overwritten data.
@@ -557,7 +425,7 @@ class Sos:
         """
         
         if "overwritten_indexes" not in sos["model"].variables:
-            oi = sos["model"].createVariable("overwritten_indexes", "i4", ("num_reaches",), compression="zlib")
+            oi = self.storage_profile.create_variable(sos["model"], "overwritten_indexes", "i4", ("num_reaches",))
             oi.comment = "Indexes of GRADES priors that were overwritten."
             oi.long_name = "overwritten priors indexes"
             oi.valid_min = 0
@@ -569,13 +437,13 @@ class Sos:
         if "overwritten_source" not in sos["model"].variables:
             if "nchar" not in sos["model"].dimensions:
                 sos["model"].createDimension("nchar", 4)
-            os = sos["model"].createVariable("overwritten_source", "S1", ("num_reaches", "nchar"), compression="zlib")
+            os = self.storage_profile.create_variable(sos["model"], "overwritten_source", "S1", ("num_reaches", "nchar"))
             os.comment = "Source of gage data that overwrote GRADES priors."
             os.long_name = "overwritten priors sources"
             os.coverage_content_type = "referenceInformation"
         
         if "bad_priors" not in sos["model"].variables:
-            bp = sos["model"].createVariable("bad_priors", "i4", ("num_reaches",), compression="zlib")
+            bp = self.storage_profile.create_variable(sos["model"], "bad_priors", "i4", ("num_reaches",))
             bp.comment = "Indexes of invalid gage priors that were not overwritten."
             bp.valid_min = 0
             bp.valid_max = 1
@@ -584,7 +452,7 @@ class Sos:
             bp.coverage_content_type = "qualityInformation"
 
         if "bad_prior_source" not in sos["model"].variables:
-            bps = sos["model"].createVariable("bad_prior_source", "S1", ("num_reaches", "nchar"), compression="zlib")
+            bps = self.storage_profile.create_variable(sos["model"], "bad_prior_source", "S1", ("num_reaches", "nchar"))
             bps.comment = "Source of invalid gage priors."
             bps.long_name = "invalid gage prior sources"
             bps.coverage_content_type = "referenceInformation"
@@ -619,32 +487,60 @@ class Sos:
         print('uploading ', vers)
         sos_ds.close()
 
-        s3 = boto3.client("s3")
         if self.sos_bucket == "confluence-sos":
-            response = s3.upload_file(str(self.sos_file), 
-                                    "confluence-sos", 
-                                    f"{self.run_type}/{vers}/{self.sos_file.name}")
+            destinations = [("confluence-sos", f"{self.run_type}/{vers}/{self.sos_file.name}", {})]
         else:
-            response = s3.upload_file(str(self.sos_file), 
-                                self.sos_bucket, 
-                                f"{self.run_type}/{vers}/{self.sos_file.name}",
-                                ExtraArgs={"ServerSideEncryption": "aws:kms"})
-        print(f"Uploaded: {self.run_type}/{vers}/{self.sos_file.name}")
+            destinations = [(self.sos_bucket, f"{self.run_type}/{vers}/{self.sos_file.name}",
+                             {"ServerSideEncryption": "aws:kms"})]
         
-        # Upload to PO.DAAC bucket
+        # Upload to PO.DAAC bucket from the same read of the SoS
         if self.podaac_update:
             sos_filename = f"{self.continent}_sword_{self.swordversion}_SOS_priors_{self.run_type}_{vers}_{self.run_date.strftime('%Y%m%dT%H%M%S')}.nc"
-            response = s3.upload_file(str(self.sos_file), 
-                                      self.podaac_bucket, 
-                                      sos_filename,
-                                      ExtraArgs={"ServerSideEncryption": "AES256"})
-            print(f"Uploaded: {self.podaac_bucket}/{sos_filename}")
+            destinations.append((self.podaac_bucket, sos_filename, {"ServerSideEncryption": "AES256"}))
+
+        transfer = SosTransfer(boto3.client("s3"))
+        transfer.upload(self.sos_file, destinations)
+        for bucket, key, _ in destinations:
+            print(f"Uploaded: {bucket}/{key}")
+
+        # Upload reach index alongside the SoS
+        with Dataset(self.sos_file, 'r') as sos_ds:
+            sidecar = SosIndex(sos_ds).index_file
+        bucket, key, extra_args = destinations[0]
+        index_key = f"{self.run_type}/{vers}/{sidecar.name}"
+        transfer.upload(sidecar, [(bucket, index_key, extra_args)])
+        print(f"Uploaded: {bucket}/{index_key}")
+
+        # Upload delta of changed variables alongside the SoS
+        if self.delta and self.base_file:
+            delta_file = self.sos_file.with_name(f"{self.sos_file.stem}_delta.nc")
+            manifest = create_delta(self.base_file, self.sos_file, delta_file)
+            bucket, key, extra_args = destinations[0]
+            delta_key = f"{self.run_type}/{vers}/{delta_file.name}"
+            transfer.upload(delta_file, [(bucket, delta_key, extra_args)])
+            print(f"Uploaded: {bucket}/{delta_key} ({len(manifest['changed'])} of {len(manifest['variables'])} variables changed)")
+
+    def export_zarr(self):
+        """Export SoS to a consolidated Zarr store and upload it next to the SoS."""
+
+        # Zarr is only needed when the export is requested
+        from priors.sos.SosZarr import SosZarr
+
+        with Dataset(self.sos_file, 'r') as sos_ds:
+            vers = sos_ds.product_version
+        store_dir = self.sos_file.with_suffix(".zarr")
+        sos_zarr = SosZarr()
+        sos_zarr.export(self.sos_file, store_dir)
+
+        extra_args = {} if self.sos_bucket == "confluence-sos" else {"ServerSideEncryption": "aws:kms"}
+        prefix = f"{self.run_type}/{vers}/{store_dir.name}"
+        count = sos_zarr.upload(store_dir, self.sos_bucket, prefix, boto3.client("s3"), extra_args)
+        print(f"Uploaded: {self.sos_bucket}/{prefix} ({count} objects)")
 
 def set_variable_atts(variable, variable_dict):
-        """Set the variable attribute metdata."""
+        """Set the variable attribute metdata that differs from the current values."""
         
-        for name, value in variable_dict.items():
-            setattr(variable, name, value)
+        apply_atts(variable, variable_dict)
                 
 def update_model(model_grp, metadata_json):
     """Update model metadata."""
@@ -652,8 +548,14 @@ def update_model(model_grp, metadata_json):
     for name, variable in model_grp.variables.items():
         set_variable_atts(variable, metadata_json[name])
         
-def update_historic_gauges(historicq_grp, metadata_json, continent):
-    """Update historic gauge data metadata."""
+def update_historic_gauges(historicq_grp, metadata_json, continent, attribute_plan=None):
+    """Update historic gauge data metadata.
+
+    Variable attributes are taken from attribute_plan when given, otherwise
+    from metadata_json.
+    """
+
+    if attribute_plan is None: attribute_plan = AttributePlan(metadata_json)
     
     # Locate agencies for continent
     gauge_agencies = metadata_json["global_attributes_extra"]["continent_agency"][continent]
@@ -664,8 +566,7 @@ def update_historic_gauges(historicq_grp, metadata_json, continent):
             gauge_grp = historicq_grp["grdc"]
         else:
             gauge_grp = historicq_grp[gauge_agency]
-        for name, variable in gauge_grp.variables.items():
-            set_variable_atts(variable, metadata_json[gauge_agency][name])
+        attribute_plan.apply_group(gauge_grp, gauge_agency)
 
 def fix_global_attributes(sos):
     """Fix global attributes to remove inconsistencies."""
@@ -0,0 +1,127 @@
+"""Module that caches previous SoS versions on local or mounted storage.
+
+Classes
+-------
+SosCache: Cache of downloaded SoS files validated against S3 ETag and size
+
+Functions
+---------
+reflink_copy(source, destination)
+    Copy file with copy-on-write where the filesystem supports it
+"""
+
+# Standard imports
+import json
+import os
+from pathlib import Path
+import shutil
+
+# Local imports
+from priors.sos.SosTransfer import SosTransfer
+
+FICLONE = 0x40049409    # Linux ioctl to share extents between files
+
+class SosCache:
+    """Class that caches previous SoS versions downloaded from S3.
+
+    Entries are keyed by bucket, run type, version and continent. An entry
+    is reused when a HEAD request reports the same ETag and size as when it
+    was stored, and it is copied into the SoS directory before it is
+    modified so the cached file is never changed.
+
+    Attributes
+    ----------
+    cache_dir: Path
+        path to cache directory (may be a mounted volume shared by jobs)
+    transfer: SosTransfer
+        S3 transfer used to validate and download entries
+
+    Methods
+    -------
+    fetch(bucket, run_type, version, continent, key, destination)
+        Copy cached SoS to destination, downloading it if it is missing or stale
+    """
+
+    def __init__(self, cache_dir, transfer=None):
+        """
+        Parameters
+        ----------
+        cache_dir: Path
+            path to cache directory
+        transfer: SosTransfer
+            S3 transfer used to validate and download entries
+        """
+
+        self.cache_dir = Path(cache_dir)
+        self.transfer = transfer if transfer is not None else SosTransfer()
+
+    def fetch(self, bucket, run_type, version, continent, key, destination):
+        """Copy cached SoS to destination, downloading it if it is missing or stale.
+
+        Parameters
+        ----------
+        bucket: str
+            name of SoS S3 bucket
+        run_type: str
+            'constrained' or 'unconstrained' data product type
+        version: str
+            SoS version
+        continent: str
+            continent abbreviation
+        key: str
+            object key of SoS file
+        destination: Path
+            path to copy SoS file to
+
+        Returns
+        -------
+        bool indicating if the cached file was reused
+        """
+
+        entry = self.cache_dir / bucket / run_type / version / continent / Path(key).name
+        meta_file = entry.with_name(f"{entry.name}.json")
+        head = self.transfer.client.head_object(Bucket=bucket, Key=key)
+        current = {"etag": head["ETag"], "size": head["ContentLength"]}
+
+        cached = None
+        if entry.exists() and meta_file.exists():
+            with open(meta_file) as jf:
+                cached = json.load(jf)
+        hit = cached == current and entry.stat().st_size == current["size"]
+
+        if not hit:
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            tmp = entry.with_name(f".{entry.name}.{os.getpid()}")
+            try:
+                self.transfer.download(bucket, key, tmp)
+                os.replace(tmp, entry)
+            finally:
+                if tmp.exists(): tmp.unlink()
+            with open(meta_file, 'w') as jf:
+                json.dump(current, jf)
+
+        reflink_copy(entry, destination)
+        return hit
+
+def reflink_copy(source, destination):
+    """Copy file with copy-on-write where the filesystem supports it.
+
+    Falls back to a regular copy when reflinks are not supported (for
+    example across filesystems or on filesystems without shared extents).
+
+    Parameters
+    ----------
+    source: Path
+        path to file to copy
+    destination: Path
+        path to copy file to
+    """
+
+    try:
+        import fcntl
+        with open(source, "rb") as src, open(destination, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return
+    except (ImportError, OSError):
+        pass
+    shutil.copyfile(source, destination)
@@ -0,0 +1,234 @@
+"""Module that creates and applies SoS delta (patch) files.
+
+A delta holds the group structure, dimensions and group attributes of a new
+SoS version and only the variables whose data or attributes changed from
+the base version. A manifest stored in the delta lists every variable of the
+new version with its SHA-256 digest so that the full SoS can be rebuilt from
+the base version and verified.
+
+Functions
+---------
+apply_delta(base_file, delta_file, output_file, verify)
+    Rebuild a full SoS from the base version and a delta
+create_args()
+    Create and return argparser with arguments for applying a delta
+create_delta(base_file, new_file, delta_file)
+    Write delta of the variables changed between two SoS versions
+read_manifest(delta_file)
+    Return delta manifest dictionary
+variable_digest(variable, block_bytes)
+    Return SHA-256 hex digest of variable data and attributes
+"""
+
+# Standard imports
+import argparse
+import hashlib
+import json
+from pathlib import Path
+
+# Third-party imports
+from netCDF4 import Dataset
+import numpy as np
+
+# Local imports
+from priors.sos.WritePlan import BLOCK_BYTES, block_rows, write_blocks
+
+MANIFEST_ATT = "delta_manifest"
+
+def variable_digest(variable, block_bytes=BLOCK_BYTES):
+    """Return SHA-256 hex digest of variable data and attributes.
+
+    Data is read and hashed in blocks of rows so that large gauge matrices
+    are never held in memory at once; the digest is the same as hashing the
+    whole variable.
+
+    Parameters
+    ----------
+    variable: netCDF4.Variable
+        variable to digest
+    block_bytes: int
+        maximum size in bytes of each block read
+    """
+
+    sha = hashlib.sha256()
+    sha.update(f"{variable.dtype}{variable.dimensions}{variable.shape}".encode())
+    atts = {name: variable.getncattr(name) for name in variable.ncattrs()}
+    sha.update(json.dumps(atts, sort_keys=True, default=_json_value).encode())
+
+    variable.set_auto_maskandscale(False)
+    for i, data in enumerate(_blocks(variable, block_bytes)):
+        if variable.dtype is str:
+            text = "\0".join(np.asarray(data, dtype=object).ravel().tolist())
+            sha.update((text if i == 0 else "\0" + text).encode())
+        else:
+            sha.update(np.ascontiguousarray(data).tobytes())
+    variable.set_auto_maskandscale(True)
+    return sha.hexdigest()
+
+def create_delta(base_file, new_file, delta_file):
+    """Write delta of the variables changed between two SoS versions.
+
+    Parameters
+    ----------
+    base_file: Path
+        path to base (previous) SoS version
+    new_file: Path
+        path to new SoS version
+    delta_file: Path
+        path to write delta to
+
+    Returns
+    -------
+    dict manifest of the delta
+    """
+
+    with Dataset(base_file) as base, Dataset(new_file) as new, Dataset(delta_file, 'w') as delta:
+        manifest = {
+            "base_version": getattr(base, "product_version", ""),
+            "product_version": getattr(new, "product_version", ""),
+            "variables": {},
+            "changed": []
+        }
+        for path, group in _walk(new):
+            delta_group = delta if path == "" else delta.createGroup(path)
+            for name, dim in group.dimensions.items():
+                delta_group.createDimension(name, None if dim.isunlimited() else dim.size)
+            delta_group.setncatts({name: group.getncattr(name) for name in group.ncattrs()})
+
+            base_group = _group(base, path)
+            for name, variable in group.variables.items():
+                digest = variable_digest(variable)
+                var_path = f"{path}/{name}"
+                manifest["variables"][var_path] = digest
+                if base_group is None or name not in base_group.variables \
+                        or variable_digest(base_group[name]) != digest:
+                    _copy_variable(variable, delta_group)
+                    manifest["changed"].append(var_path)
+
+        delta.setncattr(MANIFEST_ATT, json.dumps(manifest))
+    return manifest
+
+def read_manifest(delta_file):
+    """Return delta manifest dictionary.
+
+    Parameters
+    ----------
+    delta_file: Path
+        path to delta file
+    """
+
+    with Dataset(delta_file) as delta:
+        return json.loads(delta.getncattr(MANIFEST_ATT))
+
+def apply_delta(base_file, delta_file, output_file, verify=True):
+    """Rebuild a full SoS from the base version and a delta.
+
+    Parameters
+    ----------
+    base_file: Path
+        path to base SoS version the delta was created from
+    delta_file: Path
+        path to delta file
+    output_file: Path
+        path to write rebuilt SoS to
+    verify: bool
+        indicate if rebuilt variables are checked against manifest digests
+
+    Raises
+    ------
+    ValueError
+        if the base does not match the delta or a rebuilt variable fails verification
+    """
+
+    with Dataset(base_file) as base, Dataset(delta_file) as delta, Dataset(output_file, 'w') as output:
+        manifest = json.loads(delta.getncattr(MANIFEST_ATT))
+        base_version = getattr(base, "product_version", "")
+        if base_version != manifest["base_version"]:
+            raise ValueError(f"Delta requires base version {manifest['base_version']}, found {base_version}.")
+
+        for path, delta_group in _walk(delta):
+            group = output if path == "" else output.createGroup(path)
+            for name, dim in delta_group.dimensions.items():
+                group.createDimension(name, None if dim.isunlimited() else dim.size)
+            group.setncatts({name: delta_group.getncattr(name) for name in delta_group.ncattrs()
+                             if not (path == "" and name == MANIFEST_ATT)})
+
+        for var_path, digest in manifest["variables"].items():
+            path, name = var_path.rsplit("/", 1)
+            source_group = _group(delta, path)
+            if name not in source_group.variables:
+                source_group = _group(base, path)
+            variable = _copy_variable(source_group[name], _group(output, path))
+            if verify and variable_digest(variable) != digest:
+                raise ValueError(f"Rebuilt variable {var_path} does not match delta manifest.")
+
+def _walk(group, path=""):
+    """Yield (path, group) for group and all of its sub-groups."""
+
+    yield path, group
+    for name, child in group.groups.items():
+        yield from _walk(child, f"{path}/{name}")
+
+def _group(dataset, path):
+    """Return group at path in dataset or None if it does not exist."""
+
+    group = dataset
+    for name in path.split("/")[1:]:
+        if name not in group.groups: return None
+        group = group.groups[name]
+    return group
+
+def _blocks(variable, block_bytes=BLOCK_BYTES):
+    """Yield data of a variable in blocks of rows."""
+
+    if variable.ndim == 0:
+        yield variable[...]
+        return
+    step = block_rows(variable, block_bytes)
+    for start in range(0, variable.shape[0], step):
+        yield variable[start:start + step]
+
+def _copy_variable(variable, group, block_bytes=BLOCK_BYTES):
+    """Copy variable definition, attributes and data into group in blocks of rows."""
+
+    atts = {name: variable.getncattr(name) for name in variable.ncattrs()}
+    fill = atts.pop("_FillValue", None)
+    filters = variable.filters() or {}
+    chunking = variable.chunking()
+    copy = group.createVariable(variable.name, variable.datatype, variable.dimensions,
+                                fill_value=fill if fill is not None else False,
+                                zlib=filters.get("zlib", False),
+                                complevel=filters.get("complevel", 4),
+                                shuffle=filters.get("shuffle", False),
+                                chunksizes=None if chunking in (None, "contiguous") else chunking)
+    copy.setncatts(atts)
+
+    variable.set_auto_maskandscale(False)
+    copy.set_auto_maskandscale(False)
+    if variable.ndim == 0:
+        copy[...] = variable[...]
+    else:
+        write_blocks(copy, variable, None, block_bytes)
+    variable.set_auto_maskandscale(True)
+    copy.set_auto_maskandscale(True)
+    return copy
+
+def _json_value(value):
+    """Return JSON serializable form of a NetCDF attribute value."""
+
+    return value.tolist() if isinstance(value, (np.ndarray, np.generic)) else str(value)
+
+def create_args():
+    """Create and return argparser with arguments."""
+
+    arg_parser = argparse.ArgumentParser(description="Rebuild a full SoS from a base version and a delta")
+    arg_parser.add_argument("base", type=Path, help="Path to base SoS version")
+    arg_parser.add_argument("delta", type=Path, help="Path to delta file")
+    arg_parser.add_argument("output", type=Path, help="Path to write rebuilt SoS to")
+    arg_parser.add_argument("--noverify", action="store_true", help="Skip manifest digest verification")
+    return arg_parser
+
+if __name__ == "__main__":
+    args = create_args().parse_args()
+    apply_delta(args.base, args.delta, args.output, verify=not args.noverify)
+    print(f"Rebuilt: {args.output}")
@@ -0,0 +1,260 @@
+"""Module that indexes SoS rows by reach identifier.
+
+Classes
+-------
+SosIndex: Persistent sidecar index of reach, node and gauge rows for each
+    reach identifier with a reach-level read API
+
+Functions
+---------
+index_file(sos_file)
+    Return path to the index sidecar file of a SoS file
+"""
+
+# Standard imports
+import hashlib
+from pathlib import Path
+
+# Third-party imports
+import numpy as np
+
+def index_file(sos_file):
+    """Return path to the index sidecar file of a SoS file."""
+
+    sos_file = Path(sos_file)
+    return sos_file.with_name(f"{sos_file.stem}.index.npz")
+
+class SosIndex:
+    """Class that indexes SoS rows by reach identifier.
+
+    The index maps each reach identifier to its row in the reaches group,
+    the rows of its nodes and the rows of its gauges in every agency group
+    (any group holding a {group}_reach_id variable, including the historicQ
+    groups). Node and gauge rows are stored as sorted row lists with offsets
+    per reach row so that each lookup is a dictionary access and a slice.
+
+    The index is saved as an NPZ sidecar next to the SoS. Each part records a
+    digest of the identifiers it was built from; when the index is opened for
+    a new version only the parts whose identifiers changed are rebuilt.
+
+    Attributes
+    ----------
+    index_file: Path
+        path to sidecar NPZ file
+    parts: dict
+        dictionary of part name to dictionary of index arrays
+    reach_rows: dict
+        dictionary of reach identifier to reach row
+    updated: list
+        names of parts rebuilt when the index was opened
+
+    Methods
+    -------
+    gauge_reach_rows(group)
+        Return reach row of every gauge row of an agency group
+    gauge_rows(reach_id, group)
+        Return rows of gauges on a reach in an agency group
+    groups()
+        Return paths of indexed agency groups
+    node_rows(reach_id)
+        Return rows of nodes on a reach
+    reach(sos, reach_id)
+        Return priors, node rows and gauge data of a reach
+    reach_row(reach_id)
+        Return row of reach in the reaches group (None if not in the SoS)
+    """
+
+    def __init__(self, sos, sidecar=None):
+        """
+        Parameters
+        ----------
+        sos: netCDF4.Dataset
+            open SoS dataset
+        sidecar: Path
+            path to sidecar NPZ file (derived from the SoS path if None)
+        """
+
+        self.index_file = Path(sidecar) if sidecar else index_file(sos.filepath())
+        previous = self.__load()
+        self.parts = {}
+        self.updated = []
+
+        reach_ids = _ids(sos["reaches"]["reach_id"])
+        reach_digest = _digest(reach_ids)
+        self.__part(previous, "reaches", reach_digest,
+                    lambda: {"ids": reach_ids, "order": np.argsort(reach_ids, kind="stable")})
+        reaches = self.parts["reaches"]
+        self.reach_rows = dict(zip(reaches["ids"].tolist(), range(reaches["ids"].size)))
+
+        node_ids = _ids(sos["nodes"]["reach_id"])
+        self.__part(previous, "nodes", _digest(node_ids, reach_digest),
+                    lambda: self.__rows_by_reach(node_ids))
+        for path, group in _groups(sos):
+            name = f"{path.rsplit('/', 1)[-1]}_reach_id"
+            if name in group.variables:
+                gauge_ids = _ids(group[name])
+                self.__part(previous, path, _digest(gauge_ids, reach_digest),
+                            lambda: self.__rows_by_reach(gauge_ids))
+
+        if self.updated or set(previous) != set(self.parts):
+            self.__save()
+
+    def reach_row(self, reach_id):
+        """Return row of reach in the reaches group (None if not in the SoS)."""
+
+        return self.reach_rows.get(int(reach_id))
+
+    def node_rows(self, reach_id):
+        """Return rows of nodes on a reach."""
+
+        return self.__rows("nodes", reach_id)
+
+    def gauge_rows(self, reach_id, group):
+        """Return rows of gauges on a reach in an agency group.
+
+        Parameters
+        ----------
+        reach_id: int
+            unique reach identifier
+        group: str
+            path of agency group (e.g. '/USGS' or '/historicQ/grdc')
+
+        Raises
+        ------
+        KeyError
+            if the group is not indexed
+        """
+
+        return self.__rows(group if group.startswith("/") else f"/{group}", reach_id)
+
+    def gauge_reach_rows(self, group):
+        """Return reach row of every gauge row of an agency group.
+
+        Gauges on reaches that are not in the SoS have a reach row of -1.
+
+        Raises
+        ------
+        KeyError
+            if the group is not indexed
+        """
+
+        index = self.parts[group if group.startswith("/") else f"/{group}"]
+        offsets = index["offsets"]
+        reach_rows = np.full(index["order"].size, -1, dtype=np.int64)
+        reach_rows[index["order"][offsets[0]:offsets[-1]]] = np.repeat(np.arange(offsets.size - 1), np.diff(offsets))
+        return reach_rows
+
+    def groups(self):
+        """Return paths of indexed agency groups."""
+
+        return [name for name in self.parts if name.startswith("/")]
+
+    def reach(self, sos, reach_id):
+        """Return priors, node rows and gauge data of a reach.
+
+        Parameters
+        ----------
+        sos: netCDF4.Dataset
+            open SoS dataset the index was built from
+        reach_id: int
+            unique reach identifier
+
+        Returns
+        -------
+        dictionary with reach_row, model (variable name to reach value),
+        node_rows and gauges (group path to variable name to gauge rows)
+        """
+
+        row = self.reach_row(reach_id)
+        if row is None: return None
+
+        model = sos["model"]
+        reach = {
+            "reach_row": row,
+            "model": {name: variable[row] for name, variable in model.variables.items()
+                      if variable.dimensions[:1] == ("num_reaches",)},
+            "node_rows": self.node_rows(reach_id),
+            "gauges": {}
+        }
+        for path in self.groups():
+            rows = self.gauge_rows(reach_id, path)
+            if rows.size == 0: continue
+            group = sos[path.lstrip("/")]
+            dim = group[f"{path.rsplit('/', 1)[-1]}_reach_id"].dimensions[0]
+            reach["gauges"][path] = {name: variable[rows] for name, variable in group.variables.items()
+                                     if variable.dimensions[:1] == (dim,)}
+        return reach
+
+    def __rows(self, part, reach_id):
+        """Return rows of part for a reach."""
+
+        index = self.parts[part]
+        row = self.reach_row(reach_id)
+        if row is None: return np.array([], dtype=np.int64)
+        return index["order"][index["offsets"][row]:index["offsets"][row + 1]]
+
+    def __rows_by_reach(self, ids):
+        """Return sorted rows and offsets per reach row of identifiers."""
+
+        reaches = self.parts["reaches"]
+        sorted_ids = reaches["ids"][reaches["order"]]
+        position = np.searchsorted(sorted_ids, ids)
+        position[position == sorted_ids.size] = 0
+        reach_row = np.where(sorted_ids[position] == ids, reaches["order"][position], -1)
+        order = np.argsort(reach_row, kind="stable")
+        offsets = np.searchsorted(reach_row[order], np.arange(reaches["ids"].size + 1))
+        return {"order": order, "offsets": offsets}
+
+    def __part(self, previous, name, digest, build):
+        """Reuse part from previous index if its digest matches, otherwise build it."""
+
+        if name in previous and previous[name]["digest"] == digest:
+            self.parts[name] = previous[name]
+        else:
+            self.parts[name] = {"digest": digest, **build()}
+            self.updated.append(name)
+
+    def __load(self):
+        """Return parts of the existing sidecar file (empty if missing or unreadable)."""
+
+        if not self.index_file.exists(): return {}
+        parts = {}
+        try:
+            with np.load(self.index_file) as npz:
+                for key in npz.files:
+                    name, field = key.rsplit(":", 1)
+                    parts.setdefault(name, {})[field] = npz[key]
+        except (OSError, ValueError):
+            return {}
+        for part in parts.values():
+            part["digest"] = str(part["digest"])
+        return parts
+
+    def __save(self):
+        """Write parts to the sidecar file."""
+
+        arrays = {f"{name}:{field}": value for name, part in self.parts.items() for field, value in part.items()}
+        tmp = self.index_file.with_name(f".{self.index_file.name}")
+        with open(tmp, "wb") as npz:
+            np.savez(npz, **arrays)
+        tmp.replace(self.index_file)
+
+def _ids(variable):
+    """Return reach identifiers of a variable with missing values set to -1."""
+
+    return np.ma.filled(np.ma.asarray(variable[:]).astype(np.int64), -1).ravel()
+
+def _digest(ids, *parents):
+    """Return SHA-256 hex digest of identifiers and parent digests."""
+
+    sha = hashlib.sha256(np.ascontiguousarray(ids).tobytes())
+    for parent in parents:
+        sha.update(parent.encode())
+    return sha.hexdigest()
+
+def _groups(group, path=""):
+    """Yield (path, group) for all sub-groups of group."""
+
+    for name, child in group.groups.items():
+        yield f"{path}/{name}", child
+        yield from _groups(child, f"{path}/{name}")
@@ -0,0 +1,242 @@
+"""Module that transfers SoS files to and from S3 with integrity checks.
+
+Classes
+-------
+SosTransfer: Multipart S3 transfers with concurrent fan-out uploads and
+    SHA-256 checksum verification
+
+Functions
+---------
+b64_sha256(data)
+    Return base64 encoded SHA-256 digest of data
+composite_checksum(filename, part_size)
+    Return S3 composite SHA-256 checksum of a file uploaded in parts
+file_checksum(filename)
+    Return base64 encoded SHA-256 digest of a file
+"""
+
+# Standard imports
+import base64
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+from pathlib import Path
+import threading
+
+# Third-party imports
+import boto3
+from boto3.s3.transfer import TransferConfig
+
+class SosTransfer:
+    """Class that transfers SoS files to and from S3 with integrity checks.
+
+    Uploads read the local file once in CHUNK_SIZE parts and send each part
+    to every destination concurrently so that the Confluence and PO.DAAC
+    copies are written from a single read. Each part carries a SHA-256
+    checksum that S3 validates on receipt. Downloads are verified against the
+    checksum (or size) that S3 reports for the object.
+
+    Attributes
+    ----------
+    chunk_size: int
+        size in bytes of multipart parts
+    client: botocore.client.S3
+        S3 client used for transfers
+    config: boto3.s3.transfer.TransferConfig
+        transfer configuration used for downloads
+    max_concurrency: int
+        maximum number of concurrent part transfers
+
+    Methods
+    -------
+    download(bucket, key, filename)
+        Download object to filename and verify its integrity
+    upload(filename, destinations)
+        Upload filename to one or more (bucket, key, extra_args) destinations
+    verify(bucket, key, filename)
+        Verify local file matches object checksum or size
+    """
+
+    CHUNK_SIZE = 64 * 1024 ** 2
+    MAX_CONCURRENCY = 16
+
+    def __init__(self, client=None, chunk_size=CHUNK_SIZE, max_concurrency=MAX_CONCURRENCY):
+        """
+        Parameters
+        ----------
+        client: botocore.client.S3
+            S3 client (a default client is created if None)
+        chunk_size: int
+            size in bytes of multipart parts
+        max_concurrency: int
+            maximum number of concurrent part transfers
+        """
+
+        self.client = client if client is not None else boto3.client("s3")
+        self.chunk_size = chunk_size
+        self.max_concurrency = max_concurrency
+        self.config = TransferConfig(multipart_threshold=chunk_size,
+                                     multipart_chunksize=chunk_size,
+                                     max_concurrency=max_concurrency)
+
+    def download(self, bucket, key, filename):
+        """Download object to filename and verify its integrity.
+
+        Parameters
+        ----------
+        bucket: str
+            name of S3 bucket
+        key: str
+            object key
+        filename: Path
+            path to local file
+        """
+
+        self.client.download_file(Bucket=bucket, Key=key, Filename=str(filename), Config=self.config)
+        self.verify(bucket, key, filename)
+
+    def verify(self, bucket, key, filename):
+        """Verify local file matches object checksum or size.
+
+        Objects uploaded with SHA-256 checksums are compared against the full
+        object or composite (per part) checksum. Other objects are compared
+        by size.
+
+        Parameters
+        ----------
+        bucket: str
+            name of S3 bucket
+        key: str
+            object key
+        filename: Path
+            path to local file
+
+        Raises
+        ------
+        ValueError
+            if the local file does not match the object
+        """
+
+        head = self.client.head_object(Bucket=bucket, Key=key, ChecksumMode="ENABLED")
+        expected = head.get("ChecksumSHA256")
+        if expected:
+            # Multipart objects carry a composite checksum of the part checksums
+            expected, _, parts = expected.partition("-")
+            if parts or "-" in head.get("ETag", ""):
+                part_size = self.client.head_object(Bucket=bucket, Key=key, PartNumber=1)["ContentLength"]
+                actual = composite_checksum(filename, part_size)
+            else:
+                actual = file_checksum(filename)
+        else:
+            expected, actual = head["ContentLength"], Path(filename).stat().st_size
+
+        if expected != actual:
+            raise ValueError(f"Integrity check failed for s3://{bucket}/{key}: expected {expected}, found {actual}.")
+
+    def upload(self, filename, destinations):
+        """Upload filename to one or more destinations from a single read.
+
+        Parameters
+        ----------
+        filename: Path
+            path to local file
+        destinations: list
+            list of (bucket, key, extra_args) tuples where extra_args holds
+            object arguments such as ServerSideEncryption
+        """
+
+        size = Path(filename).stat().st_size
+        if size <= self.chunk_size:
+            with open(filename, "rb") as sos:
+                body = sos.read()
+            checksum = b64_sha256(body)
+            with ThreadPoolExecutor(max_workers=len(destinations)) as executor:
+                futures = [executor.submit(self.client.put_object, Bucket=bucket, Key=key,
+                                           Body=body, ChecksumSHA256=checksum, **extra_args)
+                           for bucket, key, extra_args in destinations]
+                for future in futures: future.result()
+            return
+
+        uploads = []
+        try:
+            for bucket, key, extra_args in destinations:
+                response = self.client.create_multipart_upload(Bucket=bucket, Key=key,
+                                                               ChecksumAlgorithm="SHA256",
+                                                               **extra_args)
+                uploads.append((bucket, key, response["UploadId"], []))
+            self.__upload_parts(filename, uploads)
+            for bucket, key, upload_id, parts in uploads:
+                parts.sort(key=lambda part: part["PartNumber"])
+                self.client.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id,
+                                                      MultipartUpload={"Parts": parts})
+        except BaseException:
+            for bucket, key, upload_id, _ in uploads:
+                self.client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+            raise
+
+    def __upload_parts(self, filename, uploads):
+        """Read filename once and upload each part to every multipart upload.
+
+        At most max_concurrency parts are held in memory at a time.
+        """
+
+        slots = threading.BoundedSemaphore(self.max_concurrency)
+        lock = threading.Lock()
+        failed = threading.Event()
+
+        def upload_part(chunk, part_number, checksum, remaining, upload):
+            bucket, key, upload_id, parts = upload
+            try:
+                response = self.client.upload_part(Bucket=bucket, Key=key, UploadId=upload_id,
+                                                   PartNumber=part_number, Body=chunk,
+                                                   ChecksumSHA256=checksum)
+                with lock:
+                    parts.append({"ETag": response["ETag"], "PartNumber": part_number,
+                                  "ChecksumSHA256": checksum})
+            except BaseException:
+                failed.set()
+                raise
+            finally:
+                with lock:
+                    remaining[0] -= 1
+                    if remaining[0] == 0: slots.release()
+
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            with open(filename, "rb") as sos:
+                part_number = 1
+                while True:
+                    slots.acquire()
+                    chunk = sos.read(self.chunk_size) if not failed.is_set() else b""
+                    if not chunk:
+                        slots.release()
+                        break
+                    checksum = b64_sha256(chunk)
+                    remaining = [len(uploads)]
+                    for upload in uploads:
+                        futures.append(executor.submit(upload_part, chunk, part_number,
+                                                       checksum, remaining, upload))
+                    part_number += 1
+            for future in futures: future.result()
+
+def b64_sha256(data):
+    """Return base64 encoded SHA-256 digest of data."""
+
+    return base64.b64encode(hashlib.sha256(data).digest()).decode("ascii")
+
+def file_checksum(filename, block_size=8 * 1024 ** 2):
+    """Return base64 encoded SHA-256 digest of a file."""
+
+    sha = hashlib.sha256()
+    with open(filename, "rb") as sos:
+        for block in iter(lambda: sos.read(block_size), b""):
+            sha.update(block)
+    return base64.b64encode(sha.digest()).decode("ascii")
+
+def composite_checksum(filename, part_size):
+    """Return S3 composite SHA-256 checksum of a file uploaded in parts."""
+
+    digests = []
+    with open(filename, "rb") as sos:
+        for part in iter(lambda: sos.read(part_size), b""):
+            digests.append(hashlib.sha256(part).digest())
+    return base64.b64encode(hashlib.sha256(b"".join(digests)).digest()).decode("ascii")
@@ -0,0 +1,171 @@
+"""Module that exports the SoS to a consolidated Zarr store.
+
+Consumers that only process a subset of reaches can open the store on S3 and
+read just the chunks that hold those reaches or gauges instead of
+downloading the entire continent NetCDF file.
+
+Classes
+-------
+SosZarr: Writes SoS groups and variables to a Zarr store chunked by reach
+    and gauge and uploads it to S3
+"""
+
+# Standard imports
+from concurrent.futures import ThreadPoolExecutor
+import os
+from pathlib import Path
+import shutil
+
+# Third-party imports
+import boto3
+from netCDF4 import Dataset
+import numcodecs
+import numpy as np
+import zarr
+
+class SosZarr:
+    """Class that exports the SoS to a consolidated Zarr store.
+
+    One-dimensional reach and node variables are chunked in runs of
+    reach_chunk values and gauge by time variables in blocks of gauge_chunk
+    gauges with the full time axis so a consumer reads one chunk per run of
+    reaches or gauges. Dimension names are stored in _ARRAY_DIMENSIONS so the
+    store can be opened with xarray.
+
+    Attributes
+    ----------
+    BLOCK_BYTES: int
+        maximum size in bytes of each block copied from the NetCDF file
+    gauge_chunk: int
+        number of gauges per chunk of gauge by time variables
+    reach_chunk: int
+        number of reaches or nodes per chunk of one-dimensional variables
+
+    Methods
+    -------
+    export(sos_file, store_dir)
+        Write SoS groups and variables to a consolidated Zarr store
+    upload(store_dir, bucket, prefix, client, extra_args)
+        Upload Zarr store directory to S3
+    """
+
+    BLOCK_BYTES = 64 * 1024 ** 2
+
+    def __init__(self, reach_chunk=4096, gauge_chunk=16):
+        """
+        Parameters
+        ----------
+        reach_chunk: int
+            number of reaches or nodes per chunk of one-dimensional variables
+        gauge_chunk: int
+            number of gauges per chunk of gauge by time variables
+        """
+
+        self.reach_chunk = reach_chunk
+        self.gauge_chunk = gauge_chunk
+
+    def export(self, sos_file, store_dir):
+        """Write SoS groups and variables to a consolidated Zarr store.
+
+        Parameters
+        ----------
+        sos_file: Path
+            path to SoS NetCDF file
+        store_dir: Path
+            path to Zarr directory store (replaced if it exists)
+        """
+
+        if Path(store_dir).exists(): shutil.rmtree(store_dir)
+        store = zarr.DirectoryStore(str(store_dir))
+        root = zarr.group(store=store)
+        with Dataset(sos_file) as sos:
+            self.__export_group(sos, root)
+        zarr.consolidate_metadata(store)
+
+    def upload(self, store_dir, bucket, prefix, client=None, extra_args=None, max_workers=16):
+        """Upload Zarr store directory to S3.
+
+        Parameters
+        ----------
+        store_dir: Path
+            path to Zarr directory store
+        bucket: str
+            name of S3 bucket
+        prefix: str
+            key prefix of the store in the bucket
+        client: botocore.client.S3
+            S3 client (a default client is created if None)
+        extra_args: dict
+            object arguments such as ServerSideEncryption
+        max_workers: int
+            maximum number of concurrent object uploads
+
+        Returns
+        -------
+        int number of objects uploaded
+        """
+
+        client = client if client is not None else boto3.client("s3")
+        store_dir = Path(store_dir)
+        files = [Path(root) / name for root, _, names in os.walk(store_dir) for name in names]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(client.upload_file, str(f), bucket,
+                                       f"{prefix.rstrip('/')}/{f.relative_to(store_dir).as_posix()}",
+                                       ExtraArgs=extra_args or None)
+                       for f in files]
+            for future in futures: future.result()
+        return len(files)
+
+    def __export_group(self, source, destination):
+        """Write group attributes, variables and sub-groups to the Zarr group."""
+
+        destination.attrs.update({name: _attr_value(source.getncattr(name)) for name in source.ncattrs()})
+        for name, variable in source.variables.items():
+            self.__export_variable(variable, destination)
+        for name, group in source.groups.items():
+            self.__export_group(group, destination.create_group(name))
+
+    def __export_variable(self, variable, group):
+        """Write variable data and attributes to a Zarr array in group."""
+
+        atts = {name: _attr_value(variable.getncattr(name)) for name in variable.ncattrs()}
+        fill = atts.pop("_FillValue", None)
+        atts["_ARRAY_DIMENSIONS"] = list(variable.dimensions)
+
+        shape = variable.shape
+        if variable.dtype is str:
+            dtype, codec = object, numcodecs.VLenUTF8()
+        else:
+            dtype, codec = variable.dtype, None
+        if len(shape) == 0:
+            chunks = True
+        elif len(shape) == 1 or dtype != object and np.dtype(dtype).kind == "S":
+            chunks = (min(self.reach_chunk, shape[0]) or 1,) + tuple(shape[1:])
+        else:
+            chunks = (min(self.gauge_chunk, shape[0]) or 1,) + tuple(shape[1:])
+        chunks = chunks if chunks is True else tuple(max(1, c) for c in chunks)
+
+        array = group.create(variable.name, shape=shape, chunks=chunks, dtype=dtype,
+                             fill_value=fill, object_codec=codec)
+        array.attrs.update(atts)
+
+        variable.set_auto_maskandscale(False)
+        if len(shape) == 0 or variable.dtype is str:
+            array[...] = np.asarray(variable[...], dtype=dtype)
+        else:
+            row_bytes = max(1, variable.dtype.itemsize * int(np.prod(shape[1:])))
+            rows = max(chunks[0], (self.BLOCK_BYTES // row_bytes) // chunks[0] * chunks[0])
+            for start in range(0, shape[0], rows):
+                array[start:start + rows] = variable[start:start + rows]
+        variable.set_auto_maskandscale(True)
+
+def _attr_value(value):
+    """Return JSON serializable form of a NetCDF attribute value."""
+
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, bytes):
+        return value.decode("utf-8")
+    return value
@@ -0,0 +1,234 @@
+"""Module that defines chunking and compression of SoS variables.
+
+Classes
+-------
+StorageProfile: Chunk shapes, compression level and shuffle filter per
+    variable class applied when SoS variables are created or rewritten
+"""
+
+# Standard imports
+import json
+import os
+from pathlib import Path
+
+# Third-party imports
+from netCDF4 import Dataset
+import numpy as np
+
+class StorageProfile:
+    """Class that defines chunking and compression of SoS variables.
+
+    Variables are grouped into classes by shape and type:
+    series - 2-D gauge (or reach) by time variables chunked per gauge row and
+        in fixed runs of days so that chunks do not change as time grows
+    vector - 1-D reach or node variables chunked in long runs
+    char - 2-D character arrays (S1) chunked in long runs of whole strings
+    Variable length strings cannot be compressed and are left contiguous.
+    Chunks are clamped to the size of fixed dimensions only; unlimited
+    dimensions such as num_days keep the profile length whatever their size.
+
+    Attributes
+    ----------
+    BLOCK_BYTES: int
+        maximum size in bytes of each block copied when rewriting
+    DEFAULTS: dict
+        default settings for each variable class
+    profile: dict
+        settings for each variable class
+
+    Methods
+    -------
+    create_variable(group, name, datatype, dimensions, shape, **kwargs)
+        Create variable in group with profile chunking and compression
+    from_json(profile_json)
+        Return StorageProfile with settings read from a JSON file
+    matches(variable)
+        Indicate if existing variable follows the profile
+    rewrite(sos_file)
+        Rewrite SoS file so that every variable follows the profile
+    settings(datatype, shape, unlimited)
+        Return createVariable keyword arguments for datatype and shape
+    """
+
+    BLOCK_BYTES = 64 * 1024 ** 2
+    DEFAULTS = {
+        "series": {"complevel": 4, "shuffle": True, "rows": 1, "days": 16384},
+        "vector": {"complevel": 4, "shuffle": True, "length": 65536},
+        "char": {"complevel": 4, "shuffle": False, "length": 65536}
+    }
+
+    def __init__(self, profile=None):
+        """
+        Parameters
+        ----------
+        profile: dict
+            settings for each variable class that override the defaults
+        """
+
+        self.profile = {name: dict(settings) for name, settings in self.DEFAULTS.items()}
+        for name, settings in (profile or {}).items():
+            self.profile[name].update(settings)
+
+    @classmethod
+    def from_json(cls, profile_json):
+        """Return StorageProfile with settings read from a JSON file.
+
+        Parameters
+        ----------
+        profile_json: Path
+            path to JSON file of variable class to settings
+        """
+
+        with open(profile_json) as jf:
+            return cls(json.load(jf))
+
+    def settings(self, datatype, shape, unlimited=None):
+        """Return createVariable keyword arguments for datatype and shape.
+
+        Parameters
+        ----------
+        datatype: numpy.dtype or str
+            variable data type
+        shape: tuple
+            variable shape
+        unlimited: tuple
+            indicates for each axis if its dimension is unlimited (none if None)
+        """
+
+        if datatype is str or len(shape) == 0:
+            return {}
+
+        dtype = np.dtype(datatype)
+        if dtype.kind == "S" and len(shape) == 2:
+            settings = self.profile["char"]
+            chunks = (settings["length"], shape[1])
+        elif len(shape) == 1:
+            settings = self.profile["vector"]
+            chunks = (settings["length"],)
+        else:
+            settings = self.profile["series"]
+            chunks = (settings["rows"],) + (settings["days"],) * (len(shape) - 1)
+        unlimited = unlimited or (False,) * len(shape)
+        chunks = tuple(chunk if is_unlimited else max(1, min(chunk, size))
+                       for chunk, size, is_unlimited in zip(chunks, shape, unlimited))
+
+        return {
+            "compression": "zlib",
+            "complevel": settings["complevel"],
+            "shuffle": settings["shuffle"],
+            "chunksizes": chunks
+        }
+
+    def create_variable(self, group, name, datatype, dimensions, shape=None, **kwargs):
+        """Create variable in group with profile chunking and compression.
+
+        Parameters
+        ----------
+        group: netCDF4.Group
+            group to create variable in
+        name: str
+            name of variable
+        datatype: numpy.dtype or str
+            variable data type
+        dimensions: tuple
+            names of variable dimensions (or a single dimension name)
+        shape: tuple
+            variable shape (current dimension sizes if None)
+        kwargs: dict
+            additional createVariable keyword arguments (e.g. fill_value)
+        """
+
+        if isinstance(dimensions, str): dimensions = (dimensions,)
+        dims = [_dimension(group, dim) for dim in dimensions]
+        if shape is None: shape = tuple(dim.size for dim in dims)
+        unlimited = tuple(dim.isunlimited() for dim in dims)
+        return group.createVariable(name, datatype, dimensions,
+                                    **self.settings(datatype, shape, unlimited), **kwargs)
+
+    def matches(self, variable):
+        """Indicate if existing variable follows the profile.
+
+        Parameters
+        ----------
+        variable: netCDF4.Variable
+            variable to check
+        """
+
+        unlimited = tuple(dim.isunlimited() for dim in variable.get_dims())
+        expected = self.settings(variable.dtype, variable.shape, unlimited)
+        if not expected:
+            return True
+        filters = variable.filters() or {}
+        return variable.chunking() == list(expected["chunksizes"]) \
+            and bool(filters.get("zlib")) and filters.get("complevel") == expected["complevel"] \
+            and bool(filters.get("shuffle")) == expected["shuffle"]
+
+    def rewrite(self, sos_file):
+        """Rewrite SoS file so that every variable follows the profile.
+
+        Variables inherited from previous versions keep the chunking they were
+        created with; this pass copies them into a new file with the profile
+        applied. The file is only rewritten if a variable does not match.
+
+        Parameters
+        ----------
+        sos_file: Path
+            path to SoS NetCDF file
+
+        Returns
+        -------
+        bool indicating if the file was rewritten
+        """
+
+        with Dataset(sos_file) as sos:
+            if all(self.matches(variable) for group in _groups(sos) for variable in group.variables.values()):
+                return False
+
+        tmp_file = Path(sos_file).with_name(f".{Path(sos_file).name}.rechunk")
+        try:
+            with Dataset(sos_file) as sos, Dataset(tmp_file, 'w', format=sos.data_model) as out:
+                self.__copy_group(sos, out)
+            os.replace(tmp_file, sos_file)
+        finally:
+            if tmp_file.exists(): tmp_file.unlink()
+        return True
+
+    def __copy_group(self, source, destination):
+        """Copy dimensions, attributes, variables and sub-groups with the profile applied."""
+
+        for name, dim in source.dimensions.items():
+            destination.createDimension(name, None if dim.isunlimited() else dim.size)
+        destination.setncatts({name: source.getncattr(name) for name in source.ncattrs()})
+
+        for name, variable in source.variables.items():
+            atts = {att: variable.getncattr(att) for att in variable.ncattrs()}
+            fill = atts.pop("_FillValue", None)
+            copy = self.create_variable(destination, name, variable.dtype, variable.dimensions,
+                                        shape=variable.shape, fill_value=fill if fill is not None else False)
+            copy.setncatts(atts)
+            variable.set_auto_maskandscale(False)
+            copy.set_auto_maskandscale(False)
+            if variable.ndim == 0 or variable.dtype is str:
+                copy[...] = variable[...]
+            else:
+                row_bytes = max(1, variable.dtype.itemsize * int(np.prod(variable.shape[1:])))
+                rows = max(1, self.BLOCK_BYTES // row_bytes)
+                for start in range(0, variable.shape[0], rows):
+                    copy[start:start + rows] = variable[start:start + rows]
+
+        for name, group in source.groups.items():
+            self.__copy_group(group, destination.createGroup(name))
+
+def _dimension(group, name):
+    """Return dimension from group or the nearest parent group that defines it."""
+
+    while name not in group.dimensions:
+        group = group.parent
+    return group.dimensions[name]
+
+def _groups(group):
+    """Yield group and all of its sub-groups."""
+
+    yield group
+    for child in group.groups.values():
+        yield from _groups(child)
@@ -0,0 +1,273 @@
+"""Module that plans and issues variable writes for a SoS group.
+
+Classes
+-------
+RowView: Lazy selection of rows of a gauge matrix
+WritePlan: Gathers data and attributes for a NetCDF group and writes each
+    variable once
+
+Functions
+---------
+block_rows(data, block_bytes)
+    Return number of rows of data that fit in block_bytes
+char_array(strings, nchar)
+    Return (n x nchar) character array of strings for an S1 variable
+fill_missing(data, fill)
+    Return data with NaN replaced by fill, converting in place where possible
+write_blocks(variable, data, fill, block_bytes)
+    Write data to variable in blocks of rows with per block fill conversion
+write_columns(variable, row, columns, data, fill)
+    Write values to columns of one row of a matrix variable
+write_rows(variable, rows, data, fill)
+    Write data to selected rows of a variable
+"""
+
+# Third-party imports
+import numpy as np
+
+# Local imports
+from priors.sos.AttributePlan import apply_atts
+
+BLOCK_BYTES = 64 * 1024 ** 2
+
+class RowView:
+    """Class that lazily selects rows of a gauge matrix.
+
+    Selecting gauge rows with fancy indexing copies the whole (gauges x days)
+    matrix. A RowView keeps the source matrix and the selected rows and only
+    copies the rows of a block when it is sliced, so writes and reductions
+    hold one block at a time.
+
+    Attributes
+    ----------
+    dtype: numpy.dtype
+        data type of the source matrix
+    matrix: numpy.ndarray
+        source matrix
+    ndim: int
+        number of dimensions of the selection
+    rows: numpy.ndarray
+        indexes of selected rows
+    shape: tuple
+        shape of the selection
+
+    Methods
+    -------
+    blocks(block_bytes)
+        Yield copies of consecutive blocks of selected rows
+    """
+
+    def __init__(self, matrix, rows):
+        """
+        Parameters
+        ----------
+        matrix: numpy.ndarray
+            source matrix
+        rows: numpy.ndarray
+            indexes of rows to select
+        """
+
+        self.matrix = matrix
+        self.rows = np.asarray(rows).ravel()
+        self.dtype = matrix.dtype
+        self.shape = (self.rows.size,) + matrix.shape[1:]
+        self.ndim = len(self.shape)
+
+    def __len__(self):
+        return self.rows.size
+
+    def __getitem__(self, index):
+        return self.matrix[self.rows[index]]
+
+    def __array__(self, dtype=None, copy=None):
+        data = self.matrix[self.rows]
+        return data if dtype is None else data.astype(dtype, copy=False)
+
+    def blocks(self, block_bytes=BLOCK_BYTES):
+        """Yield copies of consecutive blocks of selected rows."""
+
+        step = block_rows(self, block_bytes)
+        for start in range(0, self.shape[0], step):
+            yield self[start:start + step]
+
+class WritePlan:
+    """Class that gathers data and attributes for a NetCDF group and writes
+    each variable once.
+
+    Missing values are converted to the fill value in place when the data
+    array is a writeable floating point array so that no transient copy of
+    large discharge matrices is created. Matrices (and RowView selections)
+    are written in blocks of rows so peak memory is bounded by the block
+    size rather than by the matrix. Data added with rows is written only to
+    those rows of the variable. Adding a variable more than once replaces
+    the earlier entry so duplicate writes are never issued.
+
+    Attributes
+    ----------
+    FLOAT_FILL: float
+        Default fill value for missing float values
+    group: netCDF4.Group
+        group to write variables to
+    plan: dict
+        dictionary of variable name to (data, attributes, fill value, rows)
+
+    Methods
+    -------
+    add(name, data, atts, fill, rows)
+        Add variable data and attributes to the plan
+    write()
+        Write all planned variables and attributes to the group
+    """
+
+    FLOAT_FILL = -999999999999
+
+    def __init__(self, group):
+        """
+        Parameters
+        ----------
+        group: netCDF4.Group
+            group to write variables to
+        """
+
+        self.group = group
+        self.plan = {}
+
+    def add(self, name, data=None, atts=None, fill=FLOAT_FILL, rows=None):
+        """Add variable data and attributes to the plan.
+
+        Parameters
+        ----------
+        name: str
+            name of variable in group
+        data: numpy.ndarray
+            data to write (None to only set attributes)
+        atts: dict
+            variable attributes (None to leave attributes unchanged)
+        fill: float
+            value to replace NaN with (None to write data unchanged)
+        rows: numpy.ndarray
+            sorted indexes along the first dimension to write data to (None
+            to write the whole variable)
+        """
+
+        self.plan[name] = (data, atts, fill, rows)
+
+    def write(self):
+        """Write all planned variables and attributes to the group."""
+
+        for name, (data, atts, fill, rows) in self.plan.items():
+            variable = self.group[name]
+            if data is not None and rows is not None:
+                write_rows(variable, rows, data, fill)
+            elif data is not None and np.ndim(data) > 1:
+                write_blocks(variable, data, fill)
+            elif data is not None:
+                variable[:] = fill_missing(data, fill)
+            apply_atts(variable, atts)
+        self.plan = {}
+
+def fill_missing(data, fill):
+    """Return data with NaN replaced by fill, converting in place where possible.
+
+    Parameters
+    ----------
+    data: numpy.ndarray
+        data to convert
+    fill: float
+        value to replace NaN with (None to return data unchanged)
+    """
+
+    if fill is None:
+        return data
+    if not isinstance(data, np.ndarray) or not np.issubdtype(data.dtype, np.floating):
+        return data
+    if np.ma.isMaskedArray(data):
+        return np.ma.filled(data, fill)
+    if data.flags.writeable:
+        return np.nan_to_num(data, copy=False, nan=fill)
+    return np.nan_to_num(data, copy=True, nan=fill)
+
+def block_rows(data, block_bytes=BLOCK_BYTES):
+    """Return number of rows of data that fit in block_bytes (at least one)."""
+
+    row_bytes = np.dtype(data.dtype).itemsize * int(np.prod(data.shape[1:]))
+    return max(1, block_bytes // max(1, row_bytes))
+
+def char_array(strings, nchar):
+    """Return (n x nchar) character array of strings for an S1 variable.
+
+    Equivalent to netCDF4.stringtochar of an S{nchar} array, which fails on
+    NumPy 2 byte strings.
+    """
+
+    return np.asarray(strings, dtype=f"S{nchar}").view("S1").reshape(-1, nchar)
+
+def write_blocks(variable, data, fill, block_bytes=BLOCK_BYTES):
+    """Write data to variable in blocks of rows with per block fill conversion.
+
+    Parameters
+    ----------
+    variable: netCDF4.Variable
+        variable to write to
+    data: numpy.ndarray or RowView
+        matrix to write, one gauge per row
+    fill: float
+        value to replace NaN with (None to write data unchanged)
+    block_bytes: int
+        maximum size in bytes of each block
+    """
+
+    step = block_rows(data, block_bytes)
+    for start in range(0, data.shape[0], step):
+        block = data[start:start + step]
+        variable[start:start + block.shape[0]] = fill_missing(block, fill)
+
+def write_columns(variable, row, columns, data, fill):
+    """Write values to columns of one row of a matrix variable.
+
+    Only the window between the first and last column is read and written;
+    columns in the window that are not updated keep their existing values.
+    Columns past the current size of an unlimited dimension are appended.
+
+    Parameters
+    ----------
+    variable: netCDF4.Variable
+        (rows x columns) variable to write to
+    row: int
+        index of row to update
+    columns: numpy.ndarray
+        indexes of columns to update
+    data: numpy.ndarray
+        values of columns
+    fill: float
+        value to replace NaN with (None to write data unchanged)
+    """
+
+    columns = np.asarray(columns)
+    if columns.size == 0: return
+    start, stop = int(columns.min()), int(columns.max()) + 1
+    window = np.full(stop - start, np.nan)
+    existing = min(stop, variable.shape[1])
+    if existing > start:
+        window[:existing - start] = np.ma.filled(np.ma.asarray(variable[row, start:existing], dtype=np.float64), np.nan)
+    window[columns - start] = data
+    variable[row, start:stop] = fill_missing(window, fill)
+
+def write_rows(variable, rows, data, fill):
+    """Write data to selected rows of a variable.
+
+    Parameters
+    ----------
+    variable: netCDF4.Variable
+        variable to write to
+    rows: numpy.ndarray
+        sorted indexes along the first dimension, one per row of data
+    data: numpy.ndarray
+        data to write; trailing dimensions are written from index 0
+    fill: float
+        value to replace NaN with (None to write data unchanged)
+    """
+
+    if len(rows) == 0: return
+    index = (np.asarray(rows),) + tuple(slice(0, size) for size in np.shape(data)[1:])
+    variable[index] = fill_missing(data, fill)
@@ -0,0 +1,178 @@
+"""Module that indexes gauge targets and the gauge identifiers stored in the SoS.
+
+Targets files are read in a single pass and filtered against a hashed set of
+the identifiers already stored in each SoS agency group so that gauges are
+matched in O(targets + ids).
+
+Classes
+-------
+TargetIndex: Hashed lookup of agency gauge identifiers stored in the SoS
+
+Functions
+---------
+agency_rule(filename)
+    Return (agency, identifier transform) for a Riggs targets file name
+decode_ids(ids)
+    Return NumPy array of identifier strings from a NetCDF variable
+filter_ids(sos_ids, agency)
+    Return set of identifiers to keep for an agency (None to keep all)
+read_targets(targets_file, agency_ids, rule, filter_cal)
+    Read gauge targets file and return identifiers, reach identifiers and CAL
+"""
+
+# Third-party imports
+from netCDF4 import Dataset, chartostring
+import numpy as np
+
+def _int_id(station_id):
+    """Hidroweb identifiers are stored with leading zeros."""
+    return str(int(station_id))
+
+def _pad_id(station_id):
+    """DGA identifiers are eight characters with a leading zero."""
+    return station_id if len(station_id) >= 8 else "0" + station_id
+
+# Riggs targets files by continent
+TARGET_FILES = {
+    "na": ["Riggs_canada_.nc", "Riggs_quebec_.nc"],
+    "eu": ["Riggs_uk_.nc", "Riggs_france_.nc"],
+    "as": ["Riggs_japan_.nc"],
+    "oc": ["Riggs_australia_.nc"],
+    "sa": ["Riggs_brazil_.nc"],
+    "af": ["Riggs_safrica_.nc"]
+}
+
+# Targets file keyword: (agency, identifier transform applied after matching)
+AGENCY_RULES = {
+    "brazil": ("Hidroweb", _int_id),
+    "australia": ("ABOM", str),
+    "canada": ("WSC", str),
+    "japan": ("MLIT", str),
+    "uk": ("DEFRA", str),
+    "chile": ("DGA", _pad_id),
+    "france": ("EAU", str),
+    "quebec": ("MEFCCWP", str),
+    "safrica": ("DWA", str)
+}
+
+def agency_rule(filename):
+    """Return (agency, identifier transform) for a Riggs targets file name."""
+
+    name = str(filename).lower()
+    for keyword, rule in AGENCY_RULES.items():
+        if keyword in name: return rule
+    raise ValueError(f"No agency rule for targets file: {filename}")
+
+def decode_ids(ids):
+    """Return NumPy array of identifier strings from a NetCDF variable.
+
+    Handles 2-D character arrays (S1), byte strings and values that netCDF4
+    has already decoded to strings. Masked characters are replaced with the
+    variable fill value.
+
+    Parameters
+    ----------
+    ids: numpy.ndarray
+        identifier data read from a NetCDF variable
+    """
+
+    ids = np.ma.asarray(ids)
+    if np.ma.is_masked(ids):
+        ids = ids.filled(ids.fill_value)
+    else:
+        ids = np.ma.getdata(ids)
+
+    if ids.dtype.kind == "S":
+        return chartostring(ids, encoding="utf-8") if ids.ndim > 1 else np.char.decode(ids, "utf-8")
+    if ids.dtype.kind == "U" and ids.ndim > 1:
+        return np.array(["".join(row) for row in ids])
+    return ids.astype(str)
+
+def filter_ids(sos_ids, agency=None):
+    """Return set of identifiers to keep for an agency (None to keep all).
+
+    Targets are only filtered when SoS identifiers are stored; if none are
+    given, for any agency, every gauge in the targets file is kept.
+
+    Parameters
+    ----------
+    sos_ids: TargetIndex, dict or iterable
+        gauge identifiers stored in the SoS, either by agency or for all agencies
+    agency: str
+        agency name used to look up identifiers stored by agency
+    """
+
+    if sos_ids is None: return None
+    if isinstance(sos_ids, TargetIndex):
+        sos_ids = sos_ids.ids
+    if isinstance(sos_ids, dict):
+        if not any(len(ids) for ids in sos_ids.values()): return None
+        return set(sos_ids.get(agency, ()))
+    sos_ids = set(sos_ids)
+    return sos_ids if sos_ids else None
+
+def read_targets(targets_file, agency_ids=None, rule=("", str), filter_cal=False):
+    """Read gauge targets file and return identifiers, reach identifiers and CAL.
+
+    Parameters
+    ----------
+    targets_file: Path
+        path to targets NetCDF file
+    agency_ids: set
+        identifiers to keep (all identifiers are kept if None)
+    rule: tuple
+        (agency, identifier transform) applied to kept identifiers
+    filter_cal: bool
+        indicate if only gauges with a CAL of 0 or 1 are kept when filtering
+
+    Returns
+    -------
+    numpy arrays of identifiers, reach identifiers and CAL flags
+    """
+
+    with Dataset(targets_file) as ncf:
+        st = decode_ids(ncf["StationID"][:])
+        rid = ncf["Reach_ID"][:]
+        cal = ncf["CAL"][:]
+
+    if agency_ids is not None:
+        keep = np.fromiter((i in agency_ids for i in st), dtype=bool, count=st.size)
+        if filter_cal:
+            cal_values = np.ma.filled(cal.astype(np.float64), np.nan)
+            keep &= np.isin(cal_values, (0, 1))
+        st, rid, cal = st[keep], rid[keep], cal[keep]
+
+    transform = rule[1]
+    if transform is not str:
+        st = np.array([transform(i) for i in st], dtype=str)
+    return st, rid, cal
+
+class TargetIndex:
+    """Class that provides hashed lookups of gauge identifiers stored in the SoS.
+
+    Attributes
+    ----------
+    ids: dict
+        dictionary of agency name to set of gauge identifiers
+    """
+
+    def __init__(self, sos_file, agencies):
+        """
+        Parameters
+        ----------
+        sos_file: Path
+            path to SoS NetCDF file
+        agencies: list
+            list of agency group names to index
+        """
+
+        self.ids = {}
+        with Dataset(sos_file) as sos:
+            for agency in agencies:
+                if agency not in sos.groups:
+                    self.ids[agency] = set()
+                    continue
+                self.ids[agency] = set(decode_ids(sos[agency][f"{agency}_id"][:]).tolist())
+
+    def __getitem__(self, agency):
+        return self.ids[agency]
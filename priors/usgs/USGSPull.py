@@ -15,6 +15,7 @@ import time
 
 
 # Local imports
+from priors.targets.TargetIndex import TargetIndex
 from priors.usgs.USGSRead import USGSRead
 
 
@@ -28,6 +29,42 @@ def days_convert(days):
 
     return new_date.strftime('%Y-%m-%d %H:%M:%S+00:00')
 
+def daily_mean(T, Q, F=None):
+    """Return daily mean discharge indexed by UTC day ordinal.
+
+    Parameters
+    ----------
+    T: array
+        Timestamps of discharge values (timezone-aware values are converted to UTC)
+    Q: array
+        Discharge values
+    F: array
+        Qualification flags; values that are missing or contain 'Ice' are removed
+
+    Returns
+    -------
+    DataFrame of daily mean discharge in column '00060_Mean'
+    """
+
+    T = pd.DatetimeIndex(T)
+    if T.tz is not None:
+        T = T.tz_convert('UTC').tz_localize(None)
+    Q = np.asarray(Q, dtype=np.float64)
+
+    keep = np.ones(Q.shape, dtype=bool)
+    if F is not None:
+        F = pd.Series(F, dtype=object)
+        keep = ~(F.isna() | F.astype(str).str.contains('Ice', regex=False)).to_numpy()
+
+    # Days since 1970-01-01 offset to proleptic Gregorian ordinals
+    days = T.values[keep].astype('datetime64[D]').astype(np.int64) + date(1970, 1, 1).toordinal()
+    daily = pd.Series(Q[keep]).groupby(days).mean()
+
+    dfnew=pd.DataFrame()
+    dfnew.index=daily.index.to_numpy()
+    dfnew['00060_Mean']=daily.to_numpy()
+    return dfnew
+
 
 def create_sos_df(sos, date_list, index):
     df = pd.DataFrame(columns = ['datetime', '00060_Mean'])
@@ -215,18 +252,31 @@ class USGSPull:
         Dictionary of USGS data  
     usgs_targets: Path
         Path to USGS targets file
+    cache: ResponseCache
+        On-disk cache of NWIS responses (optional)
+    resolution: str
+        'dv' to request daily values first or 'iv' to request instantaneous values first
+    merge: str
+        'matrix' to merge new data into full (gauges x days) matrices or
+        'inplace' to keep only the day columns touched by new data
 
     Methods
     -------
+    column_patch(row, T, Q, ALLt)
+        Return day columns and values of a gauge record for an in-place merge
+    daily_record(df, site)
+        Return daily mean discharge and last approved day of NWIS record
     gather_records(sites)
         Creates and returns a list of dataframes for each NWIS record
     get_record(site)
         Get NWIS record
+    nwis_record(site, service, start_date)
+        Download NWIS record, using the response cache when available
     pull() 
         Pulls USGS data and flags and stores in usgs_dict
     """
 
-    def __init__(self, usgs_targets, start_date, end_date, sos_file):
+    def __init__(self, usgs_targets, start_date, end_date, sos_file, cache=None, resolution='dv', merge='matrix'):
         """
         Parameters
         ----------
@@ -236,178 +286,150 @@ class USGSPull:
             Date to start search for
         end_date: str
             Date to end search for
+        cache: ResponseCache
+            On-disk cache of NWIS responses (optional)
+        resolution: str
+            'dv' to request daily values first or 'iv' to request instantaneous values first
+        merge: str
+            'matrix' to merge new data into full (gauges x days) matrices or
+            'inplace' to keep only the day columns touched by new data
         """
         self.usgs_targets = usgs_targets
         self.start_date = start_date
         self.end_date = end_date
         self.usgs_dict = {}
         self.sos_file = sos_file
+        self.cache = cache
+        self.resolution = resolution
+        self.merge = merge
 
-    async def get_record(self, site):
-        """Get NWIS record.
-        
-        Parameter
-        ---------
+    def nwis_record(self, site, service, start_date=None):
+        """Download NWIS record, using the response cache when available.
+
+        Parameters
+        ----------
         site: str
             Site identifier
+        service: str
+            NWIS service: 'iv' or 'dv'
+        start_date: str
+            Date to start search for (defaults to start_date attribute)
         """
-        try:
-            df =  nwis.get_record(sites=site, service='iv', start= self.start_date, end= self.end_date)
-        except Exception as e:
-            print('nwis search failed...', e, site)
-            # df = pd.DataFrame()
-            df =  nwis.get_record(sites=site, service='dv', start= self.start_date, end= self.end_date)
 
+        start_date = start_date if start_date is not None else self.start_date
+        if self.cache is None:
+            return nwis.get_record(sites=site, service=service, start=start_date, end=self.end_date)
+        return self.cache.call(f"USGS_{service}", site, start_date, self.end_date,
+                               nwis.get_record, sites=site, service=service,
+                               start=start_date, end=self.end_date)
+
+    def daily_record(self, df, site):
+        """Return daily mean discharge and last approved day of NWIS record.
 
-        # print('took', end - start, 'to pull this gauge')
-        # print('here is the df which should have columns')
-        # print(df.columns)
+        Parameters
+        ----------
+        df: DataFrame
+            NWIS iv or dv record
+        site: str
+            Site identifier
 
+        Returns
+        -------
+        DataFrame of daily mean discharge (None if no discharge column) and
+        ordinal of last day with approved discharge (None if not approved)
+        """
 
-        # q_columns = ['00060',
-        #     '00060_2',
-        #     '00060_from primary sensor',
-        #     '00060_discharge from primary sensor'
-        #     ]
-        
-        
-        if len(df) ==0:
-            df =  nwis.get_record(sites=site, service='dv', start= self.start_date, end= self.end_date)
-            # filtered_columns = [s for s in list(df.columns) if s.startswith('00060') and not s.endswith('_cd')]
-            # print('searching via filtered columns', df)
-            
         filtered_columns = [s for s in list(df.columns) if s.startswith('00060') and not s.endswith('_cd')]
-            
-        
-        
-
-        # pull out q, t, and f
-        found_column = False
-        for column_name in filtered_columns:
-            # if column_name in list(df.columns):
-            found_column = True
-            Q = df[column_name].values[df[column_name].values>-99]/35.3147
-            T = df.index.values[df[column_name].values>-99]
-            if column_name + '_cd' in df.columns:
-                F=df[column_name + '_cd'].values[df[column_name].values>-99]
-            else:
-                try:
-                    F=df['00065_cd'].values[df[column_name].values>-99]
-                except:
-                    F = np.nan
-                    print('Coulnt not find any flags...')
-        
-        if not found_column:
+        if not filtered_columns:
             print('could not find columns...', list(df.columns), site)
-            return (pd.DataFrame(), site)
-        
-        
-            
-
-            
-
-
-
-
+            return None, None
+
+        # pull out q, t, and f from the last discharge column
+        column_name = filtered_columns[-1]
+        valid = df[column_name].values>-99
+        Q = df[column_name].values[valid]/35.3147
+        T = df.index.values[valid]
+        if column_name + '_cd' in df.columns:
+            F=df[column_name + '_cd'].values[valid]
+        else:
+            try:
+                F=df['00065_cd'].values[valid]
+            except:
+                F = np.nan
+                print('Coulnt not find any flags...')
+
+        # Flags are only filtered for records with more than one flag value
+        if type(F) == float or len(F) <= 1:
+            F = None
+        dfnew = daily_mean(T, Q, F)
+
+        # Approved values are flagged 'A' with optional qualifiers ('A, e')
+        approved_end = None
+        if F is not None:
+            approved = pd.Series(F, dtype=object).astype(str).str.split(',').str[0].str.strip() == 'A'
+            if approved.any():
+                approved_end = daily_mean(T[approved.to_numpy()], Q[approved.to_numpy()]).index.max()
+        return dfnew, approved_end
 
-        # for i in potential_flag_columns:
-        #     try:
+    async def get_record(self, site):
+        """Get NWIS record.
 
+        With 'dv' resolution daily values are requested first and
+        instantaneous values are only requested for the window after the
+        last approved daily value. Instantaneous values are aggregated to
+        daily means and replace provisional daily values in that window.
+        With 'iv' resolution instantaneous values are requested for the whole
+        range and daily values are only used when that request fails.
         
-        # try:
-        #     Q=df['00060'].values[df['00060'].values>-99]/35.3147
-        #     T=df.index.values[df['00060'].values>-99]
-        #     try:
-        #         F=df['00065_cd'].values[df['00060'].values>-99]
-        #     except:
-        #         F=df['00060_cd'].values[df['00060'].values>-99]
-        #     # print('successful pull...')
-        # except Exception as e:
-        #     # print(e)
-        #     # print(1)
-        #     try:
-        #         Q=df['00060_2'].values[df['00060_2'].values>-99]/35.3147
-        #         T=df.index.values[df['00060_2'].values>-99]
-        #         F=df['00065_cd'].values[df['00060_2'].values>-99]
-        #         try
-        #             F=df['00065_cd'].values[df['00060_from primary sensor'].values>-99]
-        #         except:
-        #             F=df['00060_2_cd'].values[df['00060_from primary sensor'].values>-99]
-        #     except Exception as e:
-        #         # print(e)
-        #         # print(2)
-        #         try:
-        #             Q=df['00060_from primary sensor'].values[df['00060_from primary sensor'].values>-99]/35.3147
-        #             T=df.index.values[df['00060_from primary sensor'].values>-99]
-        #             try:
-        #                 F=df['00065_cd'].values[df['00060_from primary sensor'].values>-99]
-        #             except:
-        #                 F=df['00060_from primary sensor_cd'].values[df['00060_from primary sensor'].values>-99]
-        #             print('successful pull...')
-        #         except Exception as e:
-        #             # print(3)
-        #             # print(e)
-        #             try: 
-        #                 Q=df['00060_discharge from primary sensor'].values[df['00060_discharge from primary sensor'].values>-99]/35.3147
-        #                 T=df.index.values[df['00060_discharge from primary sensor'].values>-99]
-        #                 try:
-        #                     F=df['00065_cd'].values[df['00060_discharge from primary sensor'].values>-99]
-        #                 except:
-        #                     F=df['00060_discharge from primary sensor_cd'].values[df['00060_discharge from primary sensor'].values>-99]
-        #                 print('successful pull...')
-        #             except Exception as e:
-        #                 # print('setting to nans')
-        #                 # print(e)
-        #                 T=np.nan
-        #                 Q=np.nan
-        #                 F=np.nan
-        #                 print('pull failed', e)
-        
-        if type(F) != float:
-            if len(F)>1:
-                newF=[]
-                for flag in F:
-
-                    if str(flag)=='nan' or 'Ice' in flag:
-                        newF.append(False)
-                    else:
-                        newF.append(True)
-
-                T=T[newF]
-                Q=Q[newF]
-                newF = 0
-
-
-        F = 0
+        Parameter
+        ---------
+        site: str
+            Site identifier
+        """
 
+        if self.resolution == 'iv':
+            try:
+                df = self.nwis_record(site, 'iv')
+            except Exception as e:
+                print('nwis search failed...', e, site)
+                df = pd.DataFrame()
+            if len(df) == 0:
+                df = self.nwis_record(site, 'dv')
+            dfnew, _ = self.daily_record(df, site)
+            return (dfnew if dfnew is not None else pd.DataFrame(), site)
 
-        UTCord=[]
-        if type(T) != float:
-            # print('Here is t', T)
-            # print('here if q',Q )
-            # types = [type(i) for i in T]
-            # print('here are types', list(set(types)))
-            T = [str(i) for i in T]
-            for tt in T:
-                ttt=datetime.strptime(tt[0:10],'%Y-%m-%d')  
-                utc=ttt+timedelta(hours=int(T[0][-6:-3]))
-                UTCord.append(utc.toordinal())
+        try:
+            df = self.nwis_record(site, 'dv')
+        except Exception as e:
+            print('nwis dv search failed...', e, site)
+            df = pd.DataFrame()
+        dv_daily, approved_end = self.daily_record(df, site) if len(df) > 0 else (None, None)
 
-        uUTCord=np.unique(UTCord)
-        OUTt=[]
-        OUTq=[]
-        for Ta in uUTCord:
-            OUTt.append(Ta)
-            NOWd=np.where(UTCord==Ta)[0]
-            OUTq.append(np.nanmean(Q[NOWd]))
+        # Recent window not covered by approved daily values
+        if approved_end is not None:
+            iv_start = date.fromordinal(int(approved_end) + 1).strftime('%Y-%m-%d')
+        else:
+            iv_start = self.start_date
+        iv_daily = None
+        if approved_end is None or iv_start <= self.end_date:
+            try:
+                df = self.nwis_record(site, 'iv', start_date=iv_start)
+                if len(df) > 0: iv_daily, _ = self.daily_record(df, site)
+            except Exception as e:
+                print('nwis iv search failed...', e, site)
 
         # dump variables for memor
         df = 0
 
-        dfnew=pd.DataFrame()
-        dfnew.index=OUTt
-        dfnew['00060_Mean']=OUTq    
-        # print('Successfull pull...')    
+        if iv_daily is not None and approved_end is not None:
+            iv_daily = iv_daily[iv_daily.index > approved_end]
+        if dv_daily is None and iv_daily is None:
+            return (pd.DataFrame(), site)
+        if dv_daily is None:
+            return (iv_daily, site)
+        if iv_daily is None:
+            return (dv_daily, site)
+        dfnew = pd.concat([dv_daily[~dv_daily.index.isin(iv_daily.index)], iv_daily]).sort_index()
         return (dfnew, site)
         # return nwis.get_record(sites=site, service='dv', start= self.start_date, end= self.end_date)
     def split(self, list_a, chunk_size):
@@ -431,6 +453,31 @@ class USGSPull:
 
 
 
+    def column_patch(self, row, T, Q, ALLt):
+        """Return day columns and values of a gauge record for an in-place merge.
+
+        Parameters
+        ----------
+        row: int
+            Row of gauge in the USGS group
+        T: DatetimeIndex
+            Days of discharge values
+        Q: array
+            Daily discharge values
+        ALLt: DatetimeIndex
+            Days of the num_days dimension
+
+        Returns
+        -------
+        tuple of row, column indexes, discharge and day ordinals for the days
+        of the record that fall on the num_days dimension
+        """
+
+        ordinals = T.values.astype('datetime64[D]').astype(np.int64) + date(1970, 1, 1).toordinal()
+        columns = ordinals - ALLt[0].toordinal()
+        keep = (columns >= 0) & (columns < len(ALLt))
+        return (row, columns[keep], np.asarray(Q, dtype=np.float64)[keep], ordinals[keep].astype(np.float64))
+
     async def gather_records(self, sites):
         """Creates and returns a list of dataframes for each NWIS record.
         
@@ -466,55 +513,9 @@ class USGSPull:
         ALLt=pd.date_range(start='1980-1-1',end=self.end_date)
         gage_read = USGSRead(self.usgs_targets)
 
-        # this pulls all the gauges in the targets
-        dataUSGS, reachID, USGScal = gage_read.read()
-
-
-        current_parsed_agency_ids = []
-        # we want to match those up with the one in the non historical sos
-        sos = Dataset(Path(self.sos_file))
-
-        agency_ids_from_sos =  list(sos['USGS']['USGS_id'][:])
-        sos.close()
-
-        # print('sos ids')
-        # print(agency_ids_from_sos[0])
-        # print('the above should match the below, if not parse it')
-        # print(dataUSGS[0])
-
-        for x in agency_ids_from_sos:
-            single_id = []
-            for i in x:
-                try:
-                    single_id.append(i.decode('UTF-8'))
-                except:
-                    print('didnt parse')
-                    print(x)
-
-                    pass
-
-            # print(single_id)
-            single_id = ''.join(single_id)
-            # print(single_id)
-            current_parsed_agency_ids.append(single_id)
-
-        # print('these should be 1413')
-        # print('current_parsed_agency_ids')
-        # print(current_parsed_agency_ids)
-        # print('datausgs')
-        # print(dataUSGS)
-
-        # raise ValueError
-        cnt = 0
-        for i in range(len(dataUSGS)):
-                if dataUSGS[i] in current_parsed_agency_ids:
-                    cnt += 1
-        # raise ValueError
-
-
-
-
-        dataUSGS, reachID, USGScal = gage_read.read(current_agency_ids=current_parsed_agency_ids)
+        # only pull the gauges that are in the non historical sos
+        sos_ids = TargetIndex(self.sos_file, ["USGS"])
+        dataUSGS, reachID, USGScal = gage_read.read(current_agency_ids=sos_ids["USGS"])
 
         
         # Download records and gather a list of dataframes
@@ -532,28 +533,6 @@ class USGSPull:
 
         # Bring in previously downloaded gauge data and merge with new data
         sos = Dataset(self.sos_file, 'a')
-        usgs_qt = sos['USGS']['USGS_qt']
-        
-        
-        
-        
-        
-        # Flatten the array to 1D
-        flattened_array = usgs_qt[:].flatten()
-
-        # Filter out non-positive values (i.e., values <= 0)
-        positive_values = flattened_array[flattened_array > 0]
-
-        # Find the minimum value from the positive values
-        if positive_values.size > 0:  # Ensure there are positive values in the array
-            historic_min = positive_values.min()
-            historic_max = positive_values.max()
-            historic_date_range = [historic_min, historic_max]
-            
-            # print('datecheck historic min date', historic_min)
-            # print('datecheck historic max date', historic_max)
-        else:
-            print("No values greater than 0 found in the array.")
             
         # # date_list = [days_convert(i) if i!=-999999999999.0 else i for i in usgs_qt[0].data]
         # historic_date_list = usgs_qt[0].data
@@ -629,11 +608,17 @@ class USGSPull:
         TwoYr=np.full((len(dataUSGS)), EMPTY)
         TwoYr = self.old_data_fill(TwoYr, sos, "USGS_two_year_return_q")
 
-        Twrite=np.full((len(dataUSGS),len(ALLt)), EMPTY)
-        Twrite = self.old_data_fill(Twrite, sos, "USGS_qt")
+        # In-place merges only keep the new day columns of each gauge; the
+        # existing history stays in the SoS and is never read into memory
+        if self.merge == 'inplace':
+            Qpatch = []
+        else:
+            Twrite=np.full((len(dataUSGS),len(ALLt)), EMPTY)
+            Twrite = self.old_data_fill(Twrite, sos, "USGS_qt")
 
-        Qwrite=np.full((len(dataUSGS),len(ALLt)), EMPTY)
-        Qwrite = self.old_data_fill(Qwrite, sos, "USGS_q")
+            Qwrite=np.full((len(dataUSGS),len(ALLt)), EMPTY)
+            Qwrite = self.old_data_fill(Qwrite, sos, "USGS_q")
+        sos.close()
 
 
         # Extract data from NWIS dataframe records
@@ -687,30 +672,33 @@ class USGSPull:
                     moy=T.month
                     yyyy=T.year
                     moy=moy.to_numpy()      
-                    thisT=np.zeros(len(T))
-                    for j in range((len(T))):
-                        try:
-                            # formatted_date1 = parsed_date1.strftime('%Y-%m-%d %H:%M:%S')
-                            # formatted_date2 = parsed_date2.strftime('%Y-%m-%d %H:%M:%S')
-                            # thisT=np.where(ALLt==np.datetime64(T[j]))
-                            thisT=np.where(ALLt==T[j])
-                            if len(thisT) == 0:
-                                raise ValueError('Could not find time', T[j], 'in allt', Allt[0])
-                            # print('here is where we are looking', T[j],type(T[j]), ALLt[0], type(ALLt[0]))
-                            # print('this is the index that we are looking for ', thisT)
-                            # print('6', thisT[0])
-                            Qwrite[i,thisT]=Q[j]
-                            # print('adding this avlue to qwrite', Q[j])
-                            # print('this should be the same values', Qwrite[i,thisT])
-                            Twrite[i,thisT]=date.toordinal(T[j])
-                            # print(T[j], 'could be converted')
-                        except Exception as e:
-                            print('fail here', e)
-                            # if it couldn't be converted it was a nan, the Q still gets written with a nan date just as it was in the original dataframe
-                            # would be a good idea to check and be sure date is nan in sos if it didn't work
-                            # print(T[j], 'couldnt be converted')
-                            pass
-                        # print('7', Twrite[i,thisT])
+                    if self.merge == 'inplace':
+                        Qpatch.append(self.column_patch(i, T, Q, ALLt))
+                    else:
+                        thisT=np.zeros(len(T))
+                        for j in range((len(T))):
+                            try:
+                                # formatted_date1 = parsed_date1.strftime('%Y-%m-%d %H:%M:%S')
+                                # formatted_date2 = parsed_date2.strftime('%Y-%m-%d %H:%M:%S')
+                                # thisT=np.where(ALLt==np.datetime64(T[j]))
+                                thisT=np.where(ALLt==T[j])
+                                if len(thisT) == 0:
+                                    raise ValueError('Could not find time', T[j], 'in allt', Allt[0])
+                                # print('here is where we are looking', T[j],type(T[j]), ALLt[0], type(ALLt[0]))
+                                # print('this is the index that we are looking for ', thisT)
+                                # print('6', thisT[0])
+                                Qwrite[i,thisT]=Q[j]
+                                # print('adding this avlue to qwrite', Q[j])
+                                # print('this should be the same values', Qwrite[i,thisT])
+                                Twrite[i,thisT]=date.toordinal(T[j])
+                                # print(T[j], 'could be converted')
+                            except Exception as e:
+                                print('fail here', e)
+                                # if it couldn't be converted it was a nan, the Q still gets written with a nan date just as it was in the original dataframe
+                                # would be a good idea to check and be sure date is nan in sos if it didn't work
+                                # print(T[j], 'couldnt be converted')
+                                pass
+                            # print('7', Twrite[i,thisT])
                     # with df pulled in run some stats
                     #basic stats
                     # all_types = list(set([type(i) for i in Q]))
@@ -760,14 +748,11 @@ class USGSPull:
 
         Mt=list(range(1,13))
         P=list(range(1,99,5))
-        print('here is qwrite', Qwrite)
 
         self.usgs_dict = {
             "dataUSGS": dataUSGS,
             "reachId": reachID,
             "USGScal": USGScal,
-            "Qwrite": Qwrite,
-            "Twrite": Twrite,
             "Qmean": Qmean,
             "Qmax": Qmax,
             "Qmin": Qmin,
@@ -777,3 +762,9 @@ class USGSPull:
             "FDQS": FDQS,
             "TwoYr": TwoYr
         }
+        if self.merge == 'inplace':
+            self.usgs_dict["Qpatch"] = Qpatch
+            self.usgs_dict["days"] = len(ALLt)
+        else:
+            self.usgs_dict["Qwrite"] = Qwrite
+            self.usgs_dict["Twrite"] = Twrite
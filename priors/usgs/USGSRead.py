@@ -1,8 +1,10 @@
 # Third-party imports
-from netCDF4 import Dataset, chartostring
 import numpy as np
 import pandas as pd
 
+# Local imports
+from priors.targets.TargetIndex import filter_ids, read_targets
+
 class USGSRead:
     """Class that reads in USGS site data needed to download NWIS records.
     
@@ -62,38 +64,16 @@ class USGSRead:
         Mask=pd.array(list(M.values()),dtype="boolean")
         return Mask
 
-    def read(self, current_agency_ids =[]):
-        """Read USGS data."""
-       
-        ncf = Dataset(self.usgs_targets)
-        # USGS STAID ID
-
-        # stuff commented here worked before
-        # dataUSGS = chartostring(ncf["StationID"][:].filled(np.nan))
-        dataUSGS = ncf["StationID"][:]
-        dataUSGS = [''.join(i) for i in dataUSGS]
-        # dataUSGS = [ el.strip(' ') for el in dataUSGS ]
-
-        # SWORD Reach ID
-        # reachID = chartostring(ncf["Reach_ID"][:].filled(np.nan))
-        reachID = ncf["Reach_ID"][:]
-        # calibration flag
-        # USGScal=ncf["CAL"][:].filled(np.nan)
-        USGScal=ncf["CAL"][:]
-
-
-        if len(current_agency_ids)!= 0:
-            print('second time through')
-            mock_dataUSGS = []
-            mock_reachID = []
-            mock_USGScal = []
-            for i in range(len(dataUSGS)):
-                if dataUSGS[i] in current_agency_ids:
-                    mock_dataUSGS.append(dataUSGS[i])
-                    mock_reachID.append(reachID[i])
-                    mock_USGScal.append(USGScal[i])
-            return mock_dataUSGS, mock_reachID, mock_USGScal
+    def read(self, current_agency_ids=None):
+        """Read USGS data.
 
+        Parameters
+        ----------
+        current_agency_ids: set
+            USGS identifiers stored in the SoS; when not empty only
+            matching gauges are returned
+        """
 
+        agency_ids = filter_ids(current_agency_ids)
+        dataUSGS, reachID, USGScal = read_targets(self.usgs_targets, agency_ids)
         return dataUSGS, reachID, USGScal
-
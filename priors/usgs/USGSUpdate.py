@@ -3,9 +3,13 @@ from datetime import datetime
 from pathlib import Path
 
 # Third-party imports
-from netCDF4 import Dataset, stringtochar
+from netCDF4 import Dataset
 import numpy as np
 
+# Local imports
+from priors.sos.AttributePlan import apply_atts
+from priors.sos.WritePlan import RowView, WritePlan, char_array, write_columns
+
 class USGSUpdate:
     """Class that updates USGS gage data in the SoS.
     
@@ -34,6 +38,8 @@ class USGSUpdate:
         Reads in the SoS data and stores it in a dict organized by continent
     update_data()
         Updates data in the SoS
+    write_patches(usgs)
+        Writes new day columns of each gauge to the SoS
     """
 
     FLOAT_FILL = -999999999999
@@ -71,7 +77,15 @@ class USGSUpdate:
             self.map_dict = None
         else:
             # Map USGS data that matches SoS reach identifiers
-            self.map_dict["days"] = np.array(range(1, len(self.usgs_dict["Qwrite"][0]) + 1))
+            if "Qpatch" in self.usgs_dict:
+                self.map_dict["days"] = np.array(range(1, self.usgs_dict["days"] + 1))
+                rows = {gauge: row for row, gauge in enumerate(indexes)}
+                self.map_dict["usgs_patch"] = [(rows[gauge], columns, q, qt)
+                                               for gauge, columns, q, qt in self.usgs_dict["Qpatch"] if gauge in rows]
+            else:
+                self.map_dict["days"] = np.array(range(1, len(self.usgs_dict["Qwrite"][0]) + 1))
+                self.map_dict["usgs_q"] = RowView(self.usgs_dict["Qwrite"], indexes)
+                self.map_dict["usgs_qt"] = RowView(self.usgs_dict["Twrite"], indexes)
             self.map_dict["usgs_reach_id"] = np.array(self.usgs_dict["reachId"]).astype(np.int64)[indexes]
             self.map_dict["fdq"] = self.usgs_dict["FDQS"][indexes,:]
             self.map_dict["max_q"] =self.usgs_dict["Qmax"][indexes]
@@ -80,9 +94,6 @@ class USGSUpdate:
             self.map_dict["min_q"] = self.usgs_dict["Qmin"][indexes]
             self.map_dict["tyr"] = self.usgs_dict["TwoYr"][indexes]
             self.map_dict["usgs_id"] = np.array(self.usgs_dict["dataUSGS"])[indexes]
-            print('here is what is getting saved into the map dict', self.usgs_dict["Qwrite"][indexes,:])
-            self.map_dict["usgs_q"] = self.usgs_dict["Qwrite"][indexes,:]
-            self.map_dict["usgs_qt"] = self.usgs_dict["Twrite"][indexes,:]
     
     def read_sos(self):
         """Reads in data from the SoS and stores in sos_reaches attribute."""
@@ -108,69 +119,74 @@ class USGSUpdate:
             sos.production_date = datetime.now().strftime('%d-%b-%Y %H:%M:%S')
 
             usgs = sos["USGS"]
-            
-            self.set_variable_atts(usgs["USGS_reaches"], self.variable_atts["USGS_reaches"])
-            self.set_variable_atts(usgs["CAL"], self.variable_atts["CAL"])
-            
-            usgs["num_days"][:] = self.map_dict["days"]     
-            self.set_variable_atts(usgs["num_days"], self.variable_atts["num_days"])
-            print('here are adys', self.map_dict["days"])
 
             # this variable is not in the SOS
             # usgs["num_usgs_reaches"][:] = range(1, self.map_dict["usgs_reach_id"].shape[0] + 1)
 
-            # print(self.map_dict["usgs_reach_id"])
-            # print(usgs["usgs_reach_id"][:])
-            # print(self.map_dict["usgs_reach_id"].shape)
-            # print(usgs["usgs_reach_id"][:].shape)
-
-            usgs["USGS_reach_id"][:] = self.map_dict["usgs_reach_id"]
-            self.set_variable_atts(usgs["USGS_reach_id"], self.variable_atts["USGS_reach_id"])
-            
-            usgs["USGS_flow_duration_q"][:] = np.nan_to_num(self.map_dict["fdq"], copy=True, nan=self.FLOAT_FILL)
-            self.set_variable_atts(usgs["USGS_flow_duration_q"], self.variable_atts["USGS_flow_duration_q"])
-            
-            usgs["USGS_max_q"][:] = np.nan_to_num(self.map_dict["max_q"], copy=True, nan=self.FLOAT_FILL)
-            self.set_variable_atts(usgs["USGS_max_q"], self.variable_atts["USGS_max_q"])
-            
-            usgs["USGS_monthly_q"][:] = np.nan_to_num(self.map_dict["monthly_q"], copy=True, nan=self.FLOAT_FILL)
-            self.set_variable_atts(usgs["USGS_monthly_q"], self.variable_atts["USGS_monthly_q"])
-            
-            usgs["USGS_mean_q"][:] = np.nan_to_num(self.map_dict["mean_q"], copy=True, nan=self.FLOAT_FILL)
-            self.set_variable_atts(usgs["USGS_mean_q"], self.variable_atts["USGS_mean_q"])
-            
-            usgs["USGS_min_q"][:] = np.nan_to_num(self.map_dict["min_q"], copy=True, nan=self.FLOAT_FILL)
-            self.set_variable_atts(usgs["USGS_min_q"], self.variable_atts["USGS_min_q"])
-            
-            usgs["USGS_two_year_return_q"][:] = np.nan_to_num(self.map_dict["tyr"], copy=True, nan=self.FLOAT_FILL)
-            self.set_variable_atts(usgs["USGS_two_year_return_q"], self.variable_atts["USGS_two_year_return_q"])
+            plan = WritePlan(usgs)
+            plan.add("USGS_reaches", atts=self.variable_atts["USGS_reaches"])
+            plan.add("CAL", atts=self.variable_atts["CAL"])
+            plan.add("num_days", self.map_dict["days"], self.variable_atts["num_days"])
+            plan.add("USGS_reach_id", self.map_dict["usgs_reach_id"], self.variable_atts["USGS_reach_id"])
+            plan.add("USGS_flow_duration_q", self.map_dict["fdq"], self.variable_atts["USGS_flow_duration_q"], self.FLOAT_FILL)
+            plan.add("USGS_max_q", self.map_dict["max_q"], self.variable_atts["USGS_max_q"], self.FLOAT_FILL)
+            plan.add("USGS_monthly_q", self.map_dict["monthly_q"], self.variable_atts["USGS_monthly_q"], self.FLOAT_FILL)
+            plan.add("USGS_mean_q", self.map_dict["mean_q"], self.variable_atts["USGS_mean_q"], self.FLOAT_FILL)
+            plan.add("USGS_min_q", self.map_dict["min_q"], self.variable_atts["USGS_min_q"], self.FLOAT_FILL)
+            plan.add("USGS_two_year_return_q", self.map_dict["tyr"], self.variable_atts["USGS_two_year_return_q"], self.FLOAT_FILL)
+            plan.add("USGS_id", char_array(self.map_dict["usgs_id"], 100), self.variable_atts["USGS_id"])
+            if "usgs_patch" in self.map_dict:
+                plan.add("USGS_q", atts=self.variable_atts["USGS_q"])
+                plan.add("USGS_qt", atts=self.variable_atts["USGS_qt"])
+                self.write_patches(usgs)
+            else:
+                plan.add("USGS_q", self.map_dict["usgs_q"], self.variable_atts["USGS_q"], self.FLOAT_FILL)
+                plan.add("USGS_qt", self.map_dict["usgs_qt"], self.variable_atts["USGS_qt"], self.FLOAT_FILL)
+            plan.write()
 
-            # print(self.map_dict["usgs_id"])
-            # print(usgs["usgs_id"][:])
-            # print(self.map_dict["usgs_id"].shape)
-            # print(usgs["usgs_id"][:].shape)
-            
-            usgs["USGS_id"][:] = stringtochar(self.map_dict["usgs_id"].astype("S100"))
-            self.set_variable_atts(usgs["USGS_id"], self.variable_atts["USGS_id"])            
-            print('here is q that is going out', self.map_dict["usgs_q"])
-            
-            # q_fix = []
-            # for i in self.map_dict["usgs_q"]:
-            #     if any(i):
-            #         q_fix.append(i)
-                    
-            usgs["USGS_q"][:] = np.nan_to_num(self.map_dict["usgs_q"], copy=True, nan=self.FLOAT_FILL)
-            # usgs["USGS_q"][:] = np.nan_to_num(q_fix, copy=True, nan=self.FLOAT_FILL)
-
-            self.set_variable_atts(usgs["USGS_q"], self.variable_atts["USGS_q"])
-            
-            usgs["USGS_qt"][:] = np.nan_to_num(self.map_dict["usgs_qt"], copy=True, nan=self.FLOAT_FILL)
-            self.set_variable_atts(usgs["USGS_qt"], self.variable_atts["USGS_qt"])
-                
             sos.close()
             
+    def write_patches(self, usgs):
+        """Writes new day columns of each gauge to the SoS.
+
+        Used for in-place merges: only the columns touched by new data are
+        written to USGS_q and USGS_qt. Days added since the previous version
+        are first written as fill values so both variables extend to the
+        num_days dimension before it grows. The first and last day ordinal of
+        each gauge are then read back one block of rows at a time and stored
+        as a (gauges x 2) usgs_qt array in map_dict.
+
+        Parameters
+        ----------
+        usgs: netCDF4.Group
+            USGS group of the SoS
+        """
+
+        # Both variables share num_days so its size is read before either grows
+        rows, existing = usgs["USGS_q"].shape
+        rows = max(rows, self.map_dict["usgs_reach_id"].size)
+        days = self.map_dict["days"].size
+        if existing < days:
+            for name in ("USGS_q", "USGS_qt"):
+                usgs[name][:rows, existing:days] = np.full((rows, days - existing), self.FLOAT_FILL, dtype=np.float64)
+
+        for row, columns, q, qt in self.map_dict["usgs_patch"]:
+            write_columns(usgs["USGS_q"], row, columns, q, self.FLOAT_FILL)
+            write_columns(usgs["USGS_qt"], row, columns, qt, self.FLOAT_FILL)
+
+        rows = np.arange(self.map_dict["usgs_reach_id"].size)
+        qt_range = np.full((rows.size, 2), np.nan)
+        start = 0
+        for block in RowView(usgs["USGS_qt"], rows).blocks():
+            block = np.ma.filled(np.ma.asarray(block, dtype=np.float64), np.nan)
+            valid = block > 0
+            qt_range[start:start + block.shape[0], 0] = np.min(block, axis=1, where=valid, initial=np.inf)
+            qt_range[start:start + block.shape[0], 1] = np.max(block, axis=1, where=valid, initial=-np.inf)
+            start += block.shape[0]
+        qt_range[~np.isfinite(qt_range)] = np.nan
+        self.map_dict["usgs_qt"] = qt_range
+
     def set_variable_atts(self, variable, variable_dict):
-        """Set the variable attribute metdata."""
+        """Set the variable attribute metdata that differs from the current values."""
         
-        for name, value in variable_dict.items():
-            setattr(variable, name, value)
\ No newline at end of file
+        apply_atts(variable, variable_dict)
\ No newline at end of file
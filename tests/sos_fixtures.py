@@ -0,0 +1,140 @@
+"""Factories for the synthetic SoS files used by the tests.
+
+Files follow the SoS layout: num_reaches and num_nodes are root dimensions,
+gauge groups hold a num_{agency}_reaches dimension with {agency}_reach_id,
+{agency}_id and CAL variables, and 2-D variables share num_days unless they
+are flow duration (probability) or monthly (num_months) priors.
+
+Functions
+---------
+add_gauges(sos, path, reach_ids, ids, cal, variables, unlimited_days, nchars, **kwargs)
+    Create gauge group at path with identifiers and variables
+add_model(sos, variables, **kwargs)
+    Create model group with one value (or row) per reach for each variable
+create_sos(sos_file, reach_ids, node_reach_ids, version, river_names)
+    Create SoS file with reaches and nodes groups and return it open
+to_chars(ids, nchars)
+    Return 2-D character array of identifiers padded with null bytes
+"""
+
+# Third-party imports
+from netCDF4 import Dataset
+import numpy as np
+
+FLOAT_FILL = -999999999999
+COLUMN_DIMS = {"flow_duration_q": ("probability", 20), "monthly_q": ("num_months", 12)}
+
+def to_chars(ids, nchars=8):
+    """Return 2-D character array of identifiers padded with null bytes."""
+
+    return np.array([list(i.ljust(nchars, "\0")) for i in ids], dtype="S1").reshape(len(ids), nchars)
+
+def create_sos(sos_file, reach_ids, node_reach_ids=None, version=None, river_names=None):
+    """Create SoS file with reaches and nodes groups and return it open.
+
+    Parameters
+    ----------
+    sos_file: Path
+        path to SoS file to write
+    reach_ids: list
+        reach identifiers of the reaches group
+    node_reach_ids: list
+        reach identifiers of the nodes group (no nodes group if None)
+    version: str
+        product_version global attribute (not set if None)
+    river_names: list
+        river_name of each reach (not written if None)
+
+    Returns
+    -------
+    netCDF4.Dataset open for writing
+    """
+
+    sos = Dataset(sos_file, 'w')
+    if version is not None: sos.product_version = version
+    sos.createDimension("num_reaches", len(reach_ids))
+    reaches = sos.createGroup("reaches")
+    reaches.createVariable("reach_id", "i8", ("num_reaches",))[:] = reach_ids
+    if river_names is not None:
+        reaches.createVariable("river_name", str, ("num_reaches",))[:] = np.array(river_names, dtype=object)
+    if node_reach_ids is not None:
+        sos.createDimension("num_nodes", len(node_reach_ids))
+        sos.createGroup("nodes").createVariable("reach_id", "i8", ("num_nodes",))[:] = node_reach_ids
+    return sos
+
+def add_model(sos, variables, **kwargs):
+    """Create model group with one value (or row) per reach for each variable.
+
+    Parameters
+    ----------
+    sos: netCDF4.Dataset
+        open SoS dataset
+    variables: dict
+        dictionary of variable name to reach data
+    kwargs: dict
+        createVariable keyword arguments of every variable (e.g. fill_value)
+    """
+
+    model = sos.createGroup("model")
+    _add_variables(model, "num_reaches", variables, False, **kwargs)
+    return model
+
+def add_gauges(sos, path, reach_ids=None, ids=None, cal=None, variables=None, unlimited_days=False,
+               nchars=None, **kwargs):
+    """Create gauge group at path with identifiers and variables.
+
+    Parameters
+    ----------
+    sos: netCDF4.Dataset
+        open SoS dataset
+    path: str
+        path of gauge group (e.g. 'USGS' or 'historicQ/grdc')
+    reach_ids: list
+        reach identifier of each gauge ({agency}_reach_id not written if None)
+    ids: list
+        gauge identifiers ({agency}_id not written if None)
+    cal: list
+        CAL flag of each gauge (not written if None)
+    variables: dict
+        dictionary of variable name to gauge data (gauge rows first)
+    unlimited_days: bool
+        indicate if num_days is an unlimited dimension
+    nchars: int
+        length of gauge identifiers (longest identifier if None)
+    kwargs: dict
+        createVariable keyword arguments of every variable in variables
+    """
+
+    group = sos
+    for name in path.split("/"):
+        group = group[name] if name in group.groups else group.createGroup(name)
+    agency = path.rsplit("/", 1)[-1]
+    variables = variables or {}
+    size = next(len(data) for data in (reach_ids, ids, cal, *variables.values()) if data is not None)
+
+    dim = f"num_{agency}_reaches"
+    group.createDimension(dim, size)
+    if reach_ids is not None:
+        group.createVariable(f"{agency}_reach_id", "i8", (dim,))[:] = reach_ids
+    if ids is not None:
+        nchars = nchars if nchars else max([1] + [len(i) for i in ids])
+        group.createDimension("nchars", nchars)
+        group.createVariable(f"{agency}_id", "S1", (dim, "nchars"))[:] = to_chars(ids, nchars)
+    if cal is not None:
+        group.createVariable("CAL", "i4", (dim,))[:] = cal
+    _add_variables(group, dim, variables, unlimited_days, **kwargs)
+    return group
+
+def _add_variables(group, dim, variables, unlimited_days, **kwargs):
+    """Create and write variables whose first dimension is dim."""
+
+    for name, data in variables.items():
+        data = np.asarray(data)
+        dims = (dim,)
+        if data.ndim == 2:
+            column_dim, size = next((value for suffix, value in COLUMN_DIMS.items() if name.endswith(suffix)),
+                                    ("num_days", data.shape[1]))
+            if column_dim not in group.dimensions:
+                group.createDimension(column_dim, None if column_dim == "num_days" and unlimited_days else size)
+            dims += (column_dim,)
+        group.createVariable(name, data.dtype, dims, **kwargs)[:] = data
@@ -0,0 +1,60 @@
+# Standard imports
+import json
+from pathlib import Path
+import unittest
+
+# Third-party imports
+import numpy as np
+from numpy.testing import assert_array_equal
+
+# Local imports
+from priors.sos.AgencyRegistry import AgencyRegistry, select_gauges
+
+class test_AgencyRegistry(unittest.TestCase):
+    """Test AgencyRegistry operations."""
+
+    METADATA_JSON = Path(__file__).parent.parent / "metadata" / "metadata.json"
+
+    def test_passes(self):
+        """Test overwrite passes of continents follow agency order."""
+
+        with open(self.METADATA_JSON) as jf:
+            metadata_json = json.load(jf)
+
+        na = AgencyRegistry(metadata_json, "na")
+        self.assertEqual([("historicQ/grdc", "grdc", False), ("historicQ/USGS", "USGS", False),
+                          ("USGS", "USGS", True), ("historicQ/WSC", "WSC", False), ("WSC", "WSC", True)],
+                         na.passes)
+        self.assertEqual(["historicQ/grdc", "DEFRA", "historicQ/EAU", "EAU"], AgencyRegistry(metadata_json, "eu").groups())
+        self.assertEqual(["historicQ/grdc", "historicQ/Hidroweb", "Hidroweb", "historicQ/DGA"],
+                         AgencyRegistry(metadata_json, "sa").groups())
+        self.assertEqual(["historicQ/grdc"], AgencyRegistry(metadata_json, "af").groups())
+
+        metadata_json["global_attributes_extra"]["agency_overwrite"]["groups"]["DWA"] = {"historic": None, "nrt": "DWA"}
+        af = AgencyRegistry(metadata_json, "af")
+        self.assertEqual([("historicQ/grdc", "grdc", False), ("DWA", "DWA", True)], af.passes)
+        self.assertEqual((1, 0), (af.calibration_cal, af.validation_cal))
+
+    def test_select_gauges(self):
+        """Test closest mean gauge is selected and invalid reaches are flagged."""
+
+        gauge_reach = np.array([2, 0, 2, -1, 1, 2])
+        gauge = {
+            "mean_q": np.ma.array([10., 5., 30., 1., 7., 30.]),
+            "monthly_q": np.ma.array(np.ones((6, 12)))
+        }
+        gauge["monthly_q"][4, 3] = -1.
+        gauge["monthly_q"][0, 0] = np.ma.masked
+        model_mean_q = np.ma.array([1., 1., 25.])
+
+        reaches, rows, valid = select_gauges(gauge_reach, np.array([0, 1, 2]), gauge, model_mean_q)
+        assert_array_equal(np.array([0, 1, 2]), reaches)
+        assert_array_equal(np.array([1, 4, 2]), rows)
+        assert_array_equal(np.array([True, False, True]), valid)
+
+        model_mean_q[2] = np.ma.masked
+        _, rows, _ = select_gauges(gauge_reach, np.array([2]), gauge, model_mean_q)
+        assert_array_equal(np.array([0]), rows)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+# Standard imports
+from pathlib import Path
+import tempfile
+import unittest
+
+# Third-party imports
+from netCDF4 import Dataset
+
+# Local imports
+from priors.sos.AttributePlan import AttributePlan, apply_atts
+
+class test_AttributePlan(unittest.TestCase):
+    """Test AttributePlan operations."""
+
+    METADATA = {
+        "global_attributes": {"title": "SoS"},
+        "model_constrained": {"mean_q": {"long_name": "mean", "valid_min": 0}},
+        "gbpriors": {"reach": {"logA0_hat": {"units": "m^2"}}},
+        "USGS": {"USGS_q": {"long_name": "discharge", "valid_range": [0, 10]}}
+    }
+
+    def test_compile(self):
+        """Test variable attribute sections are compiled by path."""
+
+        plan = AttributePlan(self.METADATA)
+        self.assertEqual(["model_constrained", "gbpriors/reach", "USGS"], list(plan.sections))
+        self.assertEqual({"units": "m^2"}, plan["gbpriors/reach"]["logA0_hat"])
+        self.assertEqual({}, plan.atts("USGS", "USGS_qt"))
+        self.assertNotIn("global_attributes", plan)
+
+    def test_apply(self):
+        """Test only attributes that differ from current values are written."""
+
+        plan = AttributePlan(self.METADATA)
+        with tempfile.TemporaryDirectory() as tmp:
+            with Dataset(Path(tmp) / "sos.nc", 'w') as sos:
+                usgs = sos.createGroup("USGS")
+                usgs.createDimension("num_USGS_reaches", 2)
+                q = usgs.createVariable("USGS_q", "f8", ("num_USGS_reaches",))
+
+                self.assertEqual(1, plan.apply_group(usgs, "USGS"))
+                self.assertEqual(0, plan.apply_group(usgs, "USGS"))
+                self.assertEqual(0, apply_atts(q, {}))
+                self.assertEqual(1, apply_atts(q, {"long_name": "discharge", "valid_range": [0., 10.]}))
+                self.assertEqual(1, apply_atts(q, {"valid_range": [0., 20.]}))
+                self.assertEqual("discharge", q.long_name)
+                self.assertEqual([0., 20.], q.valid_range.tolist())
+                with self.assertRaises(KeyError):
+                    plan.apply_group(usgs, "WSC")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,7 @@
 # Standard imports
 from pathlib import Path
 from shutil import copyfile, rmtree
+import tempfile
 import unittest
 
 # Third-party imports
@@ -9,7 +10,7 @@ import numpy as np
 from numpy.testing import assert_almost_equal, assert_array_equal
 
 # Local imports
-from priors.grdc.GRDC import GRDC
+from priors.grdc.GRDC import GRDC, read_columns, select_columns
 
 class test_GRDC(unittest.TestCase):
     """Test GRDC class methods."""
@@ -18,6 +19,41 @@ class test_GRDC(unittest.TestCase):
     SOS_FILE = Path(__file__).parent / "sos" / "constrained" / "na_sword_v11_SOS.nc"
     GRDC_FILE = Path(__file__).parent / "grdc" / "GRDC2SWORDout.nc"
 
+    def test_read_columns(self):
+        """Test read_columns reads selected gauge columns in hyperslabs."""
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with Dataset(Path(tmp) / "grdc.nc", 'w') as grdc:
+                grdc.createDimension("Time(days)", 3)
+                grdc.createDimension("num_reaches", 8)
+                var = grdc.createVariable("GRDC_Q", "f4", ("Time(days)", "num_reaches"), fill_value=-9999)
+                var[:] = np.arange(24, dtype=np.float32).reshape(3, 8)
+                var[1, 6] = np.ma.masked
+
+                columns = np.array([0, 1, 6])
+                expected = np.arange(24, dtype=np.float64).reshape(3, 8)[:, columns]
+                expected[1, 2] = np.nan
+                assert_array_equal(expected, read_columns(var, columns, max_gap=2))
+                assert_array_equal(expected, read_columns(var, columns, max_gap=8))
+                self.assertEqual((3, 0), read_columns(var, np.array([], dtype=int)).shape)
+
+    def test_select_columns(self):
+        """Test selected columns transpose to contiguous (gauge, day) arrays."""
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with Dataset(Path(tmp) / "grdc.nc", 'w') as grdc:
+                grdc.createDimension("Time(days)", 3)
+                grdc.createDimension("num_reaches", 4)
+                var = grdc.createVariable("GRDC_Q", "f8", ("Time(days)", "num_reaches"))
+                var[:] = np.arange(12, dtype=np.float64).reshape(3, 4)
+                data = read_columns(var, np.arange(4))
+
+        self.assertTrue(data.T.flags.c_contiguous)
+        self.assertIs(data, select_columns(data, np.arange(4)))
+        selected = select_columns(data, np.array([1, 3]))
+        assert_array_equal(np.arange(12).reshape(3, 4)[:, [1, 3]], selected)
+        self.assertTrue(selected.T.flags.c_contiguous)
+
     def test_read_grdc(self):
         """Test read_grdc method."""
 
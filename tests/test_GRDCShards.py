@@ -0,0 +1,108 @@
+# Standard imports
+import os
+from pathlib import Path
+import tempfile
+import unittest
+
+# Third-party imports
+from netCDF4 import Dataset
+import numpy as np
+from numpy.testing import assert_array_equal
+
+# Local imports
+from priors.grdc.GRDC import GRDC
+from priors.grdc.GRDCShards import create_shards, find_shard, manifest_file, shard_file
+
+def write_grdc(grdc_file):
+    """Write GRDC file with five gauges."""
+
+    with Dataset(grdc_file, 'w') as grdc:
+        grdc.createDimension("Time(days)", 3)
+        grdc.createDimension("num_reaches", 5)
+        grdc.createDimension("num_months", 12)
+        grdc.createDimension("num_fdq", 20)
+        grdc.createVariable("Reach_ID", "i8", ("num_reaches",))[:] = [11, 21, 12, 22, 99]
+        grdc.createVariable("GRDC_id", "i4", ("num_reaches",), fill_value=-999)[:] = [1, 2, 3, 4, 5]
+        for name in ("MaxQ", "MeanQ", "MinQ", "Two_Year_Return"):
+            grdc.createVariable(name, "f4", ("num_reaches",))[:] = [1., 2., 3., 4., 5.]
+        for name, dim in (("Flow_DurationQ", "num_fdq"), ("MonthlyQ", "num_months"),
+                          ("GRDC_Q", "Time(days)"), ("GRDC_Qt", "Time(days)")):
+            variable = grdc.createVariable(name, "f8", (dim, "num_reaches"), fill_value=-9999)
+            variable[:] = np.arange(variable.size, dtype=np.float64).reshape(variable.shape)
+        grdc["GRDC_Q"][1, 2] = np.ma.masked
+
+def write_reaches(reach_file, reach_ids):
+    """Write file with a reaches group of reach identifiers."""
+
+    with Dataset(reach_file, 'w') as reaches:
+        grp = reaches.createGroup("reaches")
+        grp.createDimension("num_reaches", len(reach_ids))
+        grp.createVariable("reach_id", "i8", ("num_reaches",))[:] = reach_ids
+
+class test_GRDCShards(unittest.TestCase):
+    """Test GRDC shard creation and lookup."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.grdc_file = self.dir / "GRDC2SWORDout.nc"
+        write_grdc(self.grdc_file)
+        self.reach_files = {}
+        for continent, reach_ids in (("af", [11, 12, 13]), ("eu", [21, 22])):
+            self.reach_files[continent] = self.dir / f"{continent}_sword_v16.nc"
+            write_reaches(self.reach_files[continent], reach_ids)
+        self.manifest = create_shards(self.grdc_file, self.reach_files, self.dir / "shards", "16")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_create_shards(self):
+        """Test shards hold only the continent's gauges and read like the global file."""
+
+        self.assertEqual(2, self.manifest["shards"]["af"]["gauges"])
+        self.assertTrue(manifest_file(self.dir / "shards", "16").exists())
+
+        sos_file = self.dir / "af_sword_v16_SOS_priors.nc"
+        write_reaches(sos_file, [11, 12, 13])
+        shard = GRDC(sos_file, find_shard(self.dir / "shards", "af", "16"))
+        full = GRDC(sos_file, self.grdc_file)
+        for grdc in (shard, full):
+            grdc.read_sos()
+            grdc.read_grdc()
+        self.assertEqual(3, shard.grdc_dict["dt"])
+        for name in full.grdc_dict:
+            assert_array_equal(full.grdc_dict[name], shard.grdc_dict[name])
+        self.assertTrue(np.isnan(shard.grdc_dict["grdc_q"][1, 1]))
+
+    def test_find_shard(self):
+        """Test only verified shards of the SWORD version are returned."""
+
+        shard = shard_file(self.dir / "shards", "eu", "16")
+        self.assertEqual(shard, find_shard(self.dir / "shards", "eu", "16"))
+        self.assertIsNone(find_shard(self.dir / "shards", "na", "16"))
+        self.assertIsNone(find_shard(self.dir / "shards", "eu", "17"))
+
+        self.assertEqual(shard, find_shard(self.dir / "shards", "eu", "16", self.grdc_file))
+        self.assertEqual(shard, find_shard(self.dir / "shards", "eu", "16", self.dir / "missing.nc"))
+
+        with open(shard, "ab") as outfile:
+            outfile.write(b"\0")
+        self.assertIsNone(find_shard(self.dir / "shards", "eu", "16"))
+
+    def test_find_shard_stale(self):
+        """Test shards are not returned after the global GRDC file changes."""
+
+        shard = shard_file(self.dir / "shards", "eu", "16")
+        source = self.grdc_file.stat()
+        os.utime(self.grdc_file, ns=(source.st_atime_ns, source.st_mtime_ns + 10**9))
+        self.assertIsNone(find_shard(self.dir / "shards", "eu", "16", self.grdc_file))
+        self.assertEqual(shard, find_shard(self.dir / "shards", "eu", "16"))
+
+        create_shards(self.grdc_file, self.reach_files, self.dir / "shards", "16")
+        self.assertEqual(shard, find_shard(self.dir / "shards", "eu", "16", self.grdc_file))
+        with open(self.grdc_file, "ab") as outfile:
+            outfile.write(b"\0")
+        self.assertIsNone(find_shard(self.dir / "shards", "eu", "16", self.grdc_file))
+
+if __name__ == "__main__":
+    unittest.main()
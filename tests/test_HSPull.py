@@ -0,0 +1,142 @@
+# Standard imports
+from datetime import date
+from pathlib import Path
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+from zipfile import ZipFile
+
+# Third-party imports
+import numpy as np
+from numpy.testing import assert_array_equal
+
+# Local imports
+from priors.cache.ResponseCache import ResponseCache
+from priors.HydroShare.HSPull import HSp, group_by_reach, measurement_csvs, read_measurements
+
+class FakeResource:
+    """Resource that writes a zip to the download directory."""
+
+    def __init__(self, resource_id, failures):
+        self.resource_id = resource_id
+        self.failures = failures
+
+    def download(self, save_path):
+        if self.failures.get(self.resource_id, 0) > 0:
+            self.failures[self.resource_id] -= 1
+            raise ConnectionError("download failed")
+        zip_file = Path(save_path) / f"{self.resource_id}.zip"
+        with ZipFile(zip_file, 'w') as z:
+            contents = f"{self.resource_id}/data/contents/"
+            z.writestr(contents + "b.csv", "header\nb")
+            z.writestr(contents + "a.csv", "header\na")
+            z.writestr(contents + "template.csv", "header")
+            z.writestr(contents + "readme.csv", "header")
+            z.writestr(contents + "nested/c.csv", "header")
+            z.writestr(f"{self.resource_id}/data/other.csv", "header")
+        return str(zip_file)
+
+class FakeHydroShare:
+    """HydroShare client that returns fake resources."""
+
+    def __init__(self, failures):
+        self.failures = failures
+
+    def resource(self, resource_id):
+        return FakeResource(resource_id, self.failures)
+
+class test_HSPull(unittest.TestCase):
+    """Test HSp resource downloads."""
+
+    def test_fetch_resources(self):
+        """Test fetch_resources retries, keeps order and skips failed resources."""
+
+        failures = {"r1": 1, "r3": 5}
+        with tempfile.TemporaryDirectory() as tmp, patch("priors.HydroShare.HSPull.time.sleep") as sleep:
+            hs = FakeHydroShare(failures)
+            fetched = HSp(max_workers=2).fetch_resources(hs, ["r1", "r2", "r3"], tmp)
+            self.assertEqual([], list(Path(tmp).iterdir()))
+
+        self.assertEqual(["r1", "r2"], [resource_id for resource_id, _ in fetched])
+        self.assertEqual([("a.csv", "header\na"), ("b.csv", "header\nb")], fetched[0][1])
+        self.assertEqual(0, failures["r1"])
+        self.assertEqual(3, sleep.call_count)
+
+    def test_get_collection(self):
+        """Test get_collection keys the cache on the URL and revalidates every call."""
+
+        url = "https://www.hydroshare.org/resource/abc/"
+        responses = [Mock(status_code=200, content=b"zip", headers={"ETag": '"v1"'}),
+                     Mock(status_code=304, content=b"", headers={})]
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch("priors.cache.ResponseCache.requests.get", side_effect=responses) as get:
+            cache = ResponseCache(tmp)
+            self.assertEqual(b"zip", HSp(cache=cache).get_collection(url))
+            self.assertEqual(b"zip", HSp(cache=cache).get_collection(url))
+            self.assertEqual(2, get.call_count)
+            self.assertEqual({}, get.call_args_list[0].kwargs["headers"])
+            self.assertEqual('"v1"', get.call_args_list[1].kwargs["headers"]["If-None-Match"])
+            self.assertEqual(b"zip", cache.get(cache.key("HydroShare", url, "", ""))[0])
+
+        session = Mock()
+        session.get.return_value = Mock(content=b"zip")
+        self.assertEqual(b"zip", HSp(session=session).get_collection(url))
+        session.get.assert_called_once_with(url)
+
+    def test_measurement_csvs(self):
+        """Test measurement_csvs only reads measurement CSVs of the resource."""
+
+        with tempfile.TemporaryDirectory() as tmp:
+            zip_file = FakeResource("r1", {}).download(tmp)
+            self.assertEqual(["a.csv", "b.csv"], [name for name, _ in measurement_csvs(zip_file, "r1")])
+
+    def test_read_measurements(self):
+        """Test read_measurements converts columns and rejects malformed rows."""
+
+        row = "{rid},7,16,1.5,2.5,{date},{q}" + ",1" * 15
+        text = "\n".join(["header",
+                          row.format(rid=71, date="'03-02-2020'", q="10.5"),
+                          row.format(rid=72, date="03-02-2020", q="nan"),
+                          row.format(rid=73, date="03-02-2020", q=""),
+                          row.format(rid="", date="03-02-2020", q="1"),
+                          row.format(rid=74, date="31-02-2020", q="1"),
+                          row.format(rid=75, date=" 1-12-2020 ", q="abc")])
+        measurements, rejected = read_measurements(text, "reach.csv")
+
+        assert_array_equal(np.array([71, 72]), measurements["Rid"])
+        self.assertEqual(np.int64, measurements["Nid"].dtype)
+        self.assertEqual(np.float32, measurements["x"].dtype)
+        assert_array_equal(np.array([date(2020, 2, 3).toordinal()] * 2), measurements["T"])
+        assert_array_equal(np.array([10.5, np.nan]), measurements["Q"])
+        assert_array_equal(np.array(["reach.csv"] * 2), measurements["Sf"])
+        self.assertEqual([(3, "missing Q"), (4, "missing Rid"), (5, "invalid T"), (6, "invalid Q")], rejected)
+
+        self.assertEqual((None, []), read_measurements("header\n" + row.replace(",16,", ",17,").format(rid=71, date="03-02-2020", q=1)))
+
+    def test_read_measurements_short_columns(self):
+        """Test rows with fewer columns than the fields are rejected and extra columns ignored."""
+
+        row = "{rid},7,16,1.5,2.5,03-02-2020,10.5" + ",1" * 15
+        short = "header\n71,7,16,1.5,2.5,03-02-2020,10.5\n72,7"
+        measurements, rejected = read_measurements(short, "short.csv")
+        self.assertEqual(0, measurements["Rid"].size)
+        self.assertEqual([(1, "missing Qu"), (2, "missing SWORD")], rejected)
+
+        text = "\n".join(["header", row.format(rid=71) + ",extra", "72,7,16"])
+        measurements, rejected = read_measurements(text, "mixed.csv")
+        assert_array_equal(np.array([71]), measurements["Rid"])
+        self.assertEqual([(2, "missing x")], rejected)
+
+    def test_group_by_reach(self):
+        """Test group_by_reach sorts by reach and time keeping file order of equal days."""
+
+        Rid = np.array([72, 71, 72, 71, 72])
+        T = np.array([5, 4, 3, 4, 5])
+        order, reaches, offsets = group_by_reach(Rid, T)
+
+        assert_array_equal(np.array([71, 72]), reaches)
+        assert_array_equal(np.array([0, 2, 5]), offsets)
+        assert_array_equal(np.array([1, 3, 2, 0, 4]), order)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+# Standard imports
+from pathlib import Path
+import tempfile
+import unittest
+
+# Third-party imports
+from netCDF4 import Dataset
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+
+# Local imports
+from priors.height_width_fits.HWF_extract import HWF_extract, fit_batch
+
+def write_swot(swot_file, width, wse):
+    """Write SWOT file with reach width, WSE and time observations."""
+
+    with Dataset(swot_file, 'w') as swot:
+        reach = swot.createGroup("reach")
+        reach.createDimension("nt", len(width))
+        reach.createVariable("width", "f8", ("nt",), fill_value=-999999999999)[:] = width
+        reach.createVariable("wse", "f8", ("nt",), fill_value=-999999999999)[:] = wse
+        reach.createVariable("time", "f8", ("nt",), fill_value=-999999999999)[:] = np.arange(len(width)) * 86400.
+
+class test_HWF_extract(unittest.TestCase):
+    """Test HWF_extract class methods."""
+
+    def test_fit_batch(self):
+        """Test batched fit matches per-reach least squares and skips sparse reaches."""
+
+        width = np.array([[10., 20., 30., 40., 50., np.nan],
+                          [5., 6., 7., 8., 9., 10.],
+                          [1., 2., np.nan, np.nan, np.nan, np.nan]])
+        wse = np.array([[1.1, 2.0, 2.9, 4.2, 5.0, 7.0],
+                        [3., 3., 3., 3., 3., 3.],
+                        [1., 2., np.nan, np.nan, np.nan, np.nan]])
+        fit = fit_batch(width, wse, 5)
+
+        slope, intercept = np.polyfit(width[0, :5], wse[0, :5], 1)
+        assert_allclose([slope, 0.], fit["slope"][:2])
+        assert_allclose([intercept, 3.], fit["intercept"][:2])
+        residual = wse[0, :5] - (intercept + slope * width[0, :5])
+        assert_allclose(np.sqrt(np.mean(residual ** 2)), fit["rmse"][0])
+        assert_allclose(1. - np.sum(residual ** 2) / np.sum((wse[0, :5] - wse[0, :5].mean()) ** 2), fit["r_squared"][0])
+        assert_array_equal(np.array([5, 6, 2]), fit["n_obs"])
+        assert_array_equal(np.array([10., 5., 1.]), fit["min_width"])
+        self.assertTrue(np.isnan(fit["slope"][2]))
+
+    def test_run_hwf(self):
+        """Test run_hwf fits reaches with SWOT files in batches by SoS row."""
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            sos_file = tmp / "na_sword_v16_SOS_priors.nc"
+            with Dataset(sos_file, 'w') as sos:
+                reaches = sos.createGroup("reaches")
+                reaches.createDimension("num_reaches", 3)
+                reaches.createVariable("reach_id", "i8", ("num_reaches",))[:] = [73, 71, 72]
+            width = np.arange(10., 70., 10.)
+            write_swot(tmp / "71_SWOT.nc", width, 2. + 0.1 * width)
+            write_swot(tmp / "73_SWOT.nc", width, 1. + 0.5 * width)
+            write_swot(tmp / "61_SWOT.nc", width, width)
+
+            hwf = HWF_extract(sos_file, tmp, batch_size=1)
+            hwf.run_hwf()
+
+        assert_allclose([0.5, 0.1], hwf.hwf_dict["slope"][:2])
+        assert_allclose([1., 2.], hwf.hwf_dict["intercept"][:2])
+        self.assertTrue(np.isnan(hwf.hwf_dict["slope"][2]))
+        assert_array_equal(np.array([6, 6, 0]), hwf.hwf_dict["n_obs"])
+        self.assertEqual(12, len(hwf.swot_time))
+
+if __name__ == "__main__":
+    unittest.main()
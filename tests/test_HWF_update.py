@@ -0,0 +1,46 @@
+# Standard imports
+import json
+from pathlib import Path
+import tempfile
+import unittest
+
+# Third-party imports
+from netCDF4 import Dataset
+import numpy as np
+from numpy.testing import assert_array_equal
+
+# Local imports
+from priors.height_width_fits.HWF_update import HWF_update
+
+class test_HWF_update(unittest.TestCase):
+    """Test HWF_update class methods."""
+
+    METADATA_JSON = Path(__file__).parent.parent / "metadata" / "metadata.json"
+
+    def test_update_data(self):
+        """Test update_data creates the hwf group and writes fits by reach."""
+
+        with open(self.METADATA_JSON) as jf:
+            metadata_json = json.load(jf)
+        hwf_dict = {
+            "slope": np.array([0.5, np.nan]),
+            "n_obs": np.array([6, 0], dtype=np.int32)
+        }
+
+        with tempfile.TemporaryDirectory() as tmp:
+            sos_file = Path(tmp) / "na_sword_v16_SOS_priors.nc"
+            with Dataset(sos_file, 'w') as sos:
+                sos.createDimension("num_reaches", 2)
+            HWF_update(hwf_dict, sos_file, metadata_json).update_data()
+            hwf_dict["slope"] = np.array([0.25, 0.75])
+            HWF_update(hwf_dict, sos_file, metadata_json).update_data()
+
+            with Dataset(sos_file) as sos:
+                hwf = sos["hwf"]
+                assert_array_equal(np.array([0.25, 0.75]), hwf["slope"][:])
+                assert_array_equal(np.array([6, 0]), hwf["n_obs"][:])
+                self.assertEqual("m/m", hwf["slope"].units)
+                self.assertEqual(HWF_update.FLOAT_FILL, hwf["slope"]._FillValue)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+# Standard imports
+import unittest
+
+# Third-party imports
+import numpy as np
+from numpy.testing import assert_array_equal
+
+# Local imports
+from priors.HydroShare.HydroShareUpdate import HydroShareUpdate
+
+class test_HydroShareUpdate(unittest.TestCase):
+    """Test HydroShareUpdate operations."""
+
+    def setUp(self):
+        days = 3
+        self.HydroShare_dict = {
+            "data": ["b.csv", "a.csv", "c.csv"],
+            "reachId": np.array([73, 71, 99]),
+            "Qwrite": np.array([[3., 3., np.nan], [1., 1., 1.], [9., 9., 9.]]),
+            "Twrite": np.arange(9, dtype=np.float64).reshape(3, days),
+            "Qmean": np.array([3., 1., 9.]),
+            "Qmax": np.array([3., 1., 9.]),
+            "Qmin": np.array([3., 1., 9.]),
+            "MONQ": np.full((3, 12), 2.),
+            "FDQS": np.full((3, 20), 2.),
+            "TwoYr": np.array([3., 1., 9.]),
+            "Agency": ["SWOT_SHAQ"] * 3,
+            "CAL": np.ones(3)
+        }
+
+    def map(self, sparse):
+        update = HydroShareUpdate(None, self.HydroShare_dict, {}, sparse=sparse)
+        update.sos_reaches = np.array([72, 73, 70, 71])
+        update.map_data()
+        return update.map_dict["SWOT_SHAQ"]
+
+    def test_map_data_sparse(self):
+        """Test sparse map_data holds measured reaches at their reach rows."""
+
+        full = self.map(sparse=False)
+        sparse = self.map(sparse=True)
+
+        assert_array_equal(np.array([1, 3]), sparse["rows"])
+        assert_array_equal(np.array([3., 1.]), sparse["mean_q"])
+        assert_array_equal(np.array(["b.csv", "a.csv"]), sparse["HydroShare_id"])
+        assert_array_equal(full["HydroShare_q"][sparse["rows"]], sparse["HydroShare_q"])
+        assert_array_equal(full["mean_q"][sparse["rows"]], sparse["mean_q"])
+        assert_array_equal(np.array([72, 73, 70, 71]), sparse["HydroShare_reach_id"])
+        self.assertEqual((2, 3), sparse["HydroShare_qt"].shape)
+        self.assertEqual(-999999999999, full["mean_q"][0])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+# Standard imports
+import os
+from pathlib import Path
+import tempfile
+import time
+import unittest
+
+# Local imports
+from priors.cache.ResponseCache import ResponseCache
+
+class FakeResponse:
+    """Minimal stand in for requests.Response."""
+
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400: raise RuntimeError(self.status_code)
+
+class FakeSession:
+    """Session that returns queued responses and records request headers."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append(headers)
+        return self.responses.pop(0)
+
+class test_ResponseCache(unittest.TestCase):
+    """Test ResponseCache operations."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_put_get(self):
+        """Test put and get methods."""
+
+        cache = ResponseCache(self.cache_dir)
+        key = cache.key("USGS_dv", "01010000", "2022-12-2", "2023-01-01")
+        self.assertEqual(key, cache.key("USGS_dv", "01010000", "2022-12-2", "2023-01-01"))
+        self.assertNotEqual(key, cache.key("USGS_iv", "01010000", "2022-12-2", "2023-01-01"))
+
+        self.assertEqual((None, None), cache.get(key))
+        cache.put(key, {"q": [1.0, 2.0]}, agency="USGS_dv")
+        payload, meta = cache.get(key)
+        self.assertEqual({"q": [1.0, 2.0]}, payload)
+        self.assertEqual("USGS_dv", meta["agency"])
+
+    def test_call(self):
+        """Test call method only downloads once and skips empty results."""
+
+        cache = ResponseCache(self.cache_dir)
+        calls = []
+        def download(site):
+            calls.append(site)
+            return [site] if site != "empty" else []
+
+        self.assertEqual(["a"], cache.call("WSC", "a", "1980-1-1", "2023-01-01", download, "a"))
+        self.assertEqual(["a"], cache.call("WSC", "a", "1980-1-1", "2023-01-01", download, "a"))
+        cache.call("WSC", "empty", "1980-1-1", "2023-01-01", download, "empty")
+        cache.call("WSC", "empty", "1980-1-1", "2023-01-01", download, "empty")
+        self.assertEqual(["a", "empty", "empty"], calls)
+
+    def test_ttl(self):
+        """Test stale entries are not returned unless requested."""
+
+        cache = ResponseCache(self.cache_dir, ttl=0)
+        key = cache.key("DGA", "01001001", "1980-1-1", "2023-01-01")
+        cache.put(key, b"data")
+        time.sleep(0.01)
+        self.assertEqual((None, None), cache.get(key))
+        self.assertEqual(b"data", cache.get(key, allow_stale=True)[0])
+
+    def test_fetch_revalidate(self):
+        """Test fetch method uses conditional request for stale entries."""
+
+        cache = ResponseCache(self.cache_dir, ttl=0)
+        session = FakeSession([
+            FakeResponse(200, b"csv", {"ETag": '"abc"', "Last-Modified": "Mon, 02 Jan 2023 00:00:00 GMT"}),
+            FakeResponse(304)
+        ])
+        args = ("https://example.com/q.csv", "WSC_realtime", "01AD002", "1980-01-01", "2023-01-02")
+        self.assertEqual(b"csv", cache.fetch(*args, session=session))
+        time.sleep(0.01)
+        self.assertEqual(b"csv", cache.fetch(*args, session=session))
+        self.assertEqual({}, session.requests[0])
+        self.assertEqual('"abc"', session.requests[1]["If-None-Match"])
+        self.assertEqual("Mon, 02 Jan 2023 00:00:00 GMT", session.requests[1]["If-Modified-Since"])
+
+    def test_evict(self):
+        """Test evict method removes least recently used entries first."""
+
+        cache = ResponseCache(self.cache_dir, max_bytes=2500)
+        keys = [cache.key("ABOM", str(i), "1980-1-1", "2023-01-01") for i in range(3)]
+        for i, key in enumerate(keys):
+            cache.put(key, os.urandom(1000))
+            meta_file = self.cache_dir / key[:2] / f"{key}.json"
+            os.utime(meta_file, (i, i))
+        cache.evict()
+
+        self.assertEqual((None, None), cache.get(keys[0]))
+        self.assertIsNotNone(cache.get(keys[1])[0])
+        self.assertIsNotNone(cache.get(keys[2])[0])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,15 +1,42 @@
 # Standard imports
+import json
 from pathlib import Path
 from shutil import copyfile, rmtree
+import tempfile
 import unittest
 
 # Third-party imports
 from netCDF4 import Dataset, chartostring
 import numpy as np
-from numpy.testing import assert_array_almost_equal
+from numpy.testing import assert_array_almost_equal, assert_array_equal
 
 # Local imports
 from priors.sos.Sos import Sos
+from tests.sos_fixtures import add_gauges, add_model, create_sos
+
+PRIORS = {"flow_duration_q": 20, "max_q": 0, "monthly_q": 12, "mean_q": 0, "min_q": 0, "two_year_return_q": 0}
+
+def gauge_priors(prefix, values, bad=()):
+    """Return every prior variable with one value per row and min_q of bad rows below 0."""
+
+    values = np.asarray(values, dtype=np.float64)
+    priors = {f"{prefix}{name}": np.repeat(values[:, None], size, axis=1) if size else values.copy()
+              for name, size in PRIORS.items()}
+    priors[f"{prefix}min_q"][list(bad)] = -1.
+    return priors
+
+def write_overwrite_sos(sos_file):
+    """Write North America SoS with GRDC, USGS and WSC gauge groups."""
+
+    with create_sos(sos_file, [71, 72, 73, 74], node_reach_ids=[71, 72, 73, 74]) as sos:
+        sos.gauge_agency = "USGS;WSC"
+        add_model(sos, gauge_priors("", [1., 1., 1., 1.]))
+        add_gauges(sos, "historicQ/grdc", reach_ids=[71, 72, 73, 74],
+                   variables=gauge_priors("grdc_", [10., 20., 30., 40.], bad=[2]))
+        add_gauges(sos, "historicQ/USGS", reach_ids=[72, 99], variables=gauge_priors("USGS_", [25., 50.]))
+        add_gauges(sos, "USGS", reach_ids=[74, 73], cal=[0, 2], variables=gauge_priors("USGS_", [45., 35.]))
+        add_gauges(sos, "historicQ/WSC", reach_ids=[], variables=gauge_priors("WSC_", []))
+        add_gauges(sos, "WSC", reach_ids=[71, 71, 72], cal=[1, 1, 2], variables=gauge_priors("WSC_", [11., 2., 60.]))
 
 class test_SoS(unittest.TestCase):
     """Test SoS operations."""
@@ -19,6 +46,32 @@ class test_SoS(unittest.TestCase):
     SOS_FILE2 = Path(__file__).parent / "sos" / "na_sword_v11_SOS_priors.nc"
     USGS_FILE = Path(__file__).parent / "sos" / "working2" / "na_sword_v11_SOS_priors.nc"
 
+    def test_overwrite_grades(self):
+        """Test overwrite_grades pass order, validation exclusion and bad prior flags."""
+
+        with open(Path(__file__).parent.parent / "metadata" / "metadata.json") as jf:
+            metadata_json = json.load(jf)
+        with tempfile.TemporaryDirectory() as tmp:
+            sos = Sos("na", "constrained", Path(tmp), metadata_json, [], False, None, None, "16")
+            sos.sos_file = Path(tmp) / "na_sword_v16_SOS_priors.nc"
+            write_overwrite_sos(sos.sos_file)
+            sos.overwrite_grades()
+
+            with Dataset(sos.sos_file) as sos_ds:
+                model = sos_ds["model"]
+                # grdc is overwritten by historic USGS on 72 and by the WSC
+                # calibration gauge closest to the model mean on 71
+                assert_array_equal(np.array([11., 25., 1., 1.]), model["mean_q"][:])
+                assert_array_equal(np.full(12, 25.), model["monthly_q"][1])
+                assert_array_equal(np.full(20, 1.), model["flow_duration_q"][3])
+                assert_array_equal(np.array([1, 1, 0, 0]), model["overwritten_indexes"][:])
+                sources = chartostring(np.ma.getdata(model["overwritten_source"][:]))
+                assert_array_equal(np.array(["WSC", "USGS", "xxxx", "xxxx"]), sources)
+                # grdc on 73 has a negative min_q and 74 has a validation gauge
+                assert_array_equal(np.array([0, 0, 1, 0]), model["bad_priors"][:])
+                sources = chartostring(np.ma.getdata(model["bad_prior_source"][:]))
+                assert_array_equal(np.array(["xxxx", "xxxx", "grdc", "xxxx"]), sources)
+
     def test_overwite_grades_usgs(self):
         """Test overwrite_grades method (USGS data)."""
 
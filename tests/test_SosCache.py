@@ -0,0 +1,73 @@
+# Standard imports
+import os
+from pathlib import Path
+import tempfile
+import unittest
+from unittest import mock
+
+# Third-party imports
+import boto3
+try:
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+# Local imports
+from priors.sos.SosCache import SosCache, reflink_copy
+from priors.sos.SosTransfer import SosTransfer
+
+@unittest.skipUnless(mock_aws, "moto is not installed")
+class test_SosCache(unittest.TestCase):
+    """Test SosCache operations against a local S3 stand-in."""
+
+    KEY = "constrained/0001/na_sword_v16_SOS_priors.nc"
+
+    def setUp(self):
+        os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+        os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+        os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+        self.mock = mock_aws()
+        self.mock.start()
+        self.client = boto3.client("s3", region_name="us-west-2")
+        self.client.create_bucket(Bucket="confluence-sos",
+                                  CreateBucketConfiguration={"LocationConstraint": "us-west-2"})
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self.tmp.name)
+        self.cache = SosCache(self.tmp_dir / "cache", SosTransfer(self.client))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        self.mock.stop()
+
+    def fetch(self, name):
+        destination = self.tmp_dir / name
+        hit = self.cache.fetch("confluence-sos", "constrained", "0001", "na", self.KEY, destination)
+        return hit, destination.read_bytes()
+
+    def test_fetch(self):
+        """Test cached SoS is reused until the object changes."""
+
+        self.client.put_object(Bucket="confluence-sos", Key=self.KEY, Body=b"version 1")
+        self.assertEqual((False, b"version 1"), self.fetch("first.nc"))
+
+        with mock.patch.object(self.cache.transfer, "download") as download:
+            self.assertEqual((True, b"version 1"), self.fetch("second.nc"))
+            download.assert_not_called()
+
+        # Copies are independent of the cached entry
+        (self.tmp_dir / "second.nc").write_bytes(b"modified")
+        self.assertEqual((True, b"version 1"), self.fetch("third.nc"))
+
+        self.client.put_object(Bucket="confluence-sos", Key=self.KEY, Body=b"version 2")
+        self.assertEqual((False, b"version 2"), self.fetch("fourth.nc"))
+
+    def test_reflink_copy(self):
+        """Test reflink_copy copies file contents."""
+
+        source = self.tmp_dir / "source.nc"
+        source.write_bytes(b"sos")
+        reflink_copy(source, self.tmp_dir / "destination.nc")
+        self.assertEqual(b"sos", (self.tmp_dir / "destination.nc").read_bytes())
+
+if __name__ == "__main__":
+    unittest.main()
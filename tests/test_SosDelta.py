@@ -0,0 +1,104 @@
+# Standard imports
+from pathlib import Path
+import tempfile
+import unittest
+
+# Third-party imports
+from netCDF4 import Dataset
+import numpy as np
+from numpy.testing import assert_array_equal
+
+# Local imports
+from priors.sos.SosDelta import _copy_variable, apply_delta, create_delta, read_manifest, variable_digest
+from tests.sos_fixtures import FLOAT_FILL, add_gauges, add_model, create_sos
+
+def write_sos(sos_file, version, usgs_q):
+    """Write SoS file with reaches, model and USGS groups."""
+
+    with create_sos(sos_file, [71, 72, 73], version=version) as sos:
+        add_model(sos, {"overwritten_indexes": np.zeros(3, dtype=np.int32)}, fill_value=-999)
+        usgs = add_gauges(sos, "USGS", variables={"USGS_q": usgs_q}, fill_value=FLOAT_FILL, zlib=True, complevel=4)
+        usgs["USGS_q"].units = "m^3/s"
+
+class test_SosDelta(unittest.TestCase):
+    """Test SosDelta operations."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self.tmp.name)
+        self.base_file = self.tmp_dir / "base.nc"
+        write_sos(self.base_file, "0001", np.ones((2, 4)))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_create_apply(self):
+        """Test delta holds only changed variables and rebuilds the new version."""
+
+        new_file = self.tmp_dir / "new.nc"
+        usgs_q = np.arange(8, dtype=np.float64).reshape(2, 4)
+        write_sos(new_file, "0002", usgs_q)
+        with Dataset(new_file, 'a') as sos:
+            sos["model"]["overwritten_indexes"][1] = 1
+
+        delta_file = self.tmp_dir / "delta.nc"
+        manifest = create_delta(self.base_file, new_file, delta_file)
+        self.assertEqual("0001", manifest["base_version"])
+        self.assertEqual(["/model/overwritten_indexes", "/USGS/USGS_q"], manifest["changed"])
+        self.assertEqual(manifest, read_manifest(delta_file))
+        with Dataset(delta_file) as delta:
+            self.assertEqual(0, len(delta["reaches"].variables))
+
+        output_file = self.tmp_dir / "output.nc"
+        apply_delta(self.base_file, delta_file, output_file)
+        with Dataset(output_file) as sos:
+            self.assertEqual("0002", sos.product_version)
+            assert_array_equal(usgs_q, sos["USGS"]["USGS_q"][:])
+            assert_array_equal(np.array([71, 72, 73]), sos["reaches"]["reach_id"][:])
+            assert_array_equal(np.array([0, 1, 0]), sos["model"]["overwritten_indexes"][:])
+            self.assertEqual("m^3/s", sos["USGS"]["USGS_q"].units)
+
+    def test_blocks(self):
+        """Test digests and copies read in blocks of rows match whole variables."""
+
+        q = np.arange(20, dtype=np.float64).reshape(5, 4)
+        with Dataset(self.tmp_dir / "blocks.nc", 'w') as sos, Dataset(self.tmp_dir / "copy.nc", 'w') as out:
+            for group in (sos, out):
+                group.createDimension("num_reaches", 5)
+                group.createDimension("num_days", None)
+            sos.createVariable("q", "f8", ("num_reaches", "num_days"))[:] = q
+            names = sos.createVariable("river_name", str, ("num_reaches",))
+            names[:] = np.array(["a", "", "bc", "d", "e"], dtype=object)
+
+            for name in ("q", "river_name"):
+                self.assertEqual(variable_digest(sos[name]), variable_digest(sos[name], block_bytes=1))
+                copy = _copy_variable(sos[name], out, block_bytes=1)
+                self.assertEqual(variable_digest(sos[name]), variable_digest(copy))
+            assert_array_equal(q, out["q"][:])
+
+    def test_apply_dimension_change(self):
+        """Test delta rebuilds groups whose dimensions changed."""
+
+        new_file = self.tmp_dir / "new.nc"
+        write_sos(new_file, "0002", np.ones((3, 4)))
+        delta_file = self.tmp_dir / "delta.nc"
+        create_delta(self.base_file, new_file, delta_file)
+
+        output_file = self.tmp_dir / "output.nc"
+        apply_delta(self.base_file, delta_file, output_file)
+        with Dataset(output_file) as sos:
+            self.assertEqual((3, 4), sos["USGS"]["USGS_q"].shape)
+
+    def test_apply_wrong_base(self):
+        """Test delta is rejected for a different base version."""
+
+        new_file = self.tmp_dir / "new.nc"
+        write_sos(new_file, "0002", np.ones((2, 4)))
+        delta_file = self.tmp_dir / "delta.nc"
+        create_delta(self.base_file, new_file, delta_file)
+
+        with self.assertRaises(ValueError):
+            apply_delta(new_file, delta_file, self.tmp_dir / "output.nc")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+# Standard imports
+from pathlib import Path
+import tempfile
+import unittest
+
+# Third-party imports
+from netCDF4 import Dataset
+import numpy as np
+from numpy.testing import assert_array_equal
+
+# Local imports
+from priors.sos.SosIndex import SosIndex, index_file
+from tests.sos_fixtures import add_gauges, add_model, create_sos
+
+def write_sos(sos_file, usgs_reach_ids):
+    """Write SoS file with reaches, nodes, model, USGS and historicQ groups."""
+
+    with create_sos(sos_file, [73, 71, 72], node_reach_ids=[71, 72, 71, 73, 71]) as sos:
+        add_model(sos, {"mean_q": [3., 1., 2.]})
+        q = np.arange(2 * len(usgs_reach_ids), dtype=np.float64).reshape(-1, 2)
+        add_gauges(sos, "USGS", reach_ids=usgs_reach_ids, variables={"USGS_q": q})
+        add_gauges(sos, "historicQ/grdc", reach_ids=[73])
+
+class test_SosIndex(unittest.TestCase):
+    """Test SosIndex operations."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.sos_file = Path(self.tmp.name) / "na_sword_v16_SOS_priors.nc"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_lookups(self):
+        """Test reach, node and gauge row lookups and reach read."""
+
+        write_sos(self.sos_file, [72, 71, 72, 99])
+        with Dataset(self.sos_file) as sos:
+            index = SosIndex(sos)
+            self.assertEqual(["/USGS", "/historicQ/grdc"], index.groups())
+            self.assertEqual(1, index.reach_row(71))
+            self.assertIsNone(index.reach_row(99))
+            assert_array_equal(np.array([0, 2, 4]), index.node_rows(71))
+            assert_array_equal(np.array([0, 2]), index.gauge_rows(72, "/USGS"))
+            assert_array_equal(np.array([0]), index.gauge_rows(73, "historicQ/grdc"))
+            self.assertEqual(0, index.gauge_rows(73, "/USGS").size)
+            assert_array_equal(np.array([2, 1, 2, -1]), index.gauge_reach_rows("USGS"))
+            with self.assertRaises(KeyError):
+                index.gauge_rows(71, "/WSC")
+
+            reach = index.reach(sos, 72)
+            self.assertEqual(2., reach["model"]["mean_q"])
+            assert_array_equal(np.array([[0., 1.], [4., 5.]]), reach["gauges"]["/USGS"]["USGS_q"])
+            self.assertNotIn("/historicQ/grdc", reach["gauges"])
+        self.assertTrue(index_file(self.sos_file).exists())
+
+    def test_incremental(self):
+        """Test only parts with changed identifiers are rebuilt."""
+
+        write_sos(self.sos_file, [72, 71])
+        with Dataset(self.sos_file) as sos:
+            self.assertEqual(["reaches", "nodes", "/USGS", "/historicQ/grdc"], SosIndex(sos).updated)
+            self.assertEqual([], SosIndex(sos).updated)
+
+        write_sos(self.sos_file, [71, 71])
+        with Dataset(self.sos_file) as sos:
+            index = SosIndex(sos)
+            self.assertEqual(["/USGS"], index.updated)
+            assert_array_equal(np.array([0, 1]), index.gauge_rows(71, "/USGS"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+# Standard imports
+import os
+from pathlib import Path
+import tempfile
+import unittest
+
+# Third-party imports
+import boto3
+try:
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+# Local imports
+from priors.sos.SosTransfer import SosTransfer, composite_checksum, file_checksum
+
+@unittest.skipUnless(mock_aws, "moto is not installed")
+class test_SosTransfer(unittest.TestCase):
+    """Test SosTransfer operations against a local S3 stand-in."""
+
+    CHUNK_SIZE = 5 * 1024 ** 2    # S3 minimum part size
+
+    def setUp(self):
+        os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+        os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+        os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+        self.mock = mock_aws()
+        self.mock.start()
+        self.client = boto3.client("s3", region_name="us-west-2")
+        for bucket in ("confluence-sos", "podaac-bucket"):
+            self.client.create_bucket(Bucket=bucket,
+                                      CreateBucketConfiguration={"LocationConstraint": "us-west-2"})
+        self.tmp = tempfile.TemporaryDirectory()
+        self.sos_file = Path(self.tmp.name) / "na_sword_v16_SOS_priors.nc"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        self.mock.stop()
+
+    def test_upload_fan_out(self):
+        """Test multipart upload to two destinations and verified download."""
+
+        data = os.urandom(2 * self.CHUNK_SIZE + 1024)
+        self.sos_file.write_bytes(data)
+        transfer = SosTransfer(self.client, chunk_size=self.CHUNK_SIZE, max_concurrency=2)
+        transfer.upload(self.sos_file, [
+            ("confluence-sos", "constrained/0001/na_sword_v16_SOS_priors.nc", {}),
+            ("podaac-bucket", "na_sword_v16_SOS_priors_constrained_0001.nc", {"ServerSideEncryption": "AES256"})
+        ])
+
+        for bucket, key in (("confluence-sos", "constrained/0001/na_sword_v16_SOS_priors.nc"),
+                            ("podaac-bucket", "na_sword_v16_SOS_priors_constrained_0001.nc")):
+            self.assertEqual(data, self.client.get_object(Bucket=bucket, Key=key)["Body"].read())
+
+        download = Path(self.tmp.name) / "download.nc"
+        transfer.download("confluence-sos", "constrained/0001/na_sword_v16_SOS_priors.nc", download)
+        self.assertEqual(data, download.read_bytes())
+
+    def test_verify_mismatch(self):
+        """Test verify method raises on a corrupted local file."""
+
+        self.sos_file.write_bytes(b"sos")
+        transfer = SosTransfer(self.client, chunk_size=self.CHUNK_SIZE)
+        transfer.upload(self.sos_file, [("confluence-sos", "unconstrained/0001/na.nc", {})])
+        transfer.verify("confluence-sos", "unconstrained/0001/na.nc", self.sos_file)
+
+        self.sos_file.write_bytes(b"sos2")
+        with self.assertRaises(ValueError):
+            transfer.verify("confluence-sos", "unconstrained/0001/na.nc", self.sos_file)
+
+class test_checksums(unittest.TestCase):
+    """Test checksum functions."""
+
+    def test_composite_checksum(self):
+        """Test composite checksum of a single part equals checksum of digest."""
+
+        with tempfile.TemporaryDirectory() as tmp:
+            sos_file = Path(tmp) / "sos.nc"
+            sos_file.write_bytes(b"abc" * 10)
+            self.assertEqual(44, len(file_checksum(sos_file)))
+            self.assertNotEqual(file_checksum(sos_file), composite_checksum(sos_file, 30))
+            self.assertEqual(composite_checksum(sos_file, 30), composite_checksum(sos_file, 64))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+# Standard imports
+from pathlib import Path
+import tempfile
+import unittest
+
+# Third-party imports
+import numpy as np
+from numpy.testing import assert_array_equal
+try:
+    import zarr
+    from priors.sos.SosZarr import SosZarr
+except ImportError:
+    zarr = None
+
+# Local imports
+from tests.sos_fixtures import FLOAT_FILL, add_gauges, create_sos
+
+@unittest.skipUnless(zarr, "zarr is not installed")
+class test_SosZarr(unittest.TestCase):
+    """Test SosZarr operations against a local directory store."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self.tmp.name)
+        self.sos_file = self.tmp_dir / "na_sword_v16_SOS_priors.nc"
+        with create_sos(self.sos_file, np.arange(71, 76), version="0002",
+                        river_names=["a", "b", "c", "d", "e"]) as sos:
+            q = np.arange(12, dtype=np.float64).reshape(3, 4)
+            usgs = add_gauges(sos, "USGS", ids=["01", "02", "03"], variables={"USGS_q": q}, fill_value=FLOAT_FILL)
+            usgs["USGS_q"].units = "m^3/s"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_export(self):
+        """Test export writes groups, variables, attributes and chunks."""
+
+        store_dir = self.tmp_dir / "na_sword_v16_SOS_priors.zarr"
+        SosZarr(reach_chunk=2, gauge_chunk=1).export(self.sos_file, store_dir)
+
+        root = zarr.open_consolidated(str(store_dir), mode='r')
+        self.assertEqual("0002", root.attrs["product_version"])
+        assert_array_equal(np.arange(71, 76), root["reaches/reach_id"][:])
+        self.assertEqual((2,), root["reaches/reach_id"].chunks)
+        assert_array_equal(np.array(["a", "b", "c", "d", "e"]), root["reaches/river_name"][:].astype(str))
+
+        q = root["USGS/USGS_q"]
+        self.assertEqual((1, 4), q.chunks)
+        self.assertEqual(-999999999999, q.fill_value)
+        self.assertEqual("m^3/s", q.attrs["units"])
+        self.assertEqual(["num_USGS_reaches", "num_days"], q.attrs["_ARRAY_DIMENSIONS"])
+        assert_array_equal(np.array([4., 5., 6., 7.]), q[1])
+        assert_array_equal(np.array([b"0", b"2"]), root["USGS/USGS_id"][1])
+
+if __name__ == "__main__":
+    unittest.main()
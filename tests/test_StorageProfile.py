@@ -0,0 +1,98 @@
+# Standard imports
+from pathlib import Path
+import tempfile
+import unittest
+
+# Third-party imports
+from netCDF4 import Dataset
+import numpy as np
+from numpy.testing import assert_array_equal
+
+# Local imports
+from priors.sos.StorageProfile import StorageProfile
+from tests.sos_fixtures import FLOAT_FILL, add_gauges, create_sos
+
+class test_StorageProfile(unittest.TestCase):
+    """Test StorageProfile operations."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.sos_file = Path(self.tmp.name) / "na_sword_v16_SOS_priors.nc"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_settings(self):
+        """Test chunk shapes for each variable class."""
+
+        profile = StorageProfile({"vector": {"length": 10}})
+        self.assertEqual((1, 365), profile.settings("f8", (50, 365))["chunksizes"])
+        self.assertEqual((10,), profile.settings("i4", (50,))["chunksizes"])
+        self.assertEqual((5,), profile.settings("i4", (5,))["chunksizes"])
+        char = profile.settings("S1", (50, 4))
+        self.assertEqual((50, 4), char["chunksizes"])
+        self.assertFalse(char["shuffle"])
+        self.assertEqual({}, profile.settings(str, (50,)))
+        self.assertEqual((1, 16384), profile.settings("f8", (50, 0), (False, True))["chunksizes"])
+        self.assertEqual((10,), profile.settings("i4", (0,), (True,))["chunksizes"])
+
+    def test_create_rewrite(self):
+        """Test created variables follow the profile and rewrite re-chunks inherited variables."""
+
+        profile = StorageProfile()
+        q = np.arange(12, dtype=np.float64).reshape(3, 4)
+        with create_sos(self.sos_file, [71, 72, 73], version="0001") as sos:
+            usgs = add_gauges(sos, "USGS", variables={"USGS_q": q}, fill_value=FLOAT_FILL, compression="zlib")
+            inherited = usgs["USGS_q"]
+            inherited.units = "m^3/s"
+            created = profile.create_variable(usgs, "USGS_qt", "f8", ("num_USGS_reaches", "num_days"))
+            self.assertTrue(profile.matches(created))
+            self.assertFalse(profile.matches(inherited))
+
+        self.assertTrue(profile.rewrite(self.sos_file))
+        with Dataset(self.sos_file) as sos:
+            self.assertEqual("0001", sos.product_version)
+            variable = sos["USGS"]["USGS_q"]
+            self.assertTrue(profile.matches(variable))
+            self.assertEqual("m^3/s", variable.units)
+            self.assertEqual(FLOAT_FILL, variable._FillValue)
+            assert_array_equal(q, variable[:])
+        self.assertFalse(profile.rewrite(self.sos_file))
+
+    def test_rewrite_unlimited_days(self):
+        """Test rewrite chunks series on an unlimited num_days independent of its size."""
+
+        profile = StorageProfile({"series": {"days": 4}})
+        q = np.arange(30, dtype=np.float64).reshape(3, 10)
+        with create_sos(self.sos_file, [71, 72, 73]) as sos:
+            add_gauges(sos, "USGS", variables={"USGS_q": q}, unlimited_days=True, chunksizes=(3, 1))
+
+        self.assertTrue(profile.rewrite(self.sos_file))
+        with Dataset(self.sos_file, 'a') as sos:
+            variable = sos["USGS"]["USGS_q"]
+            self.assertEqual([1, 4], variable.chunking())
+            self.assertTrue(profile.matches(variable))
+            assert_array_equal(q, variable[:])
+            variable[:, 10:12] = np.ones((3, 2))
+            self.assertTrue(profile.matches(variable))
+        self.assertFalse(profile.rewrite(self.sos_file))
+
+    def test_rewrite_vlen_str(self):
+        """Test rewrite copies groups with variable-length string variables."""
+
+        profile = StorageProfile()
+        with create_sos(self.sos_file, [71, 72, 73], river_names=["Ohio", "NODATA", "Missouri"]) as sos:
+            reaches = sos["reaches"]
+            river_name = reaches["river_name"]
+            reaches.createVariable("x", "f8", ("num_reaches",), compression="zlib", complevel=9)[:] = [1., 2., 3.]
+            self.assertTrue(profile.matches(river_name))
+
+        self.assertTrue(profile.rewrite(self.sos_file))
+        with Dataset(self.sos_file) as sos:
+            river_name = sos["reaches"]["river_name"]
+            self.assertIs(str, river_name.dtype)
+            self.assertEqual(["Ohio", "NODATA", "Missouri"], list(river_name[:]))
+            assert_array_equal(np.array([1., 2., 3.]), sos["reaches"]["x"][:])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+# Standard imports
+from pathlib import Path
+import tempfile
+import unittest
+
+# Third-party imports
+from netCDF4 import Dataset
+import numpy as np
+from numpy.testing import assert_array_equal
+
+# Local imports
+from priors.Riggs.RiggsRead import RiggsRead
+from priors.targets.TargetIndex import TargetIndex, decode_ids, filter_ids, read_targets
+from priors.usgs.USGSRead import USGSRead
+from tests.sos_fixtures import add_gauges, create_sos, to_chars
+
+def write_targets(targets_file, station_ids, reach_ids, cal):
+    """Write targets file with character station identifiers."""
+
+    with Dataset(targets_file, 'w') as ncf:
+        ncf.createDimension("num_gauges", len(station_ids))
+        ncf.createDimension("nchars", 8)
+        st = ncf.createVariable("StationID", "S1", ("num_gauges", "nchars"))
+        st[:] = to_chars(station_ids)
+        ncf.createVariable("Reach_ID", "i8", ("num_gauges",))[:] = reach_ids
+        ncf.createVariable("CAL", "i4", ("num_gauges",))[:] = cal
+
+def write_sos(sos_file, agency_ids):
+    """Write SoS file with agency identifier groups."""
+
+    with create_sos(sos_file, [71, 72, 73]) as sos:
+        for agency, ids in agency_ids.items():
+            add_gauges(sos, agency, ids=ids, nchars=8)
+
+class test_TargetIndex(unittest.TestCase):
+    """Test TargetIndex operations."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_decode_ids(self):
+        """Test decode_ids function."""
+
+        chars = to_chars(["0101", "02020202"])
+        assert_array_equal(np.array(["0101", "02020202"]), decode_ids(chars))
+        assert_array_equal(np.array(["a", "b"]), decode_ids(np.array(["a", "b"], dtype=object)))
+        assert_array_equal(np.array(["ab", "cd"]), decode_ids(np.array([["a", "b"], ["c", "d"]])))
+
+    def test_read_targets(self):
+        """Test read_targets function filters on SoS identifiers."""
+
+        targets_file = self.tmp_dir / "USGStargets.nc"
+        write_targets(targets_file, ["0101", "0202", "0303"], [71, 72, 73], [0, 1, 2])
+        sos_file = self.tmp_dir / "na_sword_v16_SOS_priors.nc"
+        write_sos(sos_file, {"USGS": ["0303", "0101"]})
+
+        sos_ids = TargetIndex(sos_file, ["USGS"])
+        self.assertEqual({"0101", "0303"}, sos_ids["USGS"])
+        st, rid, cal = read_targets(targets_file, sos_ids["USGS"])
+        assert_array_equal(np.array(["0101", "0303"]), st)
+        assert_array_equal(np.array([71, 73]), rid)
+        assert_array_equal(np.array([0, 2]), cal)
+
+    def test_riggs_read(self):
+        """Test RiggsRead read method applies per agency rules."""
+
+        write_targets(self.tmp_dir / "Riggs_brazil_.nc", ["00123", "00456", "00789"], [61, 62, 63], [0, 1, 2])
+        sos_file = self.tmp_dir / "sa_sword_v16_SOS_priors.nc"
+        write_sos(sos_file, {"Hidroweb": ["00123", "00456", "00789"]})
+
+        riggs_read = RiggsRead(self.tmp_dir, "sa")
+        self.assertEqual(["Hidroweb"], riggs_read.agencies())
+        data, reach_ids, agency, cal = riggs_read.read(TargetIndex(sos_file, riggs_read.agencies()))
+        assert_array_equal(np.array(["123", "456"]), data)
+        assert_array_equal(np.array(["61", "62"]), reach_ids)
+        assert_array_equal(np.array(["Hidroweb", "Hidroweb"]), agency)
+        assert_array_equal(np.array([0, 1]), cal)
+
+        data, reach_ids, agency, cal = riggs_read.read()
+        self.assertEqual(3, data.size)
+
+    def test_empty_sos_ids(self):
+        """Test empty SoS identifiers keep every gauge in both readers."""
+
+        write_targets(self.tmp_dir / "Riggs_brazil_.nc", ["00123", "00456", "00789"], [61, 62, 63], [0, 1, 2])
+        write_targets(self.tmp_dir / "USGStargets.nc", ["0101", "0202"], [71, 72], [0, 2])
+        sos_file = self.tmp_dir / "sa_sword_v16_SOS_priors.nc"
+        write_sos(sos_file, {})
+
+        self.assertIsNone(filter_ids(set()))
+        self.assertIsNone(filter_ids({"Hidroweb": set()}, "Hidroweb"))
+        self.assertEqual(set(), filter_ids({"Hidroweb": set(), "ABOM": {"1"}}, "Hidroweb"))
+
+        riggs_read = RiggsRead(self.tmp_dir, "sa")
+        for sos_ids in (TargetIndex(sos_file, riggs_read.agencies()), {}, set()):
+            data, _, _, _ = riggs_read.read(sos_ids)
+            assert_array_equal(np.array(["123", "456", "789"]), data)
+
+        usgs_read = USGSRead(self.tmp_dir / "USGStargets.nc")
+        for sos_ids in (TargetIndex(sos_file, ["USGS"])["USGS"], set(), None):
+            data, _, _ = usgs_read.read(sos_ids)
+            assert_array_equal(np.array(["0101", "0202"]), data)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,10 @@
 # Standard imports
+import json
 from os import mkdir
 from pathlib import Path
 import pickle
 from shutil import copyfile, rmtree
+import tempfile
 import unittest
 
 # Third-party imports
@@ -12,6 +14,22 @@ from numpy.testing import assert_almost_equal, assert_array_equal
 
 # Local imports
 from priors.usgs.USGSUpdate import USGSUpdate
+from tests.sos_fixtures import FLOAT_FILL, add_gauges, create_sos
+
+def write_usgs_sos(sos_file, usgs_q, usgs_qt):
+    """Write SoS file with reaches and a USGS group on an unlimited num_days."""
+
+    rows = usgs_q.shape[0]
+    priors = {"USGS_flow_duration_q": np.full((rows, 20), FLOAT_FILL),
+              "USGS_monthly_q": np.full((rows, 12), FLOAT_FILL)}
+    for name in ("USGS_max_q", "USGS_mean_q", "USGS_min_q", "USGS_two_year_return_q"):
+        priors[name] = np.full(rows, FLOAT_FILL)
+    with create_sos(sos_file, [71, 72, 73]) as sos:
+        usgs = add_gauges(sos, "USGS", reach_ids=np.zeros(rows), ids=[""] * rows, nchars=100, cal=np.zeros(rows),
+                          variables={**priors, "USGS_q": usgs_q, "USGS_qt": usgs_qt},
+                          unlimited_days=True, fill_value=FLOAT_FILL)
+        usgs.createVariable("USGS_reaches", "i4", ("num_USGS_reaches",))
+        usgs.createVariable("num_days", "i4", ("num_days",))
 
 class test_USGS(unittest.TestCase):
     """Test USGSUpdate operations."""
@@ -49,6 +67,49 @@ class test_USGS(unittest.TestCase):
         assert_almost_equal(grdc_qt, na["usgs_qt"][i,-10:].flatten())
         assert_array_equal(np.array(range(1,15241)), na["days"])
 
+    def test_update_data_inplace(self):
+        """Test update_data writes patches in place on an unlimited num_days."""
+
+        with open(Path(__file__).parent.parent / "metadata" / "metadata.json") as jf:
+            metadata_json = json.load(jf)
+        history_q = np.array([[1., 2., 3.], [4., 5., 6.]])
+        history_qt = np.array([[738001., 738002., 738003.]] * 2)
+        usgs_dict = {
+            "reachId": np.array([71, 99, 73]),
+            "dataUSGS": np.array(["0101", "0202", "0303"]),
+            "days": 5,
+            "Qpatch": [(0, np.array([1, 4]), np.array([10., 40.]), np.array([739001., 739004.])),
+                       (1, np.array([2]), np.array([20.]), np.array([739002.])),
+                       (2, np.array([0]), np.array([70.]), np.array([739000.]))],
+            "FDQS": np.ones((3, 20)),
+            "MONQ": np.ones((3, 12)),
+            "Qmax": np.ones(3),
+            "Qmean": np.ones(3),
+            "Qmin": np.ones(3),
+            "TwoYr": np.ones(3)
+        }
+
+        with tempfile.TemporaryDirectory() as tmp:
+            sos_file = Path(tmp) / "na_sword_v16_SOS_priors.nc"
+            write_usgs_sos(sos_file, history_q, history_qt)
+            usgs_update = USGSUpdate(sos_file, usgs_dict, metadata_json)
+            usgs_update.read_sos()
+            usgs_update.map_data()
+            usgs_update.update_data()
+
+            # Gauge 0202 is not on an SoS reach so its patch is not written
+            assert_array_equal(np.array([[738001., 739004.], [738002., 739000.]]), usgs_update.map_dict["usgs_qt"])
+            with Dataset(sos_file) as sos:
+                usgs = sos["USGS"]
+                self.assertEqual(5, sos["USGS"].dimensions["num_days"].size)
+                assert_array_equal(np.array([[1., 10., 3., FLOAT_FILL, 40.], [70., 5., 6., FLOAT_FILL, FLOAT_FILL]]),
+                                   np.ma.filled(usgs["USGS_q"][:], FLOAT_FILL))
+                assert_array_equal(np.array([[738001., 739001., 738003., FLOAT_FILL, 739004.], [739000., 738002., 738003., FLOAT_FILL, FLOAT_FILL]]),
+                                   np.ma.filled(usgs["USGS_qt"][:], FLOAT_FILL))
+                assert_array_equal(np.arange(1, 6), usgs["num_days"][:])
+                assert_array_equal(np.array([71, 73]), usgs["USGS_reach_id"][:])
+                assert_array_equal(np.array(["0101", "0303"]), chartostring(usgs["USGS_id"][:]))
+
     def test_update_data(self):
         """Test update_data method."""
 
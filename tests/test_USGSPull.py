@@ -0,0 +1,84 @@
+# Standard imports
+import asyncio
+from datetime import datetime
+import unittest
+
+# Third-party imports
+import numpy as np
+from numpy.testing import assert_array_almost_equal, assert_array_equal
+import pandas as pd
+
+# Local imports
+from priors.usgs.USGSPull import USGSPull, daily_mean
+
+class test_USGSPull(unittest.TestCase):
+    """Test USGSPull operations."""
+
+    def test_daily_mean(self):
+        """Test daily_mean function."""
+
+        index = pd.date_range("2022-12-01 22:00", periods=12, freq="h", tz="UTC")
+        Q = np.arange(12, dtype=np.float64)
+        F = np.array(["A"] * 12, dtype=object)
+        F[3] = "P, Ice"
+        F[4] = np.nan
+
+        df = daily_mean(index, Q, F)
+
+        day1 = datetime(2022, 12, 1).toordinal()
+        assert_array_equal(np.array([day1, day1 + 1]), df.index.to_numpy())
+        assert_array_almost_equal(np.array([0.5, np.mean([2, 5, 6, 7, 8, 9, 10, 11])]), df["00060_Mean"].to_numpy())
+
+    def test_daily_mean_timezone(self):
+        """Test daily_mean function groups local timestamps by UTC day."""
+
+        index = pd.DatetimeIndex(["2022-12-01 20:00", "2022-12-01 18:00"]).tz_localize("America/New_York")
+        df = daily_mean(index, [1.0, 3.0])
+
+        day1 = datetime(2022, 12, 1).toordinal()
+        assert_array_equal(np.array([day1, day1 + 1]), df.index.to_numpy())
+        assert_array_almost_equal(np.array([3.0, 1.0]), df["00060_Mean"].to_numpy())
+
+    def test_get_record_dv_first(self):
+        """Test get_record method merges iv values after last approved dv value."""
+
+        dv = pd.DataFrame({
+            "00060_Mean": [35.3147, 70.6294, 105.9441, 141.2588],
+            "00060_Mean_cd": ["A", "A, e", "P", "P"]
+        }, index=pd.date_range("2022-12-01", periods=4, freq="D", tz="UTC"))
+        iv = pd.DataFrame({
+            "00060": [353.147, 706.294],
+            "00060_cd": ["P", "P"]
+        }, index=pd.DatetimeIndex(["2022-12-03 10:00", "2022-12-03 11:00"]).tz_localize("UTC"))
+
+        requests = []
+        def nwis_record(site, service, start_date=None):
+            requests.append((service, start_date))
+            return dv if service == "dv" else iv
+
+        pull = USGSPull(None, "2022-12-01", "2022-12-04", None)
+        pull.nwis_record = nwis_record
+        df, site = asyncio.run(pull.get_record("01010000"))
+
+        self.assertEqual("01010000", site)
+        self.assertEqual([("dv", None), ("iv", "2022-12-03")], requests)
+        day1 = datetime(2022, 12, 1).toordinal()
+        assert_array_equal(np.arange(day1, day1 + 4), df.index.to_numpy())
+        assert_array_almost_equal(np.array([1.0, 2.0, 15.0, 4.0]), df["00060_Mean"].to_numpy())
+
+    def test_column_patch(self):
+        """Test column_patch method maps record days to num_days columns."""
+
+        ALLt = pd.date_range("2022-12-01", "2022-12-05")
+        T = pd.DatetimeIndex(["2022-11-30", "2022-12-02", "2022-12-05", "2022-12-06"])
+        pull = USGSPull(None, "2022-12-01", "2022-12-05", None, merge="inplace")
+        row, columns, q, qt = pull.column_patch(3, T, [1.0, 2.0, np.nan, 4.0], ALLt)
+
+        self.assertEqual(3, row)
+        assert_array_equal(np.array([1, 4]), columns)
+        assert_array_equal(np.array([2.0, np.nan]), q)
+        day1 = datetime(2022, 12, 1).toordinal()
+        assert_array_equal(np.array([day1 + 1, day1 + 4]), qt)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+# Standard imports
+from pathlib import Path
+import tempfile
+import unittest
+
+# Third-party imports
+from netCDF4 import Dataset
+import numpy as np
+from numpy.testing import assert_array_equal
+
+# Local imports
+from priors.sos.WritePlan import RowView, WritePlan, fill_missing, write_blocks, write_columns
+
+class test_WritePlan(unittest.TestCase):
+    """Test WritePlan operations."""
+
+    def test_fill_missing(self):
+        """Test fill_missing converts writeable arrays in place."""
+
+        data = np.array([1.0, np.nan])
+        filled = fill_missing(data, -999)
+        self.assertIs(data, filled)
+        assert_array_equal(np.array([1.0, -999.0]), data)
+
+        data = np.array([1.0, np.nan])
+        data.flags.writeable = False
+        filled = fill_missing(data, -999)
+        self.assertIsNot(data, filled)
+        self.assertTrue(np.isnan(data[1]))
+
+        ints = np.array([1, 2])
+        self.assertIs(ints, fill_missing(ints, -999))
+
+    def test_write(self):
+        """Test write method writes data and attributes once."""
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with Dataset(Path(tmp) / "sos.nc", 'w') as sos:
+                grp = sos.createGroup("USGS")
+                grp.createDimension("num_USGS_reaches", 2)
+                grp.createVariable("USGS_mean_q", "f8", ("num_USGS_reaches",), fill_value=-999999999999)
+                grp.createVariable("CAL", "i4", ("num_USGS_reaches",))
+
+                plan = WritePlan(grp)
+                plan.add("USGS_mean_q", np.array([np.nan, 3.0]), {"long_name": "old"})
+                plan.add("USGS_mean_q", np.array([2.0, np.nan]), {"long_name": "mean", "units": "m^3/s"})
+                plan.add("CAL", atts={"long_name": "calibration"})
+                plan.write()
+
+                self.assertEqual({}, plan.plan)
+                assert_array_equal(np.array([2.0, -999999999999.0]), grp["USGS_mean_q"][:].data)
+                self.assertTrue(grp["USGS_mean_q"][:].mask[1])
+                self.assertEqual("mean", grp["USGS_mean_q"].long_name)
+                self.assertEqual("m^3/s", grp["USGS_mean_q"].units)
+                self.assertEqual("calibration", grp["CAL"].long_name)
+
+    def test_write_blocks(self):
+        """Test RowView selection is written in blocks without changing the source."""
+
+        matrix = np.arange(15, dtype=np.float64).reshape(5, 3)
+        matrix[3, 1] = np.nan
+        view = RowView(matrix, np.array([4, 3, 0]))
+        self.assertEqual((3, 3), view.shape)
+        assert_array_equal(matrix[[4, 3, 0]], np.asarray(view))
+        self.assertEqual(2, len(list(view.blocks(block_bytes=48))))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with Dataset(Path(tmp) / "sos.nc", 'w') as sos:
+                sos.createDimension("num_USGS_reaches", 3)
+                sos.createDimension("num_days", 3)
+                var = sos.createVariable("USGS_q", "f8", ("num_USGS_reaches", "num_days"), fill_value=-999)
+                write_blocks(var, view, -999, block_bytes=24)
+                assert_array_equal(np.array([[12., 13., 14.], [9., -999., 11.], [0., 1., 2.]]), var[:].data)
+        self.assertTrue(np.isnan(matrix[3, 1]))
+
+    def test_write_columns(self):
+        """Test write_columns updates only the given columns and appends days."""
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with Dataset(Path(tmp) / "sos.nc", 'w') as sos:
+                sos.createDimension("num_USGS_reaches", 2)
+                sos.createDimension("num_days", None)
+                var = sos.createVariable("USGS_q", "f8", ("num_USGS_reaches", "num_days"), fill_value=-999)
+                var[:, 0:4] = np.arange(8, dtype=np.float64).reshape(2, 4)
+
+                write_columns(var, 1, np.array([1, 3, 5]), np.array([10., np.nan, 12.]), -999)
+                write_columns(var, 0, np.array([], dtype=np.int64), np.array([]), -999)
+
+                self.assertEqual((2, 6), var.shape)
+                assert_array_equal(np.array([0., 1., 2., 3., -999., -999.]), var[0].filled(-999))
+                assert_array_equal(np.array([4., 10., 6., -999., -999., 12.]), var[1].filled(-999))
+
+    def test_write_rows(self):
+        """Test write method writes data with rows only to those rows."""
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with Dataset(Path(tmp) / "sos.nc", 'w') as sos:
+                sos.createDimension("num_reaches", 4)
+                sos.createDimension("num_days", 3)
+                q = sos.createVariable("q", "f8", ("num_reaches", "num_days"), fill_value=-999)
+                mean_q = sos.createVariable("mean_q", "f8", ("num_reaches",), fill_value=-999)
+
+                plan = WritePlan(sos)
+                plan.add("q", np.array([[1., np.nan], [3., 4.]]), fill=-999, rows=np.array([1, 3]))
+                plan.add("mean_q", np.array([5.]), fill=-999, rows=np.array([2]))
+                plan.write()
+
+                expected = np.full((4, 3), -999.)
+                expected[1, :2] = [1., -999.]
+                expected[3, :2] = [3., 4.]
+                assert_array_equal(expected, q[:].filled(-999))
+                assert_array_equal(np.array([-999., -999., 5., -999.]), mean_q[:].filled(-999))
+
+if __name__ == "__main__":
+    unittest.main()
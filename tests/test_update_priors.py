@@ -0,0 +1,72 @@
+# Standard imports
+import json
+from pathlib import Path
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Local imports
+import update_priors
+from update_priors import main, run_continents, update_continent
+
+class FakePriors:
+    """Priors stand in that records continents and fails for some of them."""
+
+    updated = []
+    sessions = []
+
+    def __init__(self, cont, **kwargs):
+        self.cont = cont
+        FakePriors.sessions.append(kwargs.get("session"))
+
+    def update(self):
+        if self.cont == "eu":
+            raise RuntimeError("update failed")
+        if self.cont == "oc":
+            raise SystemExit(1)
+        FakePriors.updated.append(self.cont)
+
+class test_update_priors(unittest.TestCase):
+    """Test multi-continent update operations."""
+
+    def setUp(self):
+        FakePriors.updated = []
+        FakePriors.sessions = []
+
+    def test_update_continent(self):
+        """Test failures of one continent are reported and do not stop the others."""
+
+        with patch("update_priors.Priors", FakePriors):
+            self.assertTrue(update_continent("na", {}))
+            self.assertFalse(update_continent("eu", {}))
+            failed = run_continents(["af", "eu", "oc", "sa"], 1, {})
+
+        self.assertEqual(["eu", "oc"], failed)
+        self.assertEqual(["na", "af", "sa"], FakePriors.updated)
+        self.assertIsNone(FakePriors.sessions[0])
+        self.assertIsNotNone(FakePriors.sessions[2])
+        self.assertTrue(all(session is FakePriors.sessions[2] for session in FakePriors.sessions[2:]))
+
+    def test_unknown_continents(self):
+        """Test --continents rejects continents that are not in continent.json."""
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(Path(tmp) / "continent.json", 'w') as jf:
+                json.dump([{"af": [1]}, {"na": [7, 8, 9]}], jf)
+
+            with patch.object(update_priors, "INPUT_DIR", Path(tmp)), \
+                    patch("sys.argv", ["update_priors.py", "--continents", "na", "zz"]), \
+                    patch("update_priors.run_continents") as run, \
+                    self.assertRaises(SystemExit) as error:
+                main()
+            self.assertEqual(2, error.exception.code)
+            run.assert_not_called()
+
+            with patch.object(update_priors, "INPUT_DIR", Path(tmp)), \
+                    patch("sys.argv", ["update_priors.py", "--continents", "na", "af"]), \
+                    patch("update_priors.run_continents", return_value=[]) as run:
+                main()
+            self.assertEqual(["na", "af"], run.call_args.args[0])
+
+if __name__ == "__main__":
+    unittest.main()
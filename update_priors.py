@@ -10,14 +10,28 @@ Priors
 
 Functions
 ---------
+historic_summary(historic_qt)
+    return (min, max) ordinal summary of historic gage time ranges
 main()
     main method to generate, retrieve, and overwrite priors
+ordinal_datetime(ordinal)
+    return datetime of a (fractional) proleptic Gregorian ordinal
+run_continents(continents, workers, priors_args)
+    update priors for several continents in one process
+swot_summary(swot_time)
+    return (min, max) ordinal summary of SWOT times in seconds since 2000
+time_summary(time)
+    return (min, max) ordinal summary of positive entries of a time array
+update_continent(cont, priors_args)
+    update priors for one continent and report success
 """
 
 # Standard imports
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 import datetime
 import json
+import multiprocessing
 import os
 from pathlib import Path
 import sys
@@ -27,22 +41,28 @@ import traceback
 from priors.gbpriors.GBPriorsGenerate import GBPriorsGenerate
 from priors.gbpriors.GBPriorsUpdate import GBPriorsUpdate
 from priors.grdc.GRDC import GRDC
+from priors.grdc.GRDCShards import find_shard
 from priors.sos.Sos import Sos
+from priors.sos.StorageProfile import StorageProfile
+from priors.sos.WritePlan import RowView
 from priors.usgs.USGSUpdate import USGSUpdate
 from priors.usgs.USGSPull import USGSPull
 from priors.Riggs.RiggsUpdate import RiggsUpdate
 from priors.Riggs.RiggsPull import RiggsPull
 from priors.HydroShare.HSPull import HSp
 from priors.HydroShare.HydroShareUpdate import HydroShareUpdate
-# from priors.height_width_fits.HWF_extract import HWF_extraqct
-# from priors.height_width_fits.HWF_update import HWF_update
+from priors.cache.ResponseCache import ResponseCache
+from priors.height_width_fits.HWF_extract import HWF_extract
+from priors.height_width_fits.HWF_update import HWF_update
 
 # Third-party imports
 import botocore
 import numpy as np
+import requests
 
 # Constants
 INPUT_DIR = Path("/mnt/data")
+SWOT_EPOCH = datetime.datetime(2000,1,1,0,0,0)
 
 class Priors:
     """Class that coordinates the priors to be generated and stores them in 
@@ -60,6 +80,26 @@ class Priors:
             path to input data directory
         sos_dir: Path
             path to SoS directory on local storage
+        cache: ResponseCache
+            on-disk cache of gauge agency responses (None to disable)
+        cache_dir: Path
+            path to cache directory for gauge responses and previous SoS versions
+        usgs_resolution: str
+            'dv' to request USGS daily values first or 'iv' to request instantaneous values first
+        delta: bool
+            indicate if a delta of changed variables is uploaded with the SoS
+        rechunk: bool
+            indicate if inherited variables are rewritten to follow the storage profile
+        storage_profile: StorageProfile
+            chunking and compression applied to SoS variables
+        usgs_merge: str
+            'matrix' to merge USGS data into full gauge matrices or 'inplace' to only write new day columns
+        hydroshare_sparse: bool
+            indicate if only HydroShare reaches with measurements are mapped and written
+        zarr: bool
+            indicate if a Zarr export of the SoS is uploaded with the SoS
+        session: requests.Session
+            HTTP session shared by the gauge agency pulls
 
     Methods
     -------
@@ -70,7 +110,10 @@ class Priors:
 
     def __init__(self, cont, run_type, priors_list, input_dir, sos_dir, 
                  sos_version, metadata_json, historic_qt, add_geospatial, 
-                 podaac_update, podaac_bucket, sword_version, sos_bucket="confluence-sos"):
+                 podaac_update, podaac_bucket, sword_version, sos_bucket="confluence-sos",
+                 cache_dir=None, usgs_resolution="dv", delta=False,
+                 storage_profile=None, rechunk=False, zarr=False, usgs_merge="matrix",
+                 hydroshare_sparse=False, session=None):
         """
         Parameters
         ----------
@@ -84,6 +127,24 @@ class Priors:
             path to input data directory
         sos_dir: Path
             path to SoS directory on local storage           
+        cache_dir: Path
+            path to gauge response and previous SoS cache directory (None to disable)
+        usgs_resolution: str
+            'dv' to request USGS daily values first or 'iv' to request instantaneous values first
+        delta: bool
+            indicate if a delta of changed variables is uploaded with the SoS
+        storage_profile: Path
+            path to storage profile JSON file (default profile if None)
+        rechunk: bool
+            indicate if inherited variables are rewritten to follow the storage profile
+        zarr: bool
+            indicate if a Zarr export of the SoS is uploaded with the SoS
+        usgs_merge: str
+            'matrix' to merge USGS data into full gauge matrices or 'inplace' to only write new day columns
+        hydroshare_sparse: bool
+            indicate if only HydroShare reaches with measurements are mapped and written
+        session: requests.Session
+            HTTP session shared by the gauge agency pulls (a new session if None)
         """
 
         self.cont = cont
@@ -94,13 +155,23 @@ class Priors:
         self.sos_version = sos_version
         self.metadata_json = metadata_json
         self.time_dict = {
-            "historic_qt": historic_qt[cont]
+            "historic_qt": historic_summary(historic_qt[cont])
         }
         self.add_geospatial = add_geospatial
         self.podaac_update = podaac_update
         self.podaac_bucket = podaac_bucket
         self.sos_bucket = sos_bucket
         self.swordversion = sword_version
+        self.cache_dir = cache_dir
+        self.cache = ResponseCache(cache_dir) if cache_dir else None
+        self.usgs_resolution = usgs_resolution
+        self.delta = delta
+        self.storage_profile = StorageProfile.from_json(storage_profile) if storage_profile else StorageProfile()
+        self.rechunk = rechunk
+        self.zarr = zarr
+        self.usgs_merge = usgs_merge
+        self.hydroshare_sparse = hydroshare_sparse
+        self.session = session if session is not None else requests.Session()
 
     def execute_gbpriors(self, sos_file):
         """Create and execute GBPriors operations.
@@ -113,12 +184,33 @@ class Priors:
 
         gen = GBPriorsGenerate(sos_file, self.input_dir / "swot")
         gen.run_gb()
-        app = GBPriorsUpdate(gen.gb_dict, sos_file, metadata_json = self.metadata_json)
+        app = GBPriorsUpdate(gen.gb_dict, sos_file, metadata_json = self.metadata_json,
+                             storage_profile = self.storage_profile)
         app.update_data()
-        return gen.swot_time
+        return swot_summary(gen.swot_time)
     
+    def execute_hwf(self, sos_file):
+        """Create and execute height-width fit operations.
+
+        Parameters
+        ----------
+        sos_file: Path
+            path to SOS file to update
+        """
+
+        hwf = HWF_extract(sos_file, self.input_dir / "swot")
+        hwf.run_hwf()
+        app = HWF_update(hwf.hwf_dict, sos_file, metadata_json = self.metadata_json,
+                         storage_profile = self.storage_profile)
+        app.update_data()
+        return swot_summary(hwf.swot_time)
+
     def execute_grdc(self, sos_file):
         """Create and execute GRDC operations.
+
+        Reads the continent's verified GRDC shard when one exists for the
+        SWORD version and the global GRDC file has not changed since it was
+        split, otherwise the global GRDC file.
         
         Parameters
         ----------
@@ -126,13 +218,18 @@ class Priors:
             path to SOS file to update
         """
 
-        grdc_file = self.input_dir / "gage" / "GRDC2SWORDout.nc"
+        global_file = self.input_dir / "gage" / "GRDC2SWORDout.nc"
+        grdc_file = find_shard(self.input_dir / "gage", self.cont, self.swordversion, global_file)
+        if grdc_file is None:
+            grdc_file = global_file
+        else:
+            print(f"Reading GRDC shard: {grdc_file.name}.")
         grdc = GRDC(sos_file, grdc_file)
         grdc.read_sos()
         grdc.read_grdc()
         grdc.map_data()
         grdc.update_data()
-        return grdc.map_dict["grdc_qt"]
+        return time_summary(grdc.map_dict["grdc_qt"])
 
     def execute_usgs(self, sos_file, start_date):
         """Create and execute USGS operations.
@@ -145,13 +242,14 @@ class Priors:
 
         usgs_file = self.input_dir / "gage" / "USGStargetsV7_.nc"
         today = datetime.datetime.today().strftime('%Y-%m-%d')
-        usgs_pull = USGSPull(usgs_targets = usgs_file, start_date = start_date, end_date = today, sos_file = sos_file)
+        usgs_pull = USGSPull(usgs_targets = usgs_file, start_date = start_date, end_date = today, sos_file = sos_file, cache = self.cache,
+                             resolution = self.usgs_resolution, merge = self.usgs_merge)
         usgs_pull.pull()
         usgs_update = USGSUpdate(sos_file, usgs_pull.usgs_dict, metadata_json = self.metadata_json)
         usgs_update.read_sos()
         usgs_update.map_data()
         usgs_update.update_data()
-        return usgs_update.map_dict["usgs_qt"]
+        return time_summary(usgs_update.map_dict["usgs_qt"])
         
     def execute_Riggs(self, sos_file, start_date):
         """Create and execute Riggs operations.
@@ -163,7 +261,8 @@ class Priors:
         """
         Riggs_file = self.input_dir / "gage" / "Rtarget"
         today = datetime.datetime.today().strftime("%Y-%m-%d")
-        Riggs_pull = RiggsPull(riggs_targets=Riggs_file, start_date=start_date, end_date=today, cont = self.cont,  sos_file = sos_file)
+        Riggs_pull = RiggsPull(riggs_targets=Riggs_file, start_date=start_date, end_date=today, cont = self.cont,  sos_file = sos_file, cache = self.cache,
+                               session = self.session)
         Riggs_pull.pull()
         Riggs_update = RiggsUpdate(sos_file, Riggs_pull.riggs_dict, metadata_json = self.metadata_json)
         Riggs_update.read_sos()
@@ -173,74 +272,31 @@ class Priors:
         # Retrieve time data
         time_dict = {}
         for agency in set(list(Riggs_update.Riggs_dict["Agency"])):
-            time_dict[agency] = Riggs_update.map_dict[agency]["Riggs_qt"]
+            time_dict[agency] = time_summary(Riggs_update.map_dict[agency]["Riggs_qt"])
         return time_dict
 
     def execute_HydroShare(self, sos_file):
         #this is set up to take inputs but doesn't need any
-        hp=HSp()
+        hp=HSp(cache=self.cache, session=self.session)
         hp.pull()#this gets you a dict with all HS data
-        HydroShare_update = HydroShareUpdate(sos_file, hp.HydroShare_dict, metadata_json = self.metadata_json)
+        HydroShare_update = HydroShareUpdate(sos_file, hp.HydroShare_dict, metadata_json = self.metadata_json,
+                                             sparse = self.hydroshare_sparse)
         HydroShare_update.read_sos()
         HydroShare_update.map_data()
         HydroShare_update.update_data()
 
         # Retrieve time data
-        return HydroShare_update.map_dict["SWOT_SHAQ"]["HydroShare_qt"]
+        return time_summary(HydroShare_update.map_dict["SWOT_SHAQ"]["HydroShare_qt"])
         
     def locate_min_max(self):
-        """Locate min and max time values."""
-        
-        min_qt = datetime.datetime(1965,1,1,0,0,0)
-        max_qt = datetime.datetime(1965,1,1,0,0,0)
-        
-        # Extract min and max from each prior
-        swot_ts = datetime.datetime(2000,1,1,0,0,0)
-        for agency, time in self.time_dict.items():
-            
-            # Historic gage time
-            if agency == "historic_qt":
-                for data in time.values():
-                    data_min = datetime.datetime.fromordinal(data["min"])
-                    data_max = datetime.datetime.fromordinal(data["max"])
-                    if data_min < min_qt or min_qt == datetime.datetime(1965,1,1,0,0,0):
-                        min_qt = data_min
-                    if data_max > max_qt or max_qt == datetime.datetime(1965,1,1,0,0,0):
-                        max_qt = data_max
-                continue
-            
-            # GeoBAM priors SWOT time
-            if agency == "gbpriors" and len(time) > 0:
-                gb_min = swot_ts + datetime.timedelta(seconds=np.nanmin(time))
-                gb_max = swot_ts + datetime.timedelta(seconds=np.nanmax(time))
-                if gb_min < min_qt or min_qt == datetime.datetime(1965,1,1,0,0,0):
-                    min_qt = gb_min
-                if gb_max > max_qt or max_qt == datetime.datetime(1965,1,1,0,0,0):
-                    max_qt = gb_max
-                continue
-            
-            # All other gage agencies
-            if not np.isnan(time).all():
-                # time = time[~np.isnan(time)]
-                time = time[time>0]
-                time_min = datetime.datetime.fromordinal(int(np.nanmin(time)))
-                time_max = datetime.datetime.fromordinal(int(np.nanmax(time)))
-                if time_min < min_qt or min_qt == datetime.datetime(1965,1,1,0,0,0):
-                    min_qt = time_min
-                if time_max > max_qt or max_qt == datetime.datetime(1965,1,1,0,0,0):
-                    max_qt = time_max
-        
-        # Convert time to string data
-        if min_qt == datetime.datetime(1965,1,1,0,0,0):
-            min_qt = "NO TIME DATA"
-        else:
-            min_qt = min_qt
-            
-        if max_qt == datetime.datetime(1965,1,1,0,0,0):
-            max_qt = "NO TIME DATA"
-        else:
-            max_qt = max_qt
-        
+        """Locate min and max time values from the (min, max) ordinal summaries of each prior."""
+
+        summaries = [summary for summary in self.time_dict.values() if summary is not None]
+        if not summaries:
+            return "NO TIME DATA", "NO TIME DATA"
+
+        min_qt = ordinal_datetime(min(summary[0] for summary in summaries))
+        max_qt = ordinal_datetime(max(summary[1] for summary in summaries))
         return min_qt, max_qt
     
     def update(self):
@@ -250,7 +306,8 @@ class Priors:
         print(f"Copy and create new version of the SoS from bucket: {self.sos_bucket}.")
         sos = Sos(self.cont, self.run_type, self.sos_dir, self.metadata_json, 
                   self.priors_list, self.podaac_update, self.podaac_bucket,
-                  self.sos_bucket, self.swordversion)
+                  self.sos_bucket, self.swordversion, self.cache_dir, self.delta,
+                  self.storage_profile)
         
         if self.podaac_bucket != 'local':
             try:
@@ -263,6 +320,8 @@ class Priors:
 
         sos.create_new_version()
         sos_file = sos.sos_file
+        if self.rechunk and self.storage_profile.rewrite(sos_file):
+            print("Rewrote SoS variables to follow the storage profile.")
         sos_last_run_time = sos.last_run_time
 
         # Retrieve geospatial coverage - pull if true flag
@@ -294,6 +353,10 @@ class Priors:
             print("Updating geoBAM priors.")
             self.time_dict["gbpriors"] = self.execute_gbpriors(sos_file)
 
+        if "hwf" in self.priors_list:
+            print("Updating height-width fits.")
+            self.time_dict["hwf"] = self.execute_hwf(sos_file)
+
         if "hydroshare" in self.priors_list:
             print("Updating hydroshare.")
             self.time_dict["HydroShare"] = self.execute_HydroShare(sos_file)
@@ -315,6 +378,49 @@ class Priors:
         print("Uploading new SoS priors version.")
         sos.upload_file()
 
+        # Export chunked Zarr store for partial reads by downstream modules
+        if self.zarr:
+            print("Exporting SoS to Zarr.")
+            sos.export_zarr()
+
+def time_summary(time):
+    """Return (min, max) ordinal summary of positive entries of a time array.
+
+    Fill values, zeros and NaN are ignored. Returns None if there are no
+    valid entries.
+    """
+
+    time_min, time_max = np.inf, -np.inf
+    for block in (time.blocks() if isinstance(time, RowView) else [time]):
+        block = np.ma.filled(np.ma.asarray(block, dtype=np.float64), np.nan)
+        valid = block > 0
+        if not valid.any(): continue
+        time_min = min(time_min, np.min(block, where=valid, initial=np.inf).item())
+        time_max = max(time_max, np.max(block, where=valid, initial=-np.inf).item())
+    return None if time_min == np.inf else (time_min, time_max)
+
+def swot_summary(swot_time):
+    """Return (min, max) ordinal summary of SWOT times in seconds since 2000."""
+
+    swot_time = np.asarray(swot_time, dtype=np.float64)
+    if not np.isfinite(swot_time).any(): return None
+    epoch = SWOT_EPOCH.toordinal()
+    return (epoch + np.nanmin(swot_time) / 86400, epoch + np.nanmax(swot_time) / 86400)
+
+def historic_summary(historic_qt):
+    """Return (min, max) ordinal summary of historic gage time ranges."""
+
+    if not historic_qt: return None
+    return (min(data["min"] for data in historic_qt.values()),
+            max(data["max"] for data in historic_qt.values()))
+
+def ordinal_datetime(ordinal):
+    """Return datetime of a (fractional) proleptic Gregorian ordinal."""
+
+    day = int(np.floor(ordinal))
+    seconds = round((ordinal - day) * 86400, 3)
+    return datetime.datetime.fromordinal(day) + datetime.timedelta(seconds=seconds)
+
 def create_args():
     """Create and return argparser with arguments."""
 
@@ -334,7 +440,7 @@ def create_args():
                             type=str,
                             nargs="+",
                             default=[],
-                            help="List: usgs, grdc, riggs, gbpriors, hydroshare")
+                            help="List: usgs, grdc, riggs, gbpriors, hwf, hydroshare")
     arg_parser.add_argument("-o",
                             "--sosversion",
                             type=str,
@@ -371,8 +477,108 @@ def create_args():
                             type=str,
                             default="17b",
                             help="Version of sword to run on")
+    arg_parser.add_argument("--cachedir",
+                            type=Path,
+                            default=None,
+                            help="Path to gauge response and previous SoS cache directory, may be shared between jobs (disabled if not set)")
+    arg_parser.add_argument("--usgsresolution",
+                            type=str,
+                            choices=["dv", "iv"],
+                            default="dv",
+                            help="Request USGS daily values first and instantaneous values only after the last approved daily value (dv) or instantaneous values for the whole range (iv)")
+    arg_parser.add_argument("--usgsmerge",
+                            type=str,
+                            choices=["matrix", "inplace"],
+                            default="matrix",
+                            help="Merge new USGS data into full gauge by day matrices (matrix) or only write the day columns touched by new data (inplace)")
+    arg_parser.add_argument("--hydrosharesparse",
+                            action="store_true",
+                            help="Map and write only the HydroShare reaches with measurements instead of the full reach dimension")
+    arg_parser.add_argument("--delta",
+                            action="store_true",
+                            help="Upload a delta of the variables changed since the previous version alongside the SoS")
+    arg_parser.add_argument("--storageprofile",
+                            type=Path,
+                            default=None,
+                            help="Path to JSON file of chunking and compression settings per variable class")
+    arg_parser.add_argument("--rechunk",
+                            action="store_true",
+                            help="Rewrite variables inherited from the previous version to follow the storage profile")
+    arg_parser.add_argument("--zarr",
+                            action="store_true",
+                            help="Export the SoS to a Zarr store chunked by reach and gauge and upload it alongside the SoS")
+    arg_parser.add_argument("--continents",
+                            type=str,
+                            nargs="+",
+                            default=None,
+                            help="Continent abbreviations to process in one invocation (overrides the job array index)")
+    arg_parser.add_argument("--workers",
+                            type=int,
+                            default=1,
+                            help="Number of continents to process concurrently when --continents is used")
     return arg_parser
 
+def update_continent(cont, priors_args):
+    """Update priors for one continent and report success.
+
+    Parameters
+    ----------
+    cont: str
+        continent abbreviation
+    priors_args: dict
+        keyword arguments shared by all continents' Priors objects
+
+    Returns
+    -------
+    bool indicating if the update succeeded
+    """
+
+    try:
+        priors = Priors(cont = cont, **priors_args)
+        priors.update()
+    except (Exception, SystemExit) as error:
+        print(f"ERROR: Could not update priors for continent: {cont}.")
+        print(error)
+        traceback.print_exception(*sys.exc_info())
+        return False
+    return True
+
+def run_continents(continents, workers, priors_args):
+    """Update priors for several continents in one process.
+
+    Continents share the R runtime and HYDAT database loaded when the module
+    is imported, the parsed metadata, the response cache and one HTTP session
+    (unless priors_args holds a session). With more than one worker,
+    continents run in forked processes that inherit the loaded runtime
+    instead of initialising their own; each process gets its own copy of the
+    session.
+
+    Parameters
+    ----------
+    continents: list
+        continent abbreviations to process
+    workers: int
+        number of continents to process concurrently
+    priors_args: dict
+        keyword arguments shared by all continents' Priors objects
+
+    Returns
+    -------
+    list of continents that failed to update
+    """
+
+    priors_args = dict(priors_args)
+    if priors_args.get("session") is None:
+        priors_args["session"] = requests.Session()
+    workers = min(workers, len(continents))
+    if workers <= 1:
+        results = [update_continent(cont, priors_args) for cont in continents]
+    else:
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            results = list(executor.map(update_continent, continents, [priors_args] * len(continents)))
+    return [cont for cont, success in zip(continents, results) if not success]
+
 def main():
     """Main method to generate, retrieve, and overwrite priors."""
 
@@ -382,10 +588,18 @@ def main():
     for arg in vars(args):
         print(f"{arg}: {getattr(args, arg)}")
 
-    # Get continent to run on
-    i = int(args.index) if args.index != -235 else int(os.environ.get("AWS_BATCH_JOB_ARRAY_INDEX"))
+    # Get continent(s) to run on
     with open(INPUT_DIR / "continent.json") as jsonfile:
-        cont = list(json.load(jsonfile)[i].keys())[0]
+        continent_json = json.load(jsonfile)
+    if args.continents:
+        available = [list(entry.keys())[0] for entry in continent_json]
+        unknown = [cont for cont in args.continents if cont not in available]
+        if unknown:
+            arg_parser.error(f"Unknown continent(s): {', '.join(unknown)}; choose from {', '.join(available)}")
+        continents = args.continents
+    else:
+        i = int(args.index) if args.index != -235 else int(os.environ.get("AWS_BATCH_JOB_ARRAY_INDEX"))
+        continents = [list(continent_json[i].keys())[0]]
         
     # Load metadata JSON
     with open(args.metadatajson) as jf:
@@ -396,11 +610,18 @@ def main():
         historicqt = json.load(jf)
 
     # Retrieve and update priors
-    priors = Priors(cont = cont, run_type = args.runtype, priors_list = args.priors, 
-                    input_dir = INPUT_DIR, sos_dir = INPUT_DIR / "sos", sos_version = args.sosversion, metadata_json = variable_atts, 
-                    historic_qt = historicqt, add_geospatial = args.addgeospatial, podaac_update = args.podaacupload,
-                    podaac_bucket = args.podaacbucket, sos_bucket = args.sosbucket, sword_version = args.swordversion)
-    priors.update()
+    priors_args = dict(run_type = args.runtype, priors_list = args.priors, 
+                       input_dir = INPUT_DIR, sos_dir = INPUT_DIR / "sos", sos_version = args.sosversion, metadata_json = variable_atts, 
+                       historic_qt = historicqt, add_geospatial = args.addgeospatial, podaac_update = args.podaacupload,
+                       podaac_bucket = args.podaacbucket, sos_bucket = args.sosbucket, sword_version = args.swordversion,
+                       cache_dir = args.cachedir, usgs_resolution = args.usgsresolution, delta = args.delta,
+                       storage_profile = args.storageprofile, rechunk = args.rechunk,
+                       zarr = args.zarr, usgs_merge = args.usgsmerge,
+                       hydroshare_sparse = args.hydrosharesparse)
+    failed = run_continents(continents, args.workers, priors_args)
+    if failed:
+        print(f"Priors update failed for: {', '.join(failed)}")
+        sys.exit(1)
 
 if __name__ == "__main__":
     start = datetime.datetime.now()